@@ -0,0 +1,79 @@
+"""
+Compare review output encodings: JSON (provider JSON-schema mode) and the compact
+line format from src.llm.compact_output.
+
+Usage: python -m benchmarks.output_format [--live] [diff files or directories...]
+Without --live, estimated output tokens are compared on fixed sample responses.
+With --live, each corpus diff is reviewed in both formats and the provider-reported
+output tokens and end-to-end latency are printed (needs GPT_API_KEY).
+"""
+import sys
+import time
+from src.github.types import DiffIssue
+from src.llm.compact_output import render_compact_review
+from src.llm.tokens import estimate_tokens
+from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse
+from benchmarks.prompt_format import _diff_files
+
+SAMPLE_ISSUES = [
+    DiffIssue(file="src/github/service.py", line="42", type="error", severity=9,
+              message="`payload.pull_request` may be None for issue_comment events; guard before access"),
+    DiffIssue(file="src/github/client.py", line="118-121", type="warning", severity=6,
+              message="Installation token is cached without checking its expiry"),
+    DiffIssue(file="src/llm/service.py", line="77", type="warning", severity=5,
+              message="Broad except swallows the parsing error; log it before retrying"),
+    DiffIssue(file="src/review/render.py", line="30", type="suggestion", severity=2,
+              message="Use a list comprehension instead of repeated append"),
+    DiffIssue(file="src/config/env.py", line="12", type="suggestion", severity=1,
+              message="Group related settings under one comment"),
+]
+SAMPLE_SUMMARY = "One possible None dereference, a stale-token risk and a few style suggestions."
+
+
+def _samples():
+    for count in (0, 1, 5, 20):
+        issues = [SAMPLE_ISSUES[i % len(SAMPLE_ISSUES)] for i in range(count)]
+        yield f"{count} issues", ReviewCodeDiffResponse(issues=issues, summary=SAMPLE_SUMMARY, confidence=0.8)
+
+
+def offline():
+    print(f"{'response':<16}{'json':>8}{'compact':>10}{'saving':>9}")
+    totals = [0, 0]
+    for name, response in _samples():
+        counts = [estimate_tokens(response.model_dump_json()), estimate_tokens(render_compact_review(response))]
+        totals = [total + count for total, count in zip(totals, counts)]
+        print(f"{name:<16}{counts[0]:>8}{counts[1]:>10}{1 - counts[1] / counts[0]:>8.1%}")
+    print(f"{'total':<16}{totals[0]:>8}{totals[1]:>10}{1 - totals[1] / totals[0]:>8.1%}")
+
+
+def live(args):
+    from src.config.env import settings
+    from src.llm.metrics import LLMCallRecorder
+    from src.llm.service import LLMService
+
+    class _LastCall(LLMCallRecorder):
+        def __init__(self):
+            self.last = None
+
+        def record(self, record):
+            self.last = record
+
+    print(f"{'diff':<24}{'format':<9}{'issues':>7}{'out tok':>9}{'latency':>10}")
+    for diff_file in _diff_files(args):
+        request = ReviewCodeDiffRequest(diff=diff_file.read_text(encoding="utf-8"))
+        for output_format in ("json", "compact"):
+            recorder = _LastCall()
+            llm = LLMService(model=settings.LLM_STRONG_MODEL, recorder=recorder, output_format=output_format)
+            started = time.monotonic()
+            response = llm.review_code_diff(request)
+            latency = time.monotonic() - started
+            output_tokens = recorder.last.output_tokens if recorder.last else 0
+            print(f"{diff_file.name:<24}{output_format:<9}{len(response.issues):>7}{output_tokens:>9}{latency:>9.1f}s")
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    if "--live" in argv:
+        live([arg for arg in argv if arg != "--live"])
+    else:
+        offline()
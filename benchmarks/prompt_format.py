@@ -0,0 +1,44 @@
+"""
+Compare estimated prompt tokens of the unified and compact diff formats.
+
+Usage: python -m benchmarks.prompt_format [diff files or directories...]
+Defaults to the fixed corpus in benchmarks/corpus.
+"""
+import sys
+from pathlib import Path
+from src.github.utils import file_path_of, parse_diff
+from src.llm.languages import languages_of
+from src.llm.prompts import review_prompt
+from src.llm.tokens import estimate_tokens
+from src.review.render import render_compact
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+
+
+def _diff_files(args):
+    paths = [Path(arg) for arg in args] or [CORPUS_DIR]
+    for path in paths:
+        yield from sorted(path.glob("*.diff")) if path.is_dir() else [path]
+
+
+def main(args):
+    print(f"{'diff':<24}{'unified':>10}{'compact(0)':>12}{'compact(1)':>12}{'compact(3)':>12}{'saving(1)':>11}")
+    totals = [0, 0, 0, 0]
+    for diff_file in _diff_files(args):
+        text = diff_file.read_text(encoding="utf-8")
+        languages = languages_of(file_path_of(patched_file) for patched_file in parse_diff(text))
+        unified = review_prompt("unified", languages)
+        compact_prompt = review_prompt("compact", languages)
+        counts = [estimate_tokens(unified.prefix + unified.suffix.format(diff=text, context=""))]
+        for context_lines in (0, 1, 3):
+            compact = render_compact(parse_diff(text), context_lines=context_lines)
+            prompt = compact_prompt.prefix + compact_prompt.suffix.format(diff=compact, context="")
+            counts.append(estimate_tokens(prompt))
+        totals = [total + count for total, count in zip(totals, counts)]
+        saving = 1 - counts[2] / counts[0]
+        print(f"{diff_file.name:<24}{counts[0]:>10}{counts[1]:>12}{counts[2]:>12}{counts[3]:>12}{saving:>10.1%}")
+    print(f"{'total':<24}{totals[0]:>10}{totals[1]:>12}{totals[2]:>12}{totals[3]:>12}{1 - totals[2] / totals[0]:>10.1%}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -4,4 +4,33 @@ GITHUB_COMMIT_INLINE_COMMENT_URL_TEMPLATE = (
 )
 GITHUB_INSTALLATION_TOKEN_URL = (
     "https://api.github.com/app/installations/{installation_id}/access_tokens"
-)
\ No newline at end of file
+)
+GITHUB_REPO_CONTENTS_URL_TEMPLATE = (
+    "https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={ref}"
+)
+GITHUB_GIT_TREE_URL_TEMPLATE = (
+    "https://api.github.com/repos/{owner}/{repo}/git/trees/{ref}?recursive=1"
+)
+GITHUB_GIT_BLOB_URL_TEMPLATE = (
+    "https://api.github.com/repos/{owner}/{repo}/git/blobs/{sha}"
+)
+GITHUB_TARBALL_URL_TEMPLATE = (
+    "https://api.github.com/repos/{owner}/{repo}/tarball/{ref}"
+)
+GITHUB_REVIEW_COMMENT_URL_TEMPLATE = (
+    "https://api.github.com/repos/{owner}/{repo}/pulls/comments/{comment_id}"
+)
+
+# Smallest system instruction (in tokens) the provider accepts for explicit caching, matched by model name prefix
+LLM_PROMPT_CACHE_MIN_TOKENS_BY_MODEL = {
+    "gemini-2.5-flash-lite": 1024,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+
+# USD per 1M (input, output) tokens, matched by model name prefix
+LLM_MODEL_PRICING_PER_MILLION_TOKENS = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
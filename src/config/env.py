@@ -14,6 +14,181 @@ class Settings(BaseSettings):
     GITHUB_APP_ID: int = 0
     GITHUB_PRIVATE_KEY: str = ""
 
+    # Near-duplicate hunk reuse (similarity is 1 - hamming distance / 64 between SimHashes)
+    REVIEW_DEDUP_ENABLED: bool = True
+    REVIEW_DEDUP_THRESHOLD: float = 0.95
+    REVIEW_DEDUP_REUSE_THRESHOLD: float = 1.0
+    REVIEW_DEDUP_MIN_TOKENS: int = 24
+
+    # Files kept out of the LLM payload
+    REVIEW_EXCLUDE_ENABLED: bool = True
+    REVIEW_EXCLUDE_GLOBS: list[str] = [
+        "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock",
+        "uv.lock", "Cargo.lock", "Gemfile.lock", "composer.lock", "go.sum",
+        "*.min.js", "*.min.css", "*.map", "*.snap", "__snapshots__/",
+        "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.pb.cc", "*.pb.h",
+        "vendor/", "third_party/", "node_modules/",
+    ]
+    REVIEW_EXCLUDE_REGEXES: list[str] = []
+    REVIEW_MAX_FILE_CHANGED_LINES: int = 3000
+    REVIEW_MAX_LINE_LENGTH: int = 1000
+    REVIEW_GITATTRIBUTES_ENABLED: bool = True
+
+    # Formatting-only hunks are dropped locally (Python hunks compared as ASTs when they parse)
+    REVIEW_COSMETIC_ENABLED: bool = True
+    REVIEW_COSMETIC_PYTHON_AST: bool = True
+
+    # Prompt diff rendering: "compact" (pre-annotated line numbers) or "unified" (raw diff)
+    REVIEW_PROMPT_FORMAT: str = "compact"
+    REVIEW_PROMPT_CONTEXT_LINES: int = 1
+    REVIEW_PROMPT_INCLUDE_REMOVED: bool = True
+
+    # Provider-side caching of static prompt prefixes (Gemini only caches prefixes above a minimum size)
+    LLM_PROMPT_CACHE_ENABLED: bool = True
+    LLM_PROMPT_CACHE_TTL_SECONDS: int = 3600
+    LLM_PROMPT_CACHE_REFRESH_MARGIN_SECONDS: int = 120
+    # Overrides the provider's per-model minimum; the static review prefix is only about 1k tokens
+    LLM_PROMPT_CACHE_MIN_TOKENS: int | None = None
+
+    # Model cascade: small/low-risk diffs go to the fast model, escalating on severe findings or low confidence
+    LLM_CASCADE_ENABLED: bool = True
+    LLM_FAST_MODEL: str = "gemini-2.5-flash"
+    LLM_STRONG_MODEL: str = "gemini-2.5-pro"
+    LLM_FAST_MAX_TOKENS: int = 1500
+    LLM_FAST_MAX_FILES: int = 4
+    # Whole words of a path (segments, or their parts split at _ - . and camelCase); plurals are listed explicitly
+    LLM_RISKY_PATH_PATTERNS: list[str] = [
+        "auth", "oauth", "authn", "authz", "security", "crypto", "secrets?", "passwords?", "token", "permissions?",
+        "payments?", "billing", "migrations?", "migrate",
+    ]
+    LLM_LOW_RISK_EXTENSIONS: list[str] = [".md", ".rst", ".txt", ".yml", ".yaml", ".toml", ".ini", ".cfg"]
+    LLM_ESCALATE_SEVERITY: int = 8
+    LLM_ESCALATE_MIN_CONFIDENCE: float = 0.6
+    LLM_METRICS_ENABLED: bool = True
+
+    # Post findings to the PR, streaming them from the model as they are generated
+    REVIEW_POST_COMMENTS: bool = True
+    LLM_STREAMING_ENABLED: bool = True
+
+    # Review output encoding: "json" (provider JSON-schema mode) or "compact" (line records)
+    LLM_OUTPUT_FORMAT: str = "json"
+
+    # Retry only the files a truncated or malformed review response left out, with a smaller output budget
+    LLM_PARTIAL_RETRY_ENABLED: bool = True
+    LLM_PARTIAL_RETRY_MAX_OUTPUT_TOKENS: int = 2048
+
+    # AIMD concurrency limit per model: grow while calls stay under the latency target, cut on 429/503
+    LLM_ADAPTIVE_CONCURRENCY_ENABLED: bool = True
+    LLM_CONCURRENCY_INITIAL: int = 4
+    LLM_CONCURRENCY_MIN: int = 1
+    LLM_CONCURRENCY_MAX: int = 32
+    LLM_CONCURRENCY_LATENCY_TARGET_MS: float = 60000
+    LLM_CONCURRENCY_BACKOFF: float = 0.5
+    LLM_CONCURRENCY_MAX_RETRIES: int = 4
+
+    # Hedge strong-tier reviews still running after a percentile of recent latency to a secondary model.
+    # The hedge model must differ from LLM_STRONG_MODEL: a hedge to the same model shares its slowdowns
+    LLM_HEDGING_ENABLED: bool = False
+    LLM_HEDGE_MODEL: str = "gemini-2.5-flash"
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_BUDGET: float = 0.05
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 10
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS: float = 90
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+
+    # Pack small fast-tier reviews from concurrent PRs into one request per window
+    LLM_MICRO_BATCH_ENABLED: bool = True
+    LLM_MICRO_BATCH_WINDOW_MS: float = 750
+    LLM_MICRO_BATCH_MAX_ITEMS: int = 8
+    LLM_MICRO_BATCH_MAX_TOKENS: int = 6000
+    LLM_MICRO_BATCH_MAX_DIFF_TOKENS: int = 800
+
+    # Send non-urgent (synchronize) reviews through the provider's asynchronous batch API
+    LLM_BULK_LANE_ENABLED: bool = False
+    LLM_BULK_GATHER_SECONDS: float = 30
+    LLM_BULK_MAX_JOBS: int = 100
+    LLM_BULK_POLL_SECONDS: float = 60
+    # Batch jobs not done (or not pollable) this long after submission are reviewed directly
+    LLM_BULK_DEADLINE_SECONDS: float = 24 * 3600
+
+    # Map-reduce review for diffs too large for one request: chunk, review in parallel, merge
+    REVIEW_MAP_REDUCE_ENABLED: bool = True
+    REVIEW_MAP_REDUCE_THRESHOLD_TOKENS: int = 60000
+    REVIEW_MAP_CHUNK_TOKENS: int = 16000
+    REVIEW_MAP_CONCURRENCY: int = 4
+    REVIEW_REDUCE_FAN_IN: int = 12
+
+    # Local compile/lint pre-pass on changed files at the head SHA; the LLM prompt then skips those checks
+    REVIEW_LINT_ENABLED: bool = True
+    REVIEW_LINTERS: list[str] = ["python-compile", "ruff", "eslint"]
+    REVIEW_LINT_RUFF_COMMAND: str = "ruff"
+    REVIEW_LINT_ESLINT_COMMAND: str = "eslint"  # eslint_d keeps a warm daemon and takes the same arguments
+    REVIEW_LINT_WORKERS: int = 8
+    REVIEW_LINT_TIMEOUT_SECONDS: float = 20
+
+    # Full file contents cached by git blob SHA (compressed in the database, LRU in memory)
+    GITHUB_BLOB_CACHE_ENABLED: bool = True
+    GITHUB_BLOB_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024
+    GITHUB_BLOB_FETCH_WORKERS: int = 8
+    GITHUB_BLOB_ARCHIVE_THRESHOLD: int = 50
+    GITHUB_BLOB_ARCHIVE_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    # Optional bare git mirror per repository: diffs and file contents computed locally instead of via REST
+    GITHUB_MIRROR_ENABLED: bool = False
+    GITHUB_MIRROR_DIR: str = ".cache/mirrors"
+    GITHUB_MIRROR_MAX_BYTES: int = 20 * 1024 * 1024 * 1024
+    GITHUB_MIRROR_TIMEOUT_SECONDS: float = 300
+
+    # Per-repository symbol/import index; signatures of symbols a diff references are added to its prompt
+    REVIEW_SYMBOL_INDEX_ENABLED: bool = True
+    REVIEW_SYMBOL_CONTEXT_MAX_TOKENS: int = 600
+    REVIEW_SYMBOL_CONTEXT_MAX_SYMBOLS: int = 20
+    REVIEW_SYMBOL_INDEX_MAX_FILE_BYTES: int = 512 * 1024
+    # Per-PR indexes not synced for this long are dropped
+    REVIEW_SYMBOL_INDEX_TTL_DAYS: float = 14
+
+    # Grow hunks to their enclosing function/class, within an extra-context token budget per file
+    REVIEW_SCOPE_EXPANSION_ENABLED: bool = True
+    REVIEW_SCOPE_MAX_FILE_TOKENS: int = 1500
+
+    # Risk-ranked sampling: review the highest-risk files within a diff token budget (and, for chunked reviews, a time budget; 0 = none)
+    REVIEW_SAMPLE_ENABLED: bool = True
+    REVIEW_SAMPLE_MAX_TOKENS: int = 200000
+    REVIEW_SAMPLE_MAX_SECONDS: float = 0
+
+    # Moved code: skip pure renames and blocks of at least REVIEW_MOVED_MIN_LINES lines moved unchanged
+    REVIEW_MOVED_CODE_ENABLED: bool = True
+    REVIEW_MOVED_MIN_LINES: int = 3
+
+    # Existing review comments: don't repost findings already on the PR, and mark outdated ones resolved
+    REVIEW_COMMENT_DEDUP_ENABLED: bool = True
+    REVIEW_RESOLVE_FIXED_COMMENTS: bool = True
+
+    # False-positive suppression: fingerprints of dismissed findings per repository, checked through a Bloom filter
+    REVIEW_SUPPRESSION_ENABLED: bool = True
+    REVIEW_SUPPRESSION_FP_RATE: float = 0.01
+    REVIEW_SUPPRESSION_TTL_DAYS: float = 180
+    REVIEW_SUPPRESSION_REBUILD_SECONDS: float = 24 * 60 * 60
+
+    # Generated tests: write pytest tests for Python changes and run them against the head checkout (runs generated code, so opt-in)
+    REVIEW_TEST_EXECUTION_ENABLED: bool = False
+    REVIEW_TEST_GENERATION_MAX_TOKENS: int = 30000
+    REVIEW_TEST_WORKERS: int = 0  # 0 = one per CPU core
+    REVIEW_TEST_TIMEOUT_SECONDS: float = 30
+    REVIEW_TEST_MEMORY_BYTES: int = 1024 * 1024 * 1024
+    # Generated tests run PR code (conftest.py, imported modules, package installs), so they are refused
+    # until both sandboxes are set. The sandbox must hide the service's files (App key, database) and the
+    # network, e.g. ["bwrap", "--unshare-all", "--die-with-parent", "--ro-bind", "/usr", "/usr",
+    # "--symlink", "usr/bin", "/bin", "--symlink", "usr/lib", "/lib", "--symlink", "usr/lib64", "/lib64",
+    # "--proc", "/proc", "--dev", "/dev", "--bind", "/tmp", "/tmp"] when checkouts live in /tmp and
+    # Python under /usr. Installs need the network and a writable REVIEW_TEST_ENV_DIR: add "--share-net"
+    # and "--bind", "<env dir>", "<env dir>" for REVIEW_TEST_INSTALL_SANDBOX_COMMAND.
+    REVIEW_TEST_SANDBOX_COMMAND: list[str] = []  # prefix for worker processes
+    REVIEW_TEST_INSTALL_SANDBOX_COMMAND: list[str] | None = None  # prefix for dependency installs; None = REVIEW_TEST_SANDBOX_COMMAND
+    REVIEW_TEST_ENV_DIR: str = ".cache/test-envs"
+    REVIEW_TEST_ENV_TIMEOUT_SECONDS: float = 600
+    REVIEW_TEST_MAX_ENVIRONMENTS: int = 16
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # Read GitHub private key from file if not provided in env
@@ -22,6 +197,7 @@ class Settings(BaseSettings):
 
         # Validate GitHub App configuration
         self._validate_github_config()
+        self._validate_hedging_config()
 
     def _validate_github_config(self):
         """Validate GitHub App configuration"""
@@ -48,6 +224,14 @@ class Settings(BaseSettings):
         else:
             print("✅ GitHub App configuration appears valid")
 
+    def _validate_hedging_config(self):
+        """Warn when hedging would send the hedge to the model it is hedging"""
+        if self.LLM_HEDGING_ENABLED and self.LLM_HEDGE_MODEL == self.LLM_STRONG_MODEL:
+            print(
+                f"⚠️  LLM_HEDGE_MODEL is the same as LLM_STRONG_MODEL ({self.LLM_STRONG_MODEL}); "
+                "hedges will queue behind the same slow model. Set LLM_HEDGE_MODEL to a different model."
+            )
+
     def read_github_private_key(self) -> str:
         """Read GitHub private key from file"""
         try:
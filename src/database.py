@@ -1 +1,31 @@
-# Mongo DB instance
\ No newline at end of file
+# SQLite database instance
+import sqlite3
+from pathlib import Path
+from typing import Optional
+from src.config.env import settings
+from src.exceptions import DatabaseError
+
+SQLITE_URL_PREFIX = "sqlite:///"
+
+
+def get_database_path() -> Path:
+    """Resolve the SQLite file path from DATABASE_URL"""
+    if not settings.DATABASE_URL.startswith(SQLITE_URL_PREFIX):
+        raise DatabaseError(f"Unsupported DATABASE_URL: {settings.DATABASE_URL}")
+    return Path(settings.DATABASE_URL[len(SQLITE_URL_PREFIX):])
+
+
+def get_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """Open a connection to the project database.
+
+    WAL mode lets several workers read while one of them writes, which is
+    what the review caches need when webhooks are processed concurrently.
+    """
+    path = Path(db_path) if db_path else get_database_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+    except sqlite3.Error as e:
+        raise DatabaseError(f"Failed to open database at {path}: {e}") from e
@@ -11,3 +11,22 @@ class DatabaseError(BaseError):
 class GitHubAPIError(BaseError):
     """Exception raised for GitHub API errors."""
     pass
+
+class GitMirrorError(BaseError):
+    """Exception raised when a git command on a local repository mirror fails."""
+    pass
+
+class TestEnvironmentError(BaseError):
+    """Exception raised when the environment for running generated tests cannot be prepared."""
+    pass
+
+class PartialResponseError(BaseError):
+    """
+    Exception raised when an LLM response was truncated or malformed; `response` holds what could be salvaged
+    and `backend`, when set, is the model backend that produced it (so a retry goes to the same tier).
+    """
+
+    def __init__(self, message, response=None, backend=None):
+        super().__init__(message)
+        self.response = response
+        self.backend = backend
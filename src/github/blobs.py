@@ -0,0 +1,269 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from src.config.env import settings
+from src.database import get_connection
+from src.exceptions import DatabaseError
+from src.github.client import github_download_tarball, github_git_blob, github_git_tree
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blob_contents (
+    sha TEXT PRIMARY KEY,
+    content BLOB NOT NULL
+);
+"""
+
+_COMMIT_SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+def git_blob_sha(data: bytes) -> str:
+    """The SHA git gives a file with this content"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class BlobStore:
+    """
+    File contents keyed by git blob SHA: zlib-compressed in SQLite, with an in-memory
+    LRU in front. A SHA always names the same bytes, so entries never go stale and
+    are shared by every repository, PR and push that contains the same file.
+    """
+
+    def __init__(self, memory_bytes: Optional[int] = None, db_path: Optional[str] = None):
+        self.memory_bytes = memory_bytes if memory_bytes is not None else settings.GITHUB_BLOB_CACHE_MEMORY_BYTES
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        try:
+            self.conn = get_connection(db_path)
+            self.conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to initialise blob content store: {e}") from e
+
+    def _remember(self, sha: str, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        if sha in self._memory:
+            self._memory.move_to_end(sha)
+            return
+        self._memory[sha] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def get(self, sha: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(sha)
+            if data is not None:
+                self._memory.move_to_end(sha)
+                return data
+            try:
+                row = self.conn.execute("SELECT content FROM blob_contents WHERE sha = ?", (sha,)).fetchone()
+            except sqlite3.Error as e:
+                raise DatabaseError(f"Failed to read blob {sha}: {e}") from e
+            if row is None:
+                return None
+            data = zlib.decompress(row[0])
+            self._remember(sha, data)
+            return data
+
+    def put(self, sha: str, data: bytes) -> None:
+        compressed = zlib.compress(data)
+        with self._lock:
+            try:
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO blob_contents (sha, content) VALUES (?, ?)", (sha, compressed)
+                    )
+            except sqlite3.Error as e:
+                raise DatabaseError(f"Failed to store blob {sha}: {e}") from e
+            self._remember(sha, data)
+
+
+class BlobContentCache:
+    """
+    Full file contents of a repository at a commit, served from the BlobStore.
+    Paths are resolved to blob SHAs with one recursive Git trees request per commit;
+    only SHAs not stored yet are downloaded, through the Git blobs API in parallel or,
+    past `archive_threshold` misses (or when the tree listing is truncated), through a
+    tarball streamed to disk. Tarballs of commit SHAs are downloaded once and kept for
+    later calls (such as the batches of a symbol index sync); one over
+    `archive_max_bytes` is not downloaded at all and blobs are fetched instead.
+    """
+
+    def __init__(
+        self,
+        store: Optional[BlobStore] = None,
+        archive_threshold: Optional[int] = None,
+        workers: Optional[int] = None,
+        fetch_tree: Callable[[str, str, int], Tuple[Dict[str, str], bool]] = github_git_tree,
+        fetch_blob: Callable[[str, str, int], bytes] = github_git_blob,
+        fetch_tarball: Callable[[str, str, int, str, Optional[int]], None] = github_download_tarball,
+        archive_max_bytes: Optional[int] = None,
+        max_trees: int = 32,
+        max_archives: int = 4,
+    ):
+        self.store = store or BlobStore()
+        self.archive_threshold = (
+            archive_threshold if archive_threshold is not None else settings.GITHUB_BLOB_ARCHIVE_THRESHOLD
+        )
+        self.archive_max_bytes = (
+            archive_max_bytes if archive_max_bytes is not None else settings.GITHUB_BLOB_ARCHIVE_MAX_BYTES
+        )
+        self.workers = workers if workers is not None else settings.GITHUB_BLOB_FETCH_WORKERS
+        self.fetch_tree = fetch_tree
+        self.fetch_blob = fetch_blob
+        self.fetch_tarball = fetch_tarball
+        self.max_trees = max_trees
+        self.max_archives = max_archives
+        self._trees: "OrderedDict[Tuple[str, str], Tuple[Dict[str, str], bool]]" = OrderedDict()
+        # Downloaded tarball per (repository, commit SHA); None records a download that failed
+        self._archives: "OrderedDict[Tuple[str, str], Optional[str]]" = OrderedDict()
+        self._archive_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._archive_dir: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def tree(self, repo_full_name: str, ref: str, installation_id: int) -> Tuple[Dict[str, str], bool]:
+        """Path -> blob SHA at `ref`; kept in memory when `ref` is a commit SHA, since that never changes"""
+        key = (repo_full_name, ref)
+        with self._lock:
+            if key in self._trees:
+                self._trees.move_to_end(key)
+                return self._trees[key]
+        tree = self.fetch_tree(repo_full_name, ref, installation_id)
+        if _COMMIT_SHA_RE.match(ref):
+            with self._lock:
+                self._trees[key] = tree
+                while len(self._trees) > self.max_trees:
+                    self._trees.popitem(last=False)
+        return tree
+
+    def _archive(self, repo_full_name: str, ref: str, installation_id: int) -> str:
+        """
+        Path of the tarball of `ref` on disk. For a commit SHA it is downloaded once and
+        kept (as is a failed download, so it is not retried per call); for other refs the
+        caller gets its own download and removes it.
+        """
+        key = (repo_full_name, ref)
+        keep = bool(_COMMIT_SHA_RE.match(ref))
+        with self._lock:
+            lock = self._archive_locks.setdefault(key, threading.Lock()) if keep else threading.Lock()
+            if self._archive_dir is None:
+                self._archive_dir = tempfile.mkdtemp(prefix="github-archives-")
+        with lock:
+            with self._lock:
+                if key in self._archives:
+                    self._archives.move_to_end(key)
+                    if self._archives[key] is None:
+                        raise ValueError(f"Tarball of {repo_full_name}@{ref} could not be downloaded before")
+                    return self._archives[key]
+            fd, path = tempfile.mkstemp(dir=self._archive_dir, suffix=".tar.gz")
+            os.close(fd)
+            try:
+                self.fetch_tarball(repo_full_name, ref, installation_id, path, self.archive_max_bytes)
+            except Exception:
+                os.remove(path)
+                if keep:
+                    self._keep_archive(key, None)
+                raise
+            if keep:
+                self._keep_archive(key, path)
+            return path
+
+    def _keep_archive(self, key: Tuple[str, str], path: Optional[str]) -> None:
+        with self._lock:
+            self._archives[key] = path
+            while len(self._archives) > self.max_archives:
+                evicted_key, evicted = self._archives.popitem(last=False)
+                self._archive_locks.pop(evicted_key, None)
+                if evicted is not None and os.path.exists(evicted):
+                    os.remove(evicted)
+
+    def _from_archive(
+        self, repo_full_name: str, ref: str, installation_id: int, paths: Iterable[str]
+    ) -> Dict[str, str]:
+        """Store the wanted files from the tarball of `ref`; returns path -> blob SHA of those found"""
+        wanted = set(paths)
+        found = {}
+        archive = self._archive(repo_full_name, ref, installation_id)
+        try:
+            with tarfile.open(archive, mode="r:gz") as tar:
+                for member in tar:
+                    # Members sit under a single "<owner>-<repo>-<sha>/" directory
+                    path = member.name.split("/", 1)[1] if "/" in member.name else ""
+                    if not member.isfile() or path not in wanted:
+                        continue
+                    data = tar.extractfile(member).read()
+                    sha = git_blob_sha(data)
+                    self.store.put(sha, data)
+                    found[path] = sha
+        finally:
+            if not _COMMIT_SHA_RE.match(ref):
+                os.remove(archive)
+        logger.debug(f"📦 Stored {len(found)} of {len(wanted)} file(s) from the {repo_full_name} tarball")
+        return found
+
+    def _fetch_blob(self, repo_full_name: str, sha: str, installation_id: int) -> None:
+        data = self.fetch_blob(repo_full_name, sha, installation_id)
+        if git_blob_sha(data) != sha:
+            raise ValueError(f"Blob {sha} of {repo_full_name} does not match its content")
+        self.store.put(sha, data)
+
+    def contents(
+        self, repo_full_name: str, ref: str, paths: Iterable[str], installation_id: int
+    ) -> Dict[str, Optional[str]]:
+        """
+        Text content of each path at `ref`; None for paths that do not exist, are
+        binary or could not be fetched.
+        """
+        paths = list(dict.fromkeys(paths))
+        tree, truncated = self.tree(repo_full_name, ref, installation_id)
+        shas = {path: tree[path] for path in paths if path in tree}
+        unlisted = [path for path in paths if path not in tree] if truncated else []
+        missing = sorted({sha for sha in shas.values() if self.store.get(sha) is None})
+
+        if unlisted or len(missing) >= self.archive_threshold:
+            try:
+                missing_paths = [path for path, sha in shas.items() if sha in missing]
+                shas.update(self._from_archive(repo_full_name, ref, installation_id, missing_paths + unlisted))
+            except Exception as e:
+                logger.warning(f"Tarball download of {repo_full_name}@{ref} failed, fetching blobs instead: {e}")
+            missing = sorted({sha for sha in shas.values() if self.store.get(sha) is None})
+
+        if missing:
+            logger.debug(f"📥 Fetching {len(missing)} blob(s) of {repo_full_name} ({len(shas) - len(missing)} cached)")
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="github-blobs") as executor:
+                futures = {sha: executor.submit(self._fetch_blob, repo_full_name, sha, installation_id) for sha in missing}
+            for sha, future in futures.items():
+                if future.exception() is not None:
+                    logger.warning(f"Fetching blob {sha} of {repo_full_name} failed: {future.exception()}")
+
+        result = {}
+        for path in paths:
+            data = self.store.get(shas[path]) if path in shas else None
+            result[path] = None if data is None or b"\0" in data else data.decode("utf-8", errors="replace")
+        return result
+
+
+_default_blob_cache: Optional[BlobContentCache] = None
+_default_blob_cache_lock = threading.Lock()
+
+
+def default_blob_cache() -> BlobContentCache:
+    """Process-wide blob content cache, so its memory LRU is shared by every review"""
+    global _default_blob_cache
+    with _default_blob_cache_lock:
+        if _default_blob_cache is None:
+            _default_blob_cache = BlobContentCache()
+        return _default_blob_cache
@@ -1,14 +1,28 @@
 import requests
+import base64
 import hmac
 import hashlib
 import jwt
 import time
 import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
 from src.config.env import settings
+from src.config.constant import (
+    GITHUB_COMMIT_INLINE_COMMENT_URL_TEMPLATE,
+    GITHUB_GIT_BLOB_URL_TEMPLATE,
+    GITHUB_GIT_TREE_URL_TEMPLATE,
+    GITHUB_REPO_CONTENTS_URL_TEMPLATE,
+    GITHUB_REVIEW_COMMENT_URL_TEMPLATE,
+    GITHUB_TARBALL_URL_TEMPLATE,
+)
 from http import HTTPMethod
 import logging
 
-from src.github.types import GithubPRRequest, GithubPrDiffResponse, PRReviewResponse
+from src.github.types import DiffIssue, GithubPRRequest, GithubPrDiffResponse, PRReviewResponse, ReviewCommentList
+from src.github.comments import ReviewCommentIndex, resolved_comment_body
+from src.github.suppression import SuppressionSet, issue_fingerprint, new_file_lines
+from src.github.utils import diff_line_mapping, issue_comment_body, parse_issue_line
 
 logger = logging.getLogger(__name__)
 
@@ -26,96 +40,272 @@ def github_pr_diff_content(payload__pull_request__diff_url: str, installation_id
 
     return GithubPrDiffResponse(diff_text=response.text)
 
-def post_pr_comments(payload: GithubPRRequest, review_response: PRReviewResponse):
-    if not review_response.issues:
-        logger.debug("No issues found in the diff, skipping comment posting")
-        return
-    diff_info = _get_diff_line_mapping(payload)
-    logger.debug(f"🔍 Parsed diff info for {diff_info}")
-
-    for file_path, line_map in diff_info.items():
-        if line_map:
-            logger.debug(
-                f"📊 {file_path}: lines {min(line_map.keys())}-{max(line_map.keys())} available"
-            )
-        else:
-            logger.debug(f"📊 {file_path}: no lines found in diff")
-
-    successful_comments = 0
-    for issue in review_response.issues:
-        emoji = {"error": "🚫", "warning": "⚠️", "suggestion": "💡"}.get(
-            issue.type, "ℹ️"
-        )
-        comment_body = f"""{emoji} **{issue.type.title()}** ({issue.severity} severity)
-        
-        {issue.message}"""
-
-        # Parse the line number from the issue
-        try:
-            line_num = (
-                int(issue.line.split("-")[0])
-                if "-" in issue.line
-                else int(issue.line)
-            )
-        except (ValueError, AttributeError):
-            logger.debug(f"⚠️ Invalid line number format: {issue.line}, skipping comment")
-            continue
-
-        # Check if this file and line exist in the diff
-        file_path = issue.file
-        diff_position = _get_diff_position(diff_info, file_path, line_num)
-
-        if diff_position is None:
-            logger.debug(
-                f"⚠️ Line {line_num} in file {file_path} not found in diff, posting as general PR comment"
-            )
-            # Fall back to posting as a general PR comment (issue comment)
-            success = _post_general_pr_comment(
-                payload, installation_token, comment_body, file_path, line_num
-            )
-            if success:
-                successful_comments += 1
-            continue
-
-        # Use both position and line parameters for compatibility
-        api_payload = {
-            "body": comment_body,
-            "commit_id": payload.pull_request.head.sha,
-            "path": file_path,
-            "position": diff_position,
-            "line": line_num,
-            "side": "RIGHT",
-        }
+def github_file_content(repo_full_name: str, path: str, ref: str, installation_id: int) -> Optional[str]:
+    """Fetch a text file from the repository at `ref`, or None if it does not exist."""
+    owner, repo = repo_full_name.split("/", 1)
+    url = GITHUB_REPO_CONTENTS_URL_TEMPLATE.format(owner=owner, repo=repo, path=path, ref=ref)
+    try:
+        response = call_github_api(url, HTTPMethod.GET, installation_id=installation_id)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+    return base64.b64decode(response.json()["content"]).decode("utf-8", errors="replace")
+
+
+def github_git_tree(repo_full_name: str, ref: str, installation_id: int) -> Tuple[Dict[str, str], bool]:
+    """Blob SHA of every file in the tree at `ref`, and whether GitHub truncated the listing."""
+    owner, repo = repo_full_name.split("/", 1)
+    url = GITHUB_GIT_TREE_URL_TEMPLATE.format(owner=owner, repo=repo, ref=ref)
+    data = call_github_api(url, HTTPMethod.GET, installation_id=installation_id).json()
+    blobs = {entry["path"]: entry["sha"] for entry in data.get("tree", []) if entry.get("type") == "blob"}
+    return blobs, bool(data.get("truncated"))
+
+
+def github_git_blob(repo_full_name: str, sha: str, installation_id: int) -> bytes:
+    """Raw content of a blob by its SHA."""
+    owner, repo = repo_full_name.split("/", 1)
+    url = GITHUB_GIT_BLOB_URL_TEMPLATE.format(owner=owner, repo=repo, sha=sha)
+    return base64.b64decode(call_github_api(url, HTTPMethod.GET, installation_id=installation_id).json()["content"])
+
+
+def github_clone_url(repo_full_name: str) -> str:
+    """HTTPS git URL of the repository; authenticate with `github_git_auth_header`, never in the URL."""
+    return f"https://github.com/{repo_full_name}.git"
+
+
+def github_git_auth_header(installation_id: int) -> str:
+    """HTTP header authenticating git with the installation token (valid for about an hour)."""
+    credentials = base64.b64encode(f"x-access-token:{_cached_installation_token(installation_id)}".encode()).decode()
+    return f"Authorization: Basic {credentials}"
+
+
+def github_tarball(repo_full_name: str, ref: str, installation_id: int) -> bytes:
+    """Gzipped tarball of the repository at `ref` (one request, however many files it holds)."""
+    owner, repo = repo_full_name.split("/", 1)
+    url = GITHUB_TARBALL_URL_TEMPLATE.format(owner=owner, repo=repo, ref=ref)
+    return call_github_api(url, HTTPMethod.GET, installation_id=installation_id).content
+
 
+def github_download_tarball(
+    repo_full_name: str, ref: str, installation_id: int, dest: str, max_bytes: Optional[int] = None
+) -> None:
+    """Stream the gzipped tarball of the repository at `ref` to `dest`, refusing archives over `max_bytes`."""
+    owner, repo = repo_full_name.split("/", 1)
+    url = GITHUB_TARBALL_URL_TEMPLATE.format(owner=owner, repo=repo, ref=ref)
+    with call_github_api(url, HTTPMethod.GET, installation_id=installation_id, stream=True) as resp:
+        if max_bytes is not None and int(resp.headers.get("Content-Length") or 0) > max_bytes:
+            raise ValueError(f"Tarball of {repo_full_name}@{ref} is larger than {max_bytes} bytes")
+        written = 0
+        with open(dest, "wb") as out:
+            for chunk in resp.iter_content(chunk_size=1024 * 1024):
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    raise ValueError(f"Tarball of {repo_full_name}@{ref} is larger than {max_bytes} bytes")
+                out.write(chunk)
+
+
+def github_pr_head_sha(payload: GithubPRRequest) -> str:
+    """Current head commit of the PR, which may have moved since the webhook was sent."""
+    resp = call_github_api(payload.pull_request.url, HTTPMethod.GET, installation_id=payload.installation.id)
+    return resp.json()["head"]["sha"]
+
+
+def github_pr_review_comments(payload: GithubPRRequest) -> ReviewCommentList:
+    """Every review comment on the PR, following the API's pagination"""
+    url = f"{payload.pull_request.review_comments_url}?per_page=100"
+    comments = []
+    while url:
+        resp = call_github_api(url, HTTPMethod.GET, installation_id=payload.installation.id)
+        comments.extend(resp.json())
+        url = resp.links.get("next", {}).get("url")
+    return ReviewCommentList(comments)
+
+
+def github_update_review_comment(payload: GithubPRRequest, comment_id: int, body: str) -> None:
+    url = GITHUB_REVIEW_COMMENT_URL_TEMPLATE.format(
+        owner=payload.repository.owner.login, repo=payload.repository.name, comment_id=comment_id
+    )
+    call_github_api(url, HTTPMethod.PATCH, installation_id=payload.installation.id, data={"body": body})
+
+
+def post_pr_comment(payload: GithubPRRequest, issue: DiffIssue, diff_info: Dict[str, Dict[int, int]]) -> bool:
+    """Post one issue as an inline review comment, falling back to a general PR comment."""
+    comment_body = issue_comment_body(issue)
+
+    # Parse the line number from the issue
+    line_range = parse_issue_line(issue.line)
+    if line_range is None:
+        logger.debug(f"⚠️ Invalid line number format: {issue.line}, skipping comment")
+        return False
+    line_num = line_range[0]
+
+    # Check if this file and line exist in the diff
+    file_path = issue.file
+    diff_position = _get_diff_position(diff_info, file_path, line_num)
+
+    if diff_position is None:
         logger.debug(
-            f"📝 Posting PR comment to {file_path}:{line_num} (diff position: {diff_position})"
+            f"⚠️ Line {line_num} in file {file_path} not found in diff, posting as general PR comment"
         )
-        response = requests.post(url, json=api_payload, headers=headers)
-        if response.status_code == 201:
-            logger.debug(f"✅ Posted comment for {file_path}:{line_num}")
-            successful_comments += 1
-        else:
-            logger.debug(f"❌ Failed ({response.status_code}): {response.text}")
-            # Try fallback to general PR comment
-            logger.debug(
-                f"🔄 Trying fallback to general PR comment for {file_path}:{line_num}"
-            )
-            success = _post_general_pr_comment(
-                payload, installation_token, comment_body, file_path, line_num
-            )
-            if success:
-                successful_comments += 1
+        # Fall back to posting as a general PR comment (issue comment)
+        return _post_general_pr_comment(payload, comment_body, file_path, line_num)
+
+    # Use both position and line parameters for compatibility
+    api_payload = {
+        "body": comment_body,
+        "commit_id": payload.pull_request.head.sha,
+        "path": file_path,
+        "position": diff_position,
+        "line": line_num,
+        "side": "RIGHT",
+    }
+    url = GITHUB_COMMIT_INLINE_COMMENT_URL_TEMPLATE.format(
+        owner=payload.repository.owner.login,
+        repo=payload.repository.name,
+        pull_number=payload.pull_request.number,
+    )
 
     logger.debug(
-        f"🎯 Posted {successful_comments}/{len(review_response.issues)} comments successfully"
+        f"📝 Posting PR comment to {file_path}:{line_num} (diff position: {diff_position})"
     )
+    try:
+        call_github_api(url, HTTPMethod.POST, installation_id=payload.installation.id, data=api_payload)
+        logger.debug(f"✅ Posted comment for {file_path}:{line_num}")
+        return True
+    except requests.HTTPError as e:
+        logger.debug(f"❌ Failed ({e.response.status_code if e.response is not None else '?'}): {e}")
+        # Try fallback to general PR comment
+        logger.debug(
+            f"🔄 Trying fallback to general PR comment for {file_path}:{line_num}"
+        )
+        return _post_general_pr_comment(payload, comment_body, file_path, line_num)
+
+
+def post_pr_summary(payload: GithubPRRequest, summary: str) -> bool:
+    """Post the overall review summary as a general PR comment."""
+    try:
+        call_github_api(
+            payload.pull_request.comments_url,
+            HTTPMethod.POST,
+            installation_id=payload.installation.id,
+            data={"body": f"🤖 **Review summary**\n\n{summary}"},
+        )
+        return True
+    except requests.HTTPError as e:
+        logger.debug(f"❌ Failed to post review summary: {e}")
+        return False
+
+
+class PRCommentPoster:
+    """
+    Posts review comments on a background thread as issues become available, so a
+    streaming review can publish findings while the model is still generating.
+    Comments go out one at a time, in order, as GitHub asks of content-creating requests.
+    With an `existing` comment index, issues already commented on the PR are not posted again;
+    with `suppressions`, findings matching ones the team dismissed before are not posted at all.
+    """
+
+    def __init__(
+        self,
+        payload: GithubPRRequest,
+        diff_text: str,
+        existing: Optional[ReviewCommentIndex] = None,
+        suppressions: Optional[SuppressionSet] = None,
+    ):
+        self.payload = payload
+        self.diff_info = diff_line_mapping(diff_text)
+        self.existing = existing
+        self.suppressions = suppressions
+        self.diff_lines = new_file_lines(diff_text) if suppressions is not None else {}
+        self.suppressed = 0
+        self.false_positives = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pr-comments")
+        self._futures: List[Future] = []
+
+    def submit(self, issue: DiffIssue) -> None:
+        if self.suppressions is not None:
+            fingerprint = issue_fingerprint(issue, self.diff_lines)
+            if fingerprint is not None and fingerprint in self.suppressions:
+                self.false_positives += 1
+                return
+        if self.existing is not None and not self.existing.claim(issue):
+            self.suppressed += 1
+            return
+        self._futures.append(self._executor.submit(post_pr_comment, self.payload, issue, self.diff_info))
+
+    def resolve_fixed(self, issues: List[DiffIssue], reviewed_paths: Set[str]) -> int:
+        """
+        Mark our earlier comments on `reviewed_paths` whose code has changed, and that
+        `issues` do not repeat, as resolved
+        """
+        if self.existing is None:
+            return 0
+        fixed = self.existing.fixed(issues, reviewed_paths)
+        for comment in fixed:
+            body = resolved_comment_body(comment, self.payload.pull_request.head.sha)
+            self._executor.submit(github_update_review_comment, self.payload, comment.id, body)
+        if fixed:
+            logger.debug(f"✅ Marking {len(fixed)} outdated comment(s) as resolved")
+        return len(fixed)
+
+    def close(self, summary: Optional[str] = None) -> int:
+        """Wait for queued comments, post the summary if given, and return how many comments were posted."""
+        successful_comments = 0
+        for future in self._futures:
+            try:
+                successful_comments += int(future.result())
+            except Exception as e:
+                logger.error(f"Error posting PR comment: {e}")
+        if summary:
+            self._executor.submit(post_pr_summary, self.payload, summary).result()
+        self._executor.shutdown()
+
+        logger.debug(
+            f"🎯 Posted {successful_comments}/{len(self._futures)} comments successfully"
+            f" ({self.suppressed} already on the PR, {self.false_positives} known false positives)"
+        )
+        return successful_comments
+
+
+def post_pr_comments(payload: GithubPRRequest, review_response: PRReviewResponse, diff_text: Optional[str] = None):
+    if not review_response.issues:
+        logger.debug("No issues found in the diff, skipping comment posting")
+        return
+    if diff_text is None:
+        diff_text = github_pr_diff_content(payload.pull_request.diff_url, payload.installation.id).diff_text
+
+    poster = PRCommentPoster(payload, diff_text)
+    logger.debug(f"🔍 Parsed diff info for {poster.diff_info}")
+    for issue in review_response.issues:
+        poster.submit(issue)
+    poster.close()
+
+
+def _get_diff_position(diff_info: Dict[str, Dict[int, int]], file_path: str, line_num: int) -> Optional[int]:
+    return diff_info.get(file_path, {}).get(line_num)
+
+
+def _post_general_pr_comment(payload: GithubPRRequest, comment_body: str, file_path: str, line_num: int) -> bool:
+    try:
+        call_github_api(
+            payload.pull_request.comments_url,
+            HTTPMethod.POST,
+            installation_id=payload.installation.id,
+            data={"body": f"**{file_path}:{line_num}**\n\n{comment_body}"},
+        )
+        return True
+    except requests.HTTPError as e:
+        logger.debug(f"❌ Failed to post general PR comment for {file_path}:{line_num}: {e}")
+        return False
 
 # ----------------------- AUTH UTILITIES -------------------------- #
 
-def call_github_api(url: str, method: HTTPMethod, installation_id: int, data: dict = None) -> requests.Response:
+def call_github_api(
+    url: str, method: HTTPMethod, installation_id: int, data: dict = None, stream: bool = False
+) -> requests.Response:
     try:
-        jwt_token = generate_jwt()
-        installation_token = get_installation_token(jwt_token, installation_id)
+        installation_token = _cached_installation_token(installation_id)
         headers = {
             "Authorization": f"Bearer {installation_token}",
             "Accept": "application/vnd.github+json",
@@ -124,9 +314,11 @@ def call_github_api(url: str, method: HTTPMethod, installation_id: int, data: di
 
         match method:
             case HTTPMethod.GET:
-                resp = requests.get(url, headers=headers)
+                resp = requests.get(url, headers=headers, stream=stream)
             case HTTPMethod.POST:
                 resp = requests.post(url, headers=headers, json=data)
+            case HTTPMethod.PATCH:
+                resp = requests.patch(url, headers=headers, json=data)
 
         resp.raise_for_status()
         return resp
@@ -134,6 +326,19 @@ def call_github_api(url: str, method: HTTPMethod, installation_id: int, data: di
         logger.error(f"Error calling GitHub API: {e}")
         raise
 
+# Installation tokens are valid for an hour; reuse them instead of minting one per request
+_INSTALLATION_TOKEN_TTL_SECONDS = 50 * 60
+_installation_tokens: Dict[int, tuple] = {}
+
+
+def _cached_installation_token(installation_id: int) -> str:
+    cached = _installation_tokens.get(installation_id)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    token = get_installation_token(generate_jwt(), installation_id)
+    _installation_tokens[installation_id] = (token, time.monotonic() + _INSTALLATION_TOKEN_TTL_SECONDS)
+    return token
+
 def _verify_signature(request_body: bytes, signature_header: str) -> bool:
     """
     Verifies X-Hub-Signature-256 header using HMAC SHA256.
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Set, Tuple
+from src.github.types import DiffIssue, GithubPRRequest, ReviewComment, ReviewCommentList
+from src.github.utils import issue_comment_body, parse_issue_line
+
+logger = logging.getLogger(__name__)
+
+# Header of the comments issue_comment_body() renders, which tells our comments from everyone else's
+_OWN_COMMENT_RE = re.compile(r"^\S+ \*\*\w+\*\* \(\d+ severity\)")
+RESOLVED_MARKER = "✅ **Resolved"
+# Replies that dismiss a finding rather than act on it
+_DISMISSAL_RE = re.compile(
+    r"\b(?:false positive|not an issue|not a bug|not relevant|won'?t fix|wontfix|by design|intended|ignore this)\b",
+    re.IGNORECASE,
+)
+
+CommentKey = Tuple[str, Optional[int], str]
+
+
+def normalised_body_hash(body: str) -> str:
+    """Hash of a comment body with case, punctuation, markup and spacing ignored"""
+    words = re.findall(r"[a-z0-9]+", body.lower())
+    return hashlib.sha1(" ".join(words).encode()).hexdigest()
+
+
+def is_own_comment(comment: ReviewComment) -> bool:
+    return bool(_OWN_COMMENT_RE.match(comment.body))
+
+
+def resolved_comment_body(comment: ReviewComment, head_sha: str) -> str:
+    """Body that marks one of our comments as resolved, keeping the original text folded away"""
+    return (
+        f"{RESOLVED_MARKER} in {head_sha[:7]}**: the code this comment was about has changed.\n\n"
+        f"<details><summary>Original comment</summary>\n\n{comment.body}\n\n</details>"
+    )
+
+
+def _issue_key(issue: DiffIssue) -> CommentKey:
+    line_range = parse_issue_line(issue.line)
+    path = issue.file.removeprefix("b/").removeprefix("a/")
+    return path, line_range[0] if line_range else None, normalised_body_hash(issue_comment_body(issue))
+
+
+def _dismissed(comments: List[ReviewComment]) -> List[ReviewComment]:
+    dismissed_ids = {
+        comment.in_reply_to_id
+        for comment in comments
+        if comment.in_reply_to_id is not None and not is_own_comment(comment) and _DISMISSAL_RE.search(comment.body)
+    }
+    return [
+        comment
+        for comment in comments
+        if is_own_comment(comment) and (comment.reactions.minus_one > 0 or comment.id in dismissed_ids)
+    ]
+
+
+class ReviewCommentIndex:
+    """
+    Our review comments already on a PR, keyed by path, current line and normalised
+    body hash. Issues found again are filtered out before posting, and comments whose
+    code has since changed can be found and marked resolved.
+    """
+
+    def __init__(self, comments: List[ReviewComment]):
+        self._lock = threading.Lock()
+        self._keys: Set[CommentKey] = set()
+        self._open: List[ReviewComment] = []
+        self._dismissed = _dismissed(comments)
+        for comment in comments:
+            if not is_own_comment(comment) or comment.body.startswith(RESOLVED_MARKER):
+                continue
+            self._open.append(comment)
+            # GitHub clears `line` on comments whose code is no longer in the diff
+            if comment.line is not None:
+                self._keys.add((comment.path, comment.line, normalised_body_hash(comment.body)))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def dismissed(self) -> List[ReviewComment]:
+        """Our comments the team dismissed, with a 👎 reaction or a dismissive reply"""
+        return self._dismissed
+
+    def claim(self, issue: DiffIssue) -> bool:
+        """True if the issue is not on the PR yet, recording it so it is not posted twice"""
+        key = _issue_key(issue)
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            return True
+
+    def fixed(self, issues: List[DiffIssue], reviewed_paths: Set[str]) -> List[ReviewComment]:
+        """
+        Our open comments on `reviewed_paths` whose code has changed (GitHub marks them
+        outdated) and whose finding the latest review did not raise again on the same
+        file. Comments on files the review did not cover are left alone. They are taken
+        out of the index, so each is reported once.
+        """
+        raised = {(path, body) for path, _, body in map(_issue_key, issues)}
+        with self._lock:
+            fixed = [
+                comment
+                for comment in self._open
+                if comment.line is None
+                and comment.path in reviewed_paths
+                and (comment.path, normalised_body_hash(comment.body)) not in raised
+            ]
+            fixed_ids = {comment.id for comment in fixed}
+            self._open = [comment for comment in self._open if comment.id not in fixed_ids]
+        return fixed
+
+
+_indexes: "OrderedDict[Tuple[str, int, str], ReviewCommentIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+_MAX_INDEXES = 256
+
+
+def pr_comment_index(
+    payload: GithubPRRequest, load: Callable[[GithubPRRequest], ReviewCommentList]
+) -> ReviewCommentIndex:
+    """
+    Comment index of the PR at its head SHA, loaded with `load` on first use. Later
+    deliveries for the same head (retries, re-requested reviews) reuse it, including
+    the comments posted since it was loaded.
+    """
+    key = (payload.repository.full_name, payload.pull_request.number, payload.pull_request.head.sha)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = ReviewCommentIndex(load(payload).root)
+    logger.debug(f"🗂️ Indexed {len(index)} existing review comment(s) on PR #{payload.pull_request.number}")
+    with _indexes_lock:
+        index = _indexes.setdefault(key, index)
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
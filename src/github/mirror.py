@@ -0,0 +1,325 @@
+import base64
+import fcntl
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+from pydantic import BaseModel
+from src.config.env import settings
+from src.exceptions import GitMirrorError
+
+logger = logging.getLogger(__name__)
+
+# Fetched commits are pinned under this namespace so they survive until the mirror is evicted
+_PIN_REF_PREFIX = "refs/testergpt/"
+_LAST_USED_FILE = "testergpt-last-used"
+# Credentials git may echo back from a remote URL
+_URL_CREDENTIALS_RE = re.compile(r"(?<=://)[^/@\s]+@")
+
+
+class RenamedFile(BaseModel):
+    old_path: str
+    new_path: str
+    similarity: int
+
+
+class GitMirror:
+    """
+    Bare mirror of one repository, filled with incremental fetches of just the commits
+    a review needs. Diffs, file contents and rename detection are computed with local
+    git commands. Fetches hold an exclusive lock on the mirror and reads a shared
+    one, so worker processes can use the same mirror. A review holds a lease on the
+    mirror from checkout until it is done, and eviction never removes a leased mirror.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        remote_url: str,
+        auth_header: Optional[str] = None,
+        timeout_seconds: Optional[float] = None,
+    ):
+        self.path = Path(path)
+        self.remote_url = remote_url
+        # Given to git through its environment on fetches only, so it is neither on the
+        # command line (visible in `ps`) nor written to the mirror config
+        self.auth_header = auth_header
+        self.timeout_seconds = timeout_seconds if timeout_seconds is not None else settings.GITHUB_MIRROR_TIMEOUT_SECONDS
+        self._leases = 0
+        self._lease_file = None
+        self._lease_lock = threading.Lock()
+
+    def _redact(self, text: str) -> str:
+        if self.auth_header:
+            secret = self.auth_header.split(" ")[-1]
+            text = text.replace(secret, "***")
+            try:
+                text = text.replace(base64.b64decode(secret).decode().split(":", 1)[-1], "***")
+            except ValueError:
+                pass
+        return _URL_CREDENTIALS_RE.sub("***@", text)
+
+    def _git(
+        self, *args: str, input: Optional[bytes] = None, check: bool = True, authenticated: bool = False
+    ) -> subprocess.CompletedProcess:
+        env = None
+        if authenticated and self.auth_header:
+            env = {
+                **os.environ,
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": "http.extraHeader",
+                "GIT_CONFIG_VALUE_0": self.auth_header,
+                "GIT_TERMINAL_PROMPT": "0",
+            }
+        result = subprocess.run(
+            ["git", "--git-dir", str(self.path), *args],
+            input=input,
+            capture_output=True,
+            timeout=self.timeout_seconds,
+            env=env,
+        )
+        if check and result.returncode != 0:
+            stderr = self._redact(result.stderr.decode(errors="replace"))
+            raise GitMirrorError(f"git {args[0]} failed in {self.path.name}: {stderr[:300]}")
+        return result
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def acquire_lease(self) -> None:
+        """
+        Keep the mirror from being evicted until the matching `release()`. Leases are
+        counted, and the first one takes a shared lock on the lease file, which holds
+        off eviction in every worker process.
+        """
+        with self._lease_lock:
+            if self._leases == 0:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                lease_file = open(f"{self.path}.lease", "a")
+                try:
+                    # Blocks while another worker is removing the mirror
+                    fcntl.flock(lease_file, fcntl.LOCK_SH)
+                except BaseException:
+                    lease_file.close()
+                    raise
+                self._lease_file = lease_file
+            self._leases += 1
+
+    def release(self) -> None:
+        with self._lease_lock:
+            if self._leases == 0:
+                return
+            self._leases -= 1
+            if self._leases == 0:
+                # Closing the file drops its lock
+                self._lease_file.close()
+                self._lease_file = None
+
+    def _touch(self) -> None:
+        (self.path / _LAST_USED_FILE).touch()
+
+    def has_commit(self, sha: str) -> bool:
+        return self.path.exists() and self._git("cat-file", "-e", f"{sha}^{{commit}}", check=False).returncode == 0
+
+    def fetch(self, shas: Iterable[str], refspecs: Iterable[str] = ()) -> None:
+        """
+        Make sure the given commits are present, fetching only those that are missing
+        (plus `refspecs`, for commits the remote only serves through a ref such as
+        refs/pull/<n>/head).
+        """
+        shas = list(dict.fromkeys(shas))
+        with self._locked(exclusive=True):
+            if not self.path.exists():
+                self._git("init", "--bare", "--quiet")
+                self._git("config", "gc.auto", "0")
+            missing = [sha for sha in shas if not self.has_commit(sha)]
+            if missing:
+                started = time.monotonic()
+                try:
+                    self._git(
+                        "fetch", "--quiet", "--no-tags", "--no-write-fetch-head", self.remote_url,
+                        *(f"+{sha}:{_PIN_REF_PREFIX}{sha}" for sha in missing),
+                        authenticated=True,
+                    )
+                except GitMirrorError:
+                    if not refspecs:
+                        raise
+                    # Some servers only serve advertised refs; fetch those and pin what arrived
+                    self._git(
+                        "fetch", "--quiet", "--no-tags", "--no-write-fetch-head", self.remote_url, *refspecs,
+                        authenticated=True,
+                    )
+                    for sha in missing:
+                        self._git("update-ref", f"{_PIN_REF_PREFIX}{sha}", sha)
+                logger.debug(f"🪞 Fetched {len(missing)} commit(s) into {self.path.name} in {time.monotonic() - started:.1f}s")
+            self._touch()
+
+    def diff(self, base: str, head: str) -> str:
+        """Unified diff of `head` against its merge base with `base`, as a PR shows it"""
+        with self._locked(exclusive=False):
+            self._touch()
+            return self._git(
+                "diff", "--no-color", "--no-ext-diff", "--find-renames", "--full-index", f"{base}...{head}"
+            ).stdout.decode("utf-8", errors="replace")
+
+    def file_contents(self, ref: str, paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Text of each path at `ref` through one `git cat-file --batch`; None for missing or binary files"""
+        paths = list(dict.fromkeys(paths))
+        with self._locked(exclusive=False):
+            self._touch()
+            output = self._git("cat-file", "--batch", input="".join(f"{ref}:{path}\n" for path in paths).encode()).stdout
+
+        contents, offset = {}, 0
+        for path in paths:
+            header_end = output.index(b"\n", offset)
+            header = output[offset:header_end].split()
+            if header[-1] == b"missing" or header[1] != b"blob":
+                contents[path], offset = None, header_end + 1
+                continue
+            size = int(header[2])
+            data = output[header_end + 1:header_end + 1 + size]
+            offset = header_end + 1 + size + 1
+            contents[path] = None if b"\0" in data else data.decode("utf-8", errors="replace")
+        return contents
+
+    def tree(self, ref: str) -> Dict[str, str]:
+        """Blob SHA of every file at `ref`"""
+        with self._locked(exclusive=False):
+            self._touch()
+            output = self._git("ls-tree", "-r", "-z", "--full-tree", ref).stdout
+        blobs = {}
+        for entry in output.decode("utf-8", errors="replace").split("\0"):
+            if not entry:
+                continue
+            info, path = entry.split("\t", 1)
+            _, kind, sha = info.split()
+            if kind == "blob":
+                blobs[path] = sha
+        return blobs
+
+    def archive(self, ref: str) -> bytes:
+        """Uncompressed tar of the tree at `ref`"""
+        with self._locked(exclusive=False):
+            self._touch()
+            return self._git("archive", "--format=tar", ref).stdout
+
+    def renames(self, base: str, head: str) -> List[RenamedFile]:
+        """Files git detects as renamed between the merge base of `base` and `head`"""
+        with self._locked(exclusive=False):
+            self._touch()
+            output = self._git("diff", "--name-status", "-z", "--find-renames", f"{base}...{head}").stdout
+        fields = output.decode("utf-8", errors="replace").split("\0")
+        renamed, index = [], 0
+        while index < len(fields) and fields[index]:
+            status = fields[index]
+            if status.startswith(("R", "C")):
+                if status.startswith("R"):
+                    renamed.append(
+                        RenamedFile(old_path=fields[index + 1], new_path=fields[index + 2], similarity=int(status[1:] or 100))
+                    )
+                index += 3
+            else:
+                index += 2
+        return renamed
+
+    def disk_usage(self) -> int:
+        return sum(f.stat().st_size for f in self.path.rglob("*") if f.is_file()) if self.path.exists() else 0
+
+    def last_used(self) -> float:
+        marker = self.path / _LAST_USED_FILE
+        return marker.stat().st_mtime if marker.exists() else 0.0
+
+    def remove_if_unused(self) -> bool:
+        """Delete the mirror unless a review holds a lease on it or another worker holds its lock"""
+        with open(f"{self.path}.lease", "a") as lease_file, open(f"{self.path}.lock", "a") as lock_file:
+            try:
+                fcntl.flock(lease_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                shutil.rmtree(self.path, ignore_errors=True)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                fcntl.flock(lease_file, fcntl.LOCK_UN)
+        return True
+
+
+class MirrorPool:
+    """
+    Mirrors under one directory, one per repository. After each fetch the least
+    recently used mirrors that no review holds a lease on are evicted until their
+    total size is under `max_bytes`.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root or settings.GITHUB_MIRROR_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else settings.GITHUB_MIRROR_MAX_BYTES
+        self._evict_lock = threading.Lock()
+
+    def mirror(self, repo_full_name: str, remote_url: str, auth_header: Optional[str] = None) -> GitMirror:
+        owner, repo = repo_full_name.split("/", 1)
+        return GitMirror(self.root / owner / f"{repo}.git", remote_url, auth_header)
+
+    def checkout(
+        self,
+        repo_full_name: str,
+        remote_url: str,
+        auth_header: Optional[str],
+        shas: Iterable[str],
+        refspecs: Iterable[str] = (),
+    ) -> GitMirror:
+        """
+        Mirror of the repository with the given commits fetched, leased so it is not
+        evicted while in use; the caller must `release()` it when done with it.
+        """
+        mirror = self.mirror(repo_full_name, remote_url, auth_header)
+        mirror.acquire_lease()
+        try:
+            mirror.fetch(shas, refspecs)
+        except BaseException:
+            mirror.release()
+            raise
+        self.evict(keep=mirror.path)
+        return mirror
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """Remove least recently used mirrors until the pool fits in `max_bytes`; returns how many went"""
+        with self._evict_lock:
+            mirrors = [GitMirror(path, "") for path in self.root.glob("*/*.git") if path.is_dir()]
+            sizes = {mirror.path: mirror.disk_usage() for mirror in mirrors}
+            total, removed = sum(sizes.values()), 0
+            for mirror in sorted(mirrors, key=lambda m: m.last_used()):
+                if total <= self.max_bytes:
+                    break
+                if mirror.path == keep or not mirror.remove_if_unused():
+                    continue
+                logger.debug(f"🧽 Evicted mirror {mirror.path.parent.name}/{mirror.path.name} ({sizes[mirror.path]} bytes)")
+                total -= sizes[mirror.path]
+                removed += 1
+            return removed
+
+
+_default_mirror_pool: Optional[MirrorPool] = None
+_default_mirror_pool_lock = threading.Lock()
+
+
+def default_mirror_pool() -> MirrorPool:
+    global _default_mirror_pool
+    with _default_mirror_pool_lock:
+        if _default_mirror_pool is None:
+            _default_mirror_pool = MirrorPool()
+        return _default_mirror_pool
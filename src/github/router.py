@@ -29,7 +29,8 @@ async def github_webhook(req: Request, background_tasks: BackgroundTasks):
                 return Response(content={"msg": "PR not open, skipping"}, status_code=200)
 
             if data.get("action") in ["opened", "synchronize"]:
-                await fresh_pr_review(payload, background_tasks)
+                # New pushes to an already reviewed PR can wait for the cheaper bulk lane
+                await fresh_pr_review(payload, background_tasks, urgent=data.get("action") == "opened")
 
             # elif data.get("action") == "synchronize":
             #     try:
@@ -1,38 +1,641 @@
 from fastapi import BackgroundTasks
-from src.llm.types import ReviewCodeDiffRequest
-from src.github.types import GithubPRRequest
-from src.github.client import github_pr_diff_content, post_pr_comments
+from src.config.env import settings
+from src.exceptions import PartialResponseError
+from src.llm.types import GenerateTestsRequest, ReviewCodeDiffRequest, ReviewCodeDiffResponse, VerifyIssuesRequest
+from src.github.types import DiffIssue, GithubPRRequest
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from src.github.blobs import default_blob_cache
+from src.github.client import (
+    PRCommentPoster,
+    github_clone_url,
+    github_git_auth_header,
+    github_file_content,
+    github_pr_head_sha,
+    github_tarball,
+    github_pr_diff_content,
+    github_pr_review_comments,
+)
+from src.github.comments import ReviewCommentIndex, pr_comment_index
+from src.github.mirror import GitMirror, default_mirror_pool
+from src.github.suppression import SuppressionSet, comment_fingerprint, suppression_set
+from src.github.utils import file_path_of, parse_diff
+from src.llm.batch_mode import default_bulk_lane
+from src.llm.batching import MicroBatcher, default_micro_batcher
+from src.llm.hedging import HedgedReviewer
+from src.llm.repair import merge_retry, unreviewed_files
+from src.llm.routing import FAST_TIER, STRONG_TIER, DiffSignals, ModelCascade
 from src.llm.service import LLMService
+from src.llm.tokens import estimate_tokens
+from src.review.chunking import chunk_patch
+from src.review.cosmetic import drop_cosmetic_hunks
+from src.review.dedup import HunkMatch, NearDuplicateIndex, render_matches
+from src.review.exclusions import default_exclusion_rules
+from src.review.lint import default_lint_pool
+from src.review.moves import drop_moved_code
+from src.review.symbols import SymbolIndex
+from src.review.testrun import extract_tarball, render_test_results, run_generated_tests, sandbox_error
+from src.review.render import render_compact
+from src.review.sampling import ReviewHistory, RiskScorer, sample_by_risk
+from src.review.scope import expand_to_scopes
+from src.review.types import PreparedDiff
+import asyncio
+import tempfile
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unidiff import PatchSet
 
 logger = logging.getLogger(__name__)
 
 
-async def fresh_pr_review(payload: GithubPRRequest, background_tasks: BackgroundTasks) -> None:
+def build_review_request(prepared: PreparedDiff) -> ReviewCodeDiffRequest:
+    """Render the prepared diff in the configured prompt format"""
+    if settings.REVIEW_PROMPT_FORMAT == "compact":
+        diff = render_compact(
+            prepared.patch,
+            # Scope-expanded hunks already hold exactly the context worth sending
+            context_lines=None if prepared.expanded_to_scope else settings.REVIEW_PROMPT_CONTEXT_LINES,
+            include_removed=settings.REVIEW_PROMPT_INCLUDE_REMOVED,
+        )
+        return ReviewCodeDiffRequest(
+            diff=diff, diff_format="compact", linted_languages=prepared.linted_languages, context=prepared.context
+        )
+    return ReviewCodeDiffRequest(
+        diff=prepared.diff_text, linted_languages=prepared.linted_languages, context=prepared.context
+    )
+
+
+def diff_signals(prepared: PreparedDiff, request: ReviewCodeDiffRequest) -> DiffSignals:
+    """Routing features of the diff that is about to be reviewed"""
+    return DiffSignals(
+        files=[file_path_of(patched_file) for patched_file in prepared.patch],
+        changed_lines=sum(patched_file.added + patched_file.removed for patched_file in prepared.patch),
+        estimated_tokens=estimate_tokens(request.diff),
+    )
+
+
+def run_review(
+    llm: Union[LLMService, HedgedReviewer, MicroBatcher],
+    reviewer: Optional[ModelCascade],
+    prepared: PreparedDiff,
+    on_issue: Callable[[DiffIssue], None],
+) -> ReviewCodeDiffResponse:
+    """Review the prepared diff, handing each issue to `on_issue` as early as the mode allows"""
+    review_request = build_review_request(prepared)
+    if (
+        settings.REVIEW_MAP_REDUCE_ENABLED
+        and estimate_tokens(review_request.diff) > settings.REVIEW_MAP_REDUCE_THRESHOLD_TOKENS
+    ):
+        chunks = chunk_patch(prepared.patch, settings.REVIEW_MAP_CHUNK_TOKENS)
+        if len(chunks) > 1:
+            return map_reduce_review(llm, reviewer, prepared, chunks, on_issue)
+    return review_once(llm, reviewer, prepared, review_request, on_issue)
+
+
+def review_once(
+    llm: Union[LLMService, HedgedReviewer, MicroBatcher],
+    reviewer: Optional[ModelCascade],
+    prepared: PreparedDiff,
+    review_request: ReviewCodeDiffRequest,
+    on_issue: Callable[[DiffIssue], None],
+) -> ReviewCodeDiffResponse:
+    """Review the prepared diff in a single LLM request (plus a partial-output retry if needed)"""
+    emitted = []
+
+    def emit(issue: DiffIssue) -> None:
+        emitted.append(issue)
+        on_issue(issue)
+
+    try:
+        if settings.LLM_STREAMING_ENABLED:
+            if reviewer is not None:
+                return reviewer.stream_review_code_diff(review_request, diff_signals(prepared, review_request), emit)
+            return llm.stream_review_code_diff(review_request, emit)
+
+        if reviewer is not None:
+            review_response = reviewer.review_code_diff(review_request, diff_signals(prepared, review_request))
+        else:
+            review_response = llm.review_code_diff(code_diff_request=review_request)
+    except PartialResponseError as e:
+        if not settings.LLM_PARTIAL_RETRY_ENABLED:
+            raise
+        salvaged = e.response or ReviewCodeDiffResponse()
+        for issue in salvaged.issues:
+            if issue not in emitted:
+                emit(issue)
+        # Under the cascade, retry on the tier that produced the partial response, not the fast one
+        return retry_unreviewed_files(e.backend or llm, prepared, salvaged, emit)
+
+    for issue in review_response.issues:
+        emit(issue)
+    return review_response
+
+
+def _issue_key(issue: DiffIssue) -> Tuple[str, str, str, str]:
+    return issue.file, issue.line, issue.type, " ".join(issue.message.lower().split())
+
+
+def reduce_summaries(llm: Union[LLMService, HedgedReviewer, MicroBatcher], summaries: List[str]) -> str:
+    """
+    Combine partial summaries with the LLM, in rounds of at most REVIEW_REDUCE_FAN_IN
+    at a time; if a combine call fails its group is kept as a plain list instead.
+    """
+    summaries = [summary for summary in summaries if summary.strip()]
+    fan_in = max(settings.REVIEW_REDUCE_FAN_IN, 2)
+    while len(summaries) > 1:
+        combined = []
+        for group in (summaries[i:i + fan_in] for i in range(0, len(summaries), fan_in)):
+            try:
+                combined.append(group[0] if len(group) == 1 else llm.combine_summaries(group))
+            except Exception as e:
+                logger.warning(f"Combining {len(group)} summaries failed, listing them instead: {e}")
+                combined.append("\n".join(f"- {summary}" for summary in group))
+        summaries = combined
+    return summaries[0] if summaries else ""
+
+
+def map_reduce_review(
+    llm: Union[LLMService, HedgedReviewer, MicroBatcher],
+    reviewer: Optional[ModelCascade],
+    prepared: PreparedDiff,
+    chunks: List[PatchSet],
+    on_issue: Callable[[DiffIssue], None],
+) -> ReviewCodeDiffResponse:
+    """
+    Review an oversized diff as independent chunks in parallel (map), then merge
+    their issues without duplicates and combine their summaries (reduce). A chunk
+    that fails is listed in the summary rather than failing the whole review.
+    Chunks start in order of their riskiest file; those not started within
+    REVIEW_SAMPLE_MAX_SECONDS are skipped and listed too.
+    """
+    logger.debug(f"🗺️ Diff too large for one request, reviewing it as {len(chunks)} chunks")
+    chunks = sorted(chunks, key=lambda chunk: -max((prepared.priorities.get(file_path_of(f), 0.0) for f in chunk), default=0.0))
+    deadline = time.monotonic() + settings.REVIEW_SAMPLE_MAX_SECONDS if settings.REVIEW_SAMPLE_MAX_SECONDS > 0 else None
+    out_of_time = set()
+    seen = set()
+    issues: List[DiffIssue] = []
+    lock = threading.Lock()
+
+    def emit(issue: DiffIssue) -> None:
+        with lock:
+            if _issue_key(issue) in seen:
+                return
+            seen.add(_issue_key(issue))
+            issues.append(issue)
+        on_issue(issue)
+
+    def review_chunk(index: int) -> Optional[ReviewCodeDiffResponse]:
+        chunk = chunks[index]
+        if deadline is not None and time.monotonic() > deadline:
+            with lock:
+                out_of_time.add(index)
+            return None
+        chunk_prepared = prepared.subset(chunk)
+        try:
+            return review_once(llm, reviewer, chunk_prepared, build_review_request(chunk_prepared), emit)
+        except Exception as e:
+            logger.warning(f"Review of a {len(chunk)}-file chunk failed: {e}")
+            return None
+        finally:
+            with lock:
+                prepared.unreviewed.extend(chunk_prepared.unreviewed)
+
+    with ThreadPoolExecutor(max_workers=settings.REVIEW_MAP_CONCURRENCY, thread_name_prefix="review-map") as executor:
+        responses = list(executor.map(review_chunk, range(len(chunks))))
+    if all(response is None for response in responses) and len(out_of_time) < len(chunks):
+        raise RuntimeError(f"All {len(chunks)} chunks of the map-reduce review failed")
+
+    reviewed = [response for response in responses if response is not None]
+    summary = reduce_summaries(llm, [response.summary for response in reviewed])
+    skipped = [file_path_of(f) for index in sorted(out_of_time) for f in chunks[index]]
+    failed = [
+        file_path_of(f)
+        for index, response in enumerate(responses)
+        if response is None and index not in out_of_time
+        for f in chunks[index]
+    ]
+    prepared.unreviewed.extend(skipped + failed)
+    if failed:
+        summary += "\n\nReview failed for: " + ", ".join(f"`{path}`" for path in dict.fromkeys(failed))
+    if skipped:
+        summary += "\n\nNot reviewed within the review time budget: " + ", ".join(
+            f"`{path}`" for path in dict.fromkeys(skipped)
+        )
+    confidences = [response.confidence for response in reviewed if response.confidence is not None]
+    return ReviewCodeDiffResponse(
+        issues=issues, summary=summary, confidence=min(confidences) if confidences else None
+    )
+
+
+def retry_unreviewed_files(
+    llm: Union[LLMService, HedgedReviewer, MicroBatcher],
+    prepared: PreparedDiff,
+    salvaged: ReviewCodeDiffResponse,
+    on_issue: Callable[[DiffIssue], None],
+) -> ReviewCodeDiffResponse:
+    """
+    Complete a partial review by re-running only the files it produced nothing for,
+    once and with a smaller output budget. If the retry is partial too, whatever it
+    salvaged is kept and the remaining files are listed in the summary.
+    """
+    files = unreviewed_files([file_path_of(patched_file) for patched_file in prepared.patch], salvaged.issues)
+    logger.debug(f"🔁 Partial review response; retrying {len(files)} of {len(prepared.patch)} file(s)")
+    retry_diff = "".join(str(patched_file) for patched_file in prepared.patch if file_path_of(patched_file) in files)
+    retry_request = build_review_request(prepared.subset(parse_diff(retry_diff)))
+    incomplete = []
+    try:
+        retried = llm.review_code_diff(retry_request, max_output_tokens=settings.LLM_PARTIAL_RETRY_MAX_OUTPUT_TOKENS)
+    except PartialResponseError as e:
+        logger.warning(f"Retry of {len(files)} file(s) was partial as well: {e}")
+        retried = e.response or ReviewCodeDiffResponse()
+        incomplete = unreviewed_files(files, retried.issues)
+
+    review_response, added = merge_retry(salvaged, retried)
+    for issue in added:
+        on_issue(issue)
+    if incomplete:
+        prepared.unreviewed.extend(incomplete)
+        listed = ", ".join(f"`{path}`" for path in incomplete)
+        review_response.summary = f"{review_response.summary}\n\nReview output was incomplete for: {listed}".strip()
+    return review_response
+
+
+def complete_review(
+    payload: GithubPRRequest,
+    llm: Union[LLMService, HedgedReviewer, MicroBatcher],
+    prepared: PreparedDiff,
+    review_response: ReviewCodeDiffResponse,
+    dedup_index: Optional[NearDuplicateIndex],
+    to_verify: List[HunkMatch],
+    on_issue: Callable[[DiffIssue], None],
+    poster: Optional[PRCommentPoster],
+) -> None:
+    """Everything after the main LLM review: dedup bookkeeping, verification, summary and posting"""
+    # Files of failed or skipped chunks were never looked at; their lack of issues means nothing
+    unreviewed = set(prepared.unreviewed)
+    reviewed_files = [f for f in prepared.patch if file_path_of(f) not in unreviewed]
+    if dedup_index is not None:
+        # Raw hunks, not scope-expanded ones, so stored offsets and fingerprints match later diffs
+        dedup_index.record_review(
+            [prepared.unexpanded_files.get(file_path_of(f), f) for f in reviewed_files], review_response.issues
+        )
+        if to_verify:
+            verify_diff, prior_issues = render_matches(to_verify)
+            try:
+                verified = llm.verify_prior_issues(VerifyIssuesRequest(diff=verify_diff, issues=prior_issues))
+                for match in to_verify:
+                    dedup_index.record(match.path, match.hunk, verified.issues)
+            except PartialResponseError as e:
+                # Keep what was verified but don't fingerprint hunks against an incomplete answer
+                logger.warning(f"Partial verification of prior issues: {e}")
+                verified = e.response or ReviewCodeDiffResponse()
+            for issue in verified.issues:
+                on_issue(issue)
+            review_response.issues.extend(verified.issues)
+
+    if settings.REVIEW_SAMPLE_ENABLED and reviewed_files:
+        try:
+            history = ReviewHistory(repository=payload.repository.full_name)
+            history.record([file_path_of(patched_file) for patched_file in reviewed_files], review_response.issues)
+        except Exception as e:
+            logger.warning(f"Recording review history failed: {e}")
+
+    review_response.issues.extend(prepared.reused_issues)
+    review_response.issues.extend(prepared.lint_issues)
+    if poster and poster.suppressed:
+        prepared.notes.append(f"Did not repost {poster.suppressed} finding(s) already commented on this PR.")
+    if poster and poster.false_positives:
+        prepared.notes.append(f"Did not post {poster.false_positives} finding(s) dismissed as false positives before.")
+    notes = prepared.summary_notes()
+    if notes:
+        review_response.summary = f"{review_response.summary}\n\n{notes}"
+
+    num_issues = len(review_response.issues)
+    logger.debug(f"📝 AI review completed with {num_issues} issues found")
+
+    if poster:
+        if settings.REVIEW_RESOLVE_FIXED_COMMENTS:
+            # Only comments on files this review fully covered can be judged fixed
+            if prepared.unreviewed:
+                logger.debug(f"Review incomplete for {len(set(prepared.unreviewed))} file(s), not resolving comments")
+            else:
+                poster.resolve_fixed(review_response.issues, {file_path_of(f) for f in prepared.patch})
+        poster.close(summary=review_response.summary)
+    logger.debug(f"✅ Successfully processed PR #{payload.number}")
+
+
+def pr_mirror(payload: GithubPRRequest) -> GitMirror:
+    """Local mirror of the PR's repository with its base and head commits fetched"""
+    number = payload.pull_request.number
+    return default_mirror_pool().checkout(
+        payload.repository.full_name,
+        github_clone_url(payload.repository.full_name),
+        github_git_auth_header(payload.installation.id),
+        [payload.pull_request.base.sha, payload.pull_request.head.sha],
+        # Fork heads are only reachable through the base repository's pull ref
+        refspecs=[f"+refs/pull/{number}/head:refs/pull/{number}/head"],
+    )
+
+
+def head_file_contents(
+    payload: GithubPRRequest, mirror: Optional[GitMirror], paths: List[str]
+) -> Dict[str, Optional[str]]:
+    """Contents of `paths` at the PR head, from the mirror, the blob cache or the contents API"""
+    repository, head_sha = payload.repository.full_name, payload.pull_request.head.sha
+    if mirror is not None:
+        return mirror.file_contents(head_sha, paths)
+    if settings.GITHUB_BLOB_CACHE_ENABLED:
+        # One tree listing plus only the blobs not seen before, instead of a request per file
+        return default_blob_cache().contents(repository, head_sha, paths, payload.installation.id)
+    return {path: github_file_content(repository, path, head_sha, payload.installation.id) for path in paths}
+
+
+def pr_suppressions(payload: GithubPRRequest, existing: Optional[ReviewCommentIndex]) -> SuppressionSet:
+    """The repository's false-positive suppressions, updated with findings dismissed on this PR"""
+    suppressions = suppression_set(payload.repository.full_name)
+    if existing is not None:
+        suppressions.learn(filter(None, map(comment_fingerprint, existing.dismissed)))
+    return suppressions
+
+
+def generated_test_summary(payload: GithubPRRequest, mirror: Optional[GitMirror], diff_text: str) -> str:
+    """
+    Generate pytest tests for the PR's Python changes, run them against a checkout of
+    the head commit and render the outcome for the PR summary ("" if nothing to test).
+    """
+    refused = sandbox_error()
+    if refused is not None:
+        # Don't pay for generating tests that will not run
+        logger.warning(refused)
+        return ""
+    changed = [
+        patched_file
+        for patched_file in parse_diff(diff_text)
+        if file_path_of(patched_file).endswith(".py") and not patched_file.is_removed_file
+    ]
+    diff, tokens = [], 0
+    for patched_file in changed:
+        tokens += estimate_tokens(str(patched_file))
+        if tokens > settings.REVIEW_TEST_GENERATION_MAX_TOKENS:
+            break
+        diff.append(str(patched_file))
+    if not diff:
+        return ""
+
+    llm = LLMService(model=settings.LLM_STRONG_MODEL, tier=STRONG_TIER)
+    generated = llm.generate_tests(GenerateTestsRequest(diff="".join(diff)))
+    if not generated.files:
+        return ""
+    head_sha = payload.pull_request.head.sha
+    with tempfile.TemporaryDirectory(prefix="testergpt-tests-") as checkout:
+        if mirror is not None:
+            extract_tarball(mirror.archive(head_sha), Path(checkout))
+        else:
+            archive = github_tarball(payload.repository.full_name, head_sha, payload.installation.id)
+            extract_tarball(archive, Path(checkout), strip_top_dir=True)
+        report = run_generated_tests(Path(checkout), generated.files)
+    return render_test_results(report)
+
+
+def symbol_context(payload: GithubPRRequest, mirror: Optional[GitMirror], prepared: PreparedDiff) -> str:
+    """Sync the PR's symbol index to its head and look up what the diff references"""
+    repository, head_sha = payload.repository.full_name, payload.pull_request.head.sha
+    if mirror is not None:
+        tree = mirror.tree(head_sha)
+    elif settings.GITHUB_BLOB_CACHE_ENABLED:
+        tree, _ = default_blob_cache().tree(repository, head_sha, payload.installation.id)
+    else:
+        logger.debug("Symbol index needs the git mirror or the blob cache, skipping it")
+        return ""
+    # One index per PR, so concurrent PRs of a repository don't re-index each other's files
+    index = SymbolIndex(repository, ref=f"pull/{payload.number}")
+    index.sync(tree, lambda paths: head_file_contents(payload, mirror, paths))
+    return index.context_for(prepared)
+
+
+def pr_head_moved(payload: GithubPRRequest) -> bool:
+    """True once the PR has commits newer than the ones the review was prepared from"""
+    try:
+        return github_pr_head_sha(payload) != payload.pull_request.head.sha
+    except Exception as e:
+        logger.warning(f"Checking the head of PR #{payload.number} failed, posting anyway: {e}")
+        return False
+
+
+def bulk_review_completion(payload: GithubPRRequest) -> Callable[[ReviewCodeDiffResponse], None]:
+    """
+    Completion of a bulk review resumed after a restart: prepare the PR again, then
+    post the batch result as the review's output
+    """
+
+    def on_complete(review_response: ReviewCodeDiffResponse) -> None:
+        if pr_head_moved(payload):
+            logger.debug(f"PR #{payload.number} moved on since its bulk review was queued, not posting it")
+            return
+        asyncio.run(fresh_pr_review(payload, None, review_response=review_response))
+
+    return on_complete
+
+
+def resume_bulk_reviews() -> None:
+    """Poll again for the bulk reviews a previous process queued or submitted"""
+    if not settings.LLM_BULK_LANE_ENABLED:
+        return
+    try:
+        default_bulk_lane().resume(lambda context: bulk_review_completion(GithubPRRequest(**context)))
+    except Exception as e:
+        logger.error(f"Error: resume_bulk_reviews : {e}")
+
+
+async def fresh_pr_review(
+    payload: GithubPRRequest,
+    background_tasks: Optional[BackgroundTasks],
+    urgent: bool = True,
+    review_response: Optional[ReviewCodeDiffResponse] = None,
+) -> None:
     """Fetch the PR diff (async) and run an AI review pipeline.
 
     This function was previously synchronous and called the async
     `github_pr_diff_content` without awaiting it, which produced a
     'coroutine was never awaited' warning. Making this function async
     and awaiting the call fixes that.
+
+    Non-urgent reviews go through the provider batch lane when it is enabled;
+    they are posted from the lane once the batch job completes, unless the PR got
+    new commits meanwhile. A given `review_response` (a resumed bulk review's
+    result) is posted instead of running the LLM review.
     """
+    mirror = None
     try:
         diff_url = payload.pull_request.diff_url
         if not diff_url:
             raise ValueError("Pull request diff URL not found")
 
-        llm = LLMService()
-        # github_pr_diff_content is synchronous (uses requests). Run it in a
-        # thread to avoid blocking the event loop.
-        diff_data = github_pr_diff_content(diff_url, payload.installation.id)
+        strong_llm = LLMService(model=settings.LLM_STRONG_MODEL, tier=STRONG_TIER)
+        if settings.LLM_HEDGING_ENABLED:
+            strong_llm = HedgedReviewer(
+                primary=strong_llm, secondary=LLMService(model=settings.LLM_HEDGE_MODEL, tier=STRONG_TIER)
+            )
+        if settings.LLM_CASCADE_ENABLED:
+            llm = LLMService(model=settings.LLM_FAST_MODEL, tier=FAST_TIER)
+            if settings.LLM_MICRO_BATCH_ENABLED:
+                llm = default_micro_batcher(llm)
+            reviewer = ModelCascade(fast=llm, strong=strong_llm)
+        else:
+            llm = strong_llm
+            reviewer = None
+        if settings.GITHUB_MIRROR_ENABLED:
+            mirror = await asyncio.to_thread(pr_mirror, payload)
+            diff_text = await asyncio.to_thread(mirror.diff, payload.pull_request.base.sha, payload.pull_request.head.sha)
+        else:
+            # github_pr_diff_content is synchronous (uses requests). Run it in a
+            # thread to avoid blocking the event loop.
+            diff_text = github_pr_diff_content(diff_url, payload.installation.id).diff_text
+        prepared = PreparedDiff(patch=parse_diff(diff_text))
+        # Comment positions refer to the full diff, so the poster keeps its own copy
+        poster = None
+        if settings.REVIEW_POST_COMMENTS:
+            existing = None
+            if settings.REVIEW_COMMENT_DEDUP_ENABLED:
+                try:
+                    existing = await asyncio.to_thread(pr_comment_index, payload, github_pr_review_comments)
+                except Exception as e:
+                    logger.warning(f"Loading existing review comments failed, posting without dedup: {e}")
+            suppressions = None
+            if settings.REVIEW_SUPPRESSION_ENABLED:
+                try:
+                    suppressions = await asyncio.to_thread(pr_suppressions, payload, existing)
+                except Exception as e:
+                    logger.warning(f"Loading false-positive suppressions failed, posting without them: {e}")
+            poster = PRCommentPoster(payload, diff_text, existing, suppressions)
+        on_issue = poster.submit if poster else (lambda issue: None)
+
+        if settings.REVIEW_EXCLUDE_ENABLED:
+            gitattributes = None
+            if settings.REVIEW_GITATTRIBUTES_ENABLED:
+                try:
+                    contents = await asyncio.to_thread(head_file_contents, payload, mirror, [".gitattributes"])
+                    gitattributes = contents[".gitattributes"]
+                except Exception as e:
+                    logger.warning(f"Fetching .gitattributes failed, excluding files without it: {e}")
+            default_exclusion_rules().apply(prepared, gitattributes)
+
+        if settings.REVIEW_COSMETIC_ENABLED:
+            drop_cosmetic_hunks(prepared)
+
+        if settings.REVIEW_MOVED_CODE_ENABLED:
+            renames = None
+            if mirror is not None:
+                try:
+                    renames = await asyncio.to_thread(
+                        mirror.renames, payload.pull_request.base.sha, payload.pull_request.head.sha
+                    )
+                except Exception as e:
+                    logger.warning(f"Detecting renames in the git mirror failed, using the diff alone: {e}")
+            drop_moved_code(prepared, renames=renames)
+
+        if settings.REVIEW_LINT_ENABLED and len(prepared.patch):
+            lint_pool = default_lint_pool()
+            paths = [
+                file_path_of(patched_file)
+                for patched_file in prepared.patch
+                if not patched_file.is_removed_file and lint_pool.linters_for(file_path_of(patched_file))
+            ]
+            try:
+                contents = await asyncio.to_thread(head_file_contents, payload, mirror, paths)
+            except Exception as e:
+                # Lint findings only trim the prompt; without head contents the LLM does those checks itself
+                logger.warning(f"Fetching head contents for the lint pre-pass failed, skipping it: {e}")
+                contents = None
+            if contents is not None:
+                await asyncio.to_thread(lint_pool.run, prepared, contents.get)
+                for issue in prepared.lint_issues:
+                    on_issue(issue)
+
+        dedup_index = None
+        to_verify = []
+        if settings.REVIEW_DEDUP_ENABLED:
+            dedup_index = NearDuplicateIndex(repository=payload.repository.full_name)
+            to_verify = dedup_index.apply(prepared)
+            for issue in prepared.reused_issues:
+                on_issue(issue)
+
+        if settings.REVIEW_SAMPLE_ENABLED and len(prepared.patch):
+            total = len(prepared.patch)
+            left_out = sample_by_risk(prepared, RiskScorer(ReviewHistory(repository=payload.repository.full_name)))
+            if left_out:
+                prepared.notes.append(
+                    f"Reviewed the {total - len(left_out)} highest-risk of {total} files within the review budget."
+                )
+
+        if settings.REVIEW_SYMBOL_INDEX_ENABLED and len(prepared.patch):
+            try:
+                prepared.context = await asyncio.to_thread(symbol_context, payload, mirror, prepared)
+            except Exception as e:
+                # Context only improves the review; never fail the review over it
+                logger.warning(f"Symbol context lookup failed: {e}")
+
+        if settings.REVIEW_SCOPE_EXPANSION_ENABLED and len(prepared.patch):
+            paths = [file_path_of(patched_file) for patched_file in prepared.patch if not patched_file.is_added_file]
+            try:
+                contents = await asyncio.to_thread(head_file_contents, payload, mirror, paths)
+                expand_to_scopes(prepared, contents)
+            except Exception as e:
+                # Expansion only adds context; review the hunks as diffed instead
+                logger.warning(f"Scope expansion failed, reviewing the hunks as diffed: {e}")
+
+        if review_response is not None:
+            for issue in review_response.issues:
+                on_issue(issue)
+            complete_review(payload, llm, prepared, review_response, dedup_index, to_verify, on_issue, poster)
+            return
+
+        if len(prepared.patch) and not urgent and settings.LLM_BULK_LANE_ENABLED:
+
+            def on_bulk_complete(bulk_response: ReviewCodeDiffResponse) -> None:
+                # Results can arrive hours later; comments on a superseded head would be stale
+                if pr_head_moved(payload):
+                    logger.debug(f"PR #{payload.number} moved on since its bulk review was queued, not posting it")
+                    return
+                for issue in bulk_response.issues:
+                    on_issue(issue)
+                complete_review(payload, llm, prepared, bulk_response, dedup_index, to_verify, on_issue, poster)
+
+            default_bulk_lane().enqueue(
+                build_review_request(prepared), on_bulk_complete, context=payload.model_dump(mode="json")
+            )
+            logger.debug(f"📮 Queued PR #{payload.number} for bulk review")
+            return
+
+        tests_task = None
+        if settings.REVIEW_TEST_EXECUTION_ENABLED:
+            # Runs alongside the review; only its outcome is waited for
+            tests_task = asyncio.create_task(asyncio.to_thread(generated_test_summary, payload, mirror, diff_text))
+            if mirror is not None:
+                # The tests may still be reading the mirror after the review itself gave up
+                mirror.acquire_lease()
+                tests_task.add_done_callback(lambda _: mirror.release())
+
+        if len(prepared.patch):
+            # Off the event loop, so concurrent webhook deliveries can share a micro-batch
+            review_response = await asyncio.to_thread(run_review, llm, reviewer, prepared, on_issue)
+        else:
+            review_response = ReviewCodeDiffResponse(summary="No changes left to review after local pre-review checks.")
 
-        review_response = llm.review_code_diff(code_diff_request=ReviewCodeDiffRequest(diff=diff_data.diff_text))
-        num_issues = len(review_response.issues)
-        logger.debug(f"📝 AI review completed with {num_issues} issues found")
+        if tests_task is not None:
+            try:
+                test_summary = await tests_task
+                if test_summary:
+                    review_response.summary = f"{review_response.summary}\n\n{test_summary}"
+            except Exception as e:
+                logger.warning(f"Running generated tests failed: {e}")
 
-        # schedule posting comments in background if desired
-        # background_tasks.add_task(post_pr_comments, payload, review_response)
-        logger.debug(f"✅ Successfully processed PR #{payload.number}")
+        complete_review(payload, llm, prepared, review_response, dedup_index, to_verify, on_issue, poster)
     except Exception as e:
         logger.error(f"Error: fresh_pr_review : {e}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        if mirror is not None:
+            mirror.release()
@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from src.config.env import settings
+from src.database import get_connection
+from src.exceptions import DatabaseError
+from src.github.types import DiffIssue, ReviewComment
+from src.github.utils import parse_diff, parse_issue_line
+from src.review.dedup import normalise_tokens
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppressed_findings (
+    repository TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    learnt_at REAL NOT NULL,
+    last_seen_at REAL NOT NULL,
+    PRIMARY KEY (repository, fingerprint)
+);
+CREATE TABLE IF NOT EXISTS suppression_filters (
+    repository TEXT PRIMARY KEY,
+    bits BLOB NOT NULL,
+    num_hashes INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,
+    built_at REAL NOT NULL
+);
+"""
+
+_COMMENT_TYPE_RE = re.compile(r"\*\*(\w+)\*\*")
+_CODE_SPAN_RE = re.compile(r"`[^`]*`|\"[^\"]*\"|'[^']*'")
+_STOP_WORDS = frozenset("a an the this that these those is are be been it its of to in on for and or with as at by".split())
+MESSAGE_CLASS_WORDS = 8
+MIN_FILTER_CAPACITY = 1024
+
+
+def message_class(message: str) -> str:
+    """
+    Coarse class of an issue message: its leading content words, without code spans,
+    quoted names or numbers, so rewordings of the same finding about different
+    identifiers land in the same class.
+    """
+    words = re.findall(r"[a-z]+", _CODE_SPAN_RE.sub(" ", message.lower()))
+    return " ".join([word for word in words if word not in _STOP_WORDS][:MESSAGE_CLASS_WORDS])
+
+
+def finding_fingerprint(issue_type: str, code: str, message: str) -> Optional[str]:
+    """Rule type + normalised code snippet + message class; None without code to anchor it"""
+    tokens = normalise_tokens([code])
+    if not tokens:
+        return None
+    key = "\n".join([issue_type.lower(), " ".join(tokens), message_class(message)])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def comment_fingerprint(comment: ReviewComment) -> Optional[str]:
+    """Fingerprint of one of our review comments, from its header, message and the line it is on"""
+    header, _, message = comment.body.partition("\n\n")
+    issue_type = _COMMENT_TYPE_RE.search(header)
+    # GitHub's diff_hunk ends with the line the comment is attached to
+    hunk_lines = comment.diff_hunk.splitlines()
+    if issue_type is None or not hunk_lines:
+        return None
+    return finding_fingerprint(issue_type.group(1), hunk_lines[-1][1:], message)
+
+
+def new_file_lines(diff_text: str) -> Dict[str, Dict[int, str]]:
+    """Content of every new-side line shown in the diff, by path and line number"""
+    lines: Dict[str, Dict[int, str]] = {}
+    for patched_file in parse_diff(diff_text):
+        path = patched_file.path.removeprefix("b/").removeprefix("a/")
+        for hunk in patched_file:
+            for line in hunk:
+                if line.target_line_no is not None:
+                    lines.setdefault(path, {})[line.target_line_no] = line.value
+    return lines
+
+
+def issue_fingerprint(issue: DiffIssue, diff_lines: Dict[str, Dict[int, str]]) -> Optional[str]:
+    line_range = parse_issue_line(issue.line)
+    if line_range is None:
+        return None
+    path = issue.file.removeprefix("b/").removeprefix("a/")
+    code = diff_lines.get(path, {}).get(line_range[0])
+    return finding_fingerprint(issue.type, code, issue.message) if code is not None else None
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter; k probe positions come from two halves of one BLAKE2b digest"""
+
+    def __init__(self, capacity: int, fp_rate: float, bits: Optional[bytes] = None, num_hashes: Optional[int] = None):
+        self.capacity = capacity
+        num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.bits = bytearray(bits) if bits is not None else bytearray((num_bits + 7) // 8)
+        self.num_bits = len(self.bits) * 8
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / capacity * math.log(2)))
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((first + i * second) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] >> (position & 7) & 1 for position in self._positions(item))
+
+
+class SuppressionSet:
+    """
+    Fingerprints of findings a repository's team dismissed as false positives. Every
+    fingerprint is stored in SQLite; a Bloom filter over them is kept in memory (and
+    persisted), so checking a finding is O(1) and only the rare filter hits are
+    confirmed with an exact lookup. The filter is rebuilt every
+    REVIEW_SUPPRESSION_REBUILD_SECONDS, dropping fingerprints not learnt or matched
+    for REVIEW_SUPPRESSION_TTL_DAYS.
+    """
+
+    def __init__(
+        self,
+        repository: str,
+        fp_rate: Optional[float] = None,
+        ttl_days: Optional[float] = None,
+        rebuild_seconds: Optional[float] = None,
+        db_path: Optional[str] = None,
+    ):
+        self.repository = repository
+        self.fp_rate = fp_rate if fp_rate is not None else settings.REVIEW_SUPPRESSION_FP_RATE
+        self.ttl_days = ttl_days if ttl_days is not None else settings.REVIEW_SUPPRESSION_TTL_DAYS
+        self.rebuild_seconds = (
+            rebuild_seconds if rebuild_seconds is not None else settings.REVIEW_SUPPRESSION_REBUILD_SECONDS
+        )
+        self._lock = threading.Lock()
+        try:
+            self.conn = get_connection(db_path)
+            self.conn.executescript(_SCHEMA)
+            self.filter, self.built_at, self.size = self._load()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to initialise suppression set: {e}") from e
+
+    def _load(self) -> Tuple[BloomFilter, float, int]:
+        row = self.conn.execute(
+            "SELECT bits, num_hashes, capacity, built_at FROM suppression_filters WHERE repository = ?",
+            (self.repository,),
+        ).fetchone()
+        size = self.conn.execute(
+            "SELECT COUNT(*) FROM suppressed_findings WHERE repository = ?", (self.repository,)
+        ).fetchone()[0]
+        if row is None or time.time() - row[3] > self.rebuild_seconds or size > row[2]:
+            return self._rebuild()
+        bits, num_hashes, capacity, built_at = row
+        return BloomFilter(capacity, self.fp_rate, bits=bits, num_hashes=num_hashes), built_at, size
+
+    def _rebuild(self) -> Tuple[BloomFilter, float, int]:
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM suppressed_findings WHERE repository = ? AND last_seen_at < ?",
+                (self.repository, now - self.ttl_days * 86400),
+            )
+            fingerprints = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT fingerprint FROM suppressed_findings WHERE repository = ?", (self.repository,)
+                )
+            ]
+            bloom = BloomFilter(max(MIN_FILTER_CAPACITY, 2 * len(fingerprints)), self.fp_rate)
+            for fingerprint in fingerprints:
+                bloom.add(fingerprint)
+            self._save(bloom, now)
+        logger.debug(f"🌸 Rebuilt the suppression filter of {self.repository} with {len(fingerprints)} fingerprint(s)")
+        return bloom, now, len(fingerprints)
+
+    def _save(self, bloom: BloomFilter, built_at: float) -> None:
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO suppression_filters (repository, bits, num_hashes, capacity, built_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (self.repository, bytes(bloom.bits), bloom.num_hashes, bloom.capacity, built_at),
+        )
+
+    def _maybe_rebuild(self) -> None:
+        if time.time() - self.built_at > self.rebuild_seconds or self.size > self.filter.capacity:
+            self.filter, self.built_at, self.size = self._rebuild()
+
+    def learn(self, fingerprints: Iterable[str]) -> int:
+        """Add dismissed findings; returns how many were new"""
+        now = time.time()
+        learnt = 0
+        with self._lock:
+            try:
+                with self.conn:
+                    for fingerprint in dict.fromkeys(fingerprints):
+                        # INSERT OR IGNORE only reports a row for new fingerprints; known ones are refreshed
+                        cursor = self.conn.execute(
+                            """
+                            INSERT OR IGNORE INTO suppressed_findings (repository, fingerprint, learnt_at, last_seen_at)
+                            VALUES (?, ?, ?, ?)
+                            """,
+                            (self.repository, fingerprint, now, now),
+                        )
+                        if cursor.rowcount:
+                            self.filter.add(fingerprint)
+                            learnt += 1
+                        else:
+                            self.conn.execute(
+                                """
+                                UPDATE suppressed_findings SET last_seen_at = ?
+                                WHERE repository = ? AND fingerprint = ?
+                                """,
+                                (now, self.repository, fingerprint),
+                            )
+                    if learnt:
+                        self.size += learnt
+                        self._save(self.filter, self.built_at)
+                self._maybe_rebuild()
+            except sqlite3.Error as e:
+                raise DatabaseError(f"Failed to store suppressed findings: {e}") from e
+        if learnt:
+            logger.debug(f"🔕 Learnt {learnt} dismissed finding(s) for {self.repository}")
+        return learnt
+
+    def __contains__(self, fingerprint: str) -> bool:
+        if fingerprint not in self.filter:
+            return False
+        with self._lock:
+            try:
+                with self.conn:
+                    # Exact check behind the filter; a match also keeps the entry from expiring
+                    cursor = self.conn.execute(
+                        "UPDATE suppressed_findings SET last_seen_at = ? WHERE repository = ? AND fingerprint = ?",
+                        (time.time(), self.repository, fingerprint),
+                    )
+            except sqlite3.Error as e:
+                raise DatabaseError(f"Failed to check suppressed finding: {e}") from e
+        return cursor.rowcount > 0
+
+
+_suppression_sets: Dict[str, SuppressionSet] = {}
+_suppression_sets_lock = threading.Lock()
+
+
+def suppression_set(repository: str) -> SuppressionSet:
+    """Process-wide suppression set of a repository, so its filter is loaded once"""
+    with _suppression_sets_lock:
+        if repository not in _suppression_sets:
+            _suppression_sets[repository] = SuppressionSet(repository)
+        return _suppression_sets[repository]
@@ -298,6 +298,7 @@ class GitHubCommitFile(BaseModel):
     raw_url: str
     contents_url: str
     patch: Optional[str] = None
+    previous_filename: Optional[str] = None
 
 
 class GithubCommit(BaseModel):
@@ -395,6 +396,7 @@ class ReviewComment(BaseModel):
     original_position: Optional[int]
     position: Optional[int]
     subject_type: Optional[str]
+    in_reply_to_id: Optional[int] = None
 
 
 class ReviewCommentList(RootModel[List[ReviewComment]]):
@@ -1,9 +1,45 @@
-
-from github.types import CodeFileDetailsList, GithubPRChanged, CodeFileDetails
+from typing import Dict, Optional, Tuple
+from src.github.types import CodeFileDetailsList, DiffIssue, GithubPRRequest, CodeFileDetails
 from unidiff import PatchSet
+from unidiff.patch import PatchedFile
 import requests
 
-def extract_diff_from_pr(pr_diff_url: str) -> CodeFileDetails:
+
+def parse_diff(diff_text: str) -> PatchSet:
+    """Parse unified diff text into a PatchSet"""
+    return PatchSet(diff_text)
+
+
+def file_path_of(patched_file: PatchedFile) -> str:
+    """Path of the file on the new side of the diff, without 'a/' or 'b/' prefixes"""
+    file_path = patched_file.path
+    if file_path.startswith(("a/", "b/")):
+        file_path = file_path[2:]
+    return file_path
+
+
+def parse_issue_line(line: str) -> Optional[Tuple[int, int]]:
+    """Parse an issue line like "12" or "12-15" into an inclusive (start, end) range"""
+    try:
+        if "-" in line:
+            start, end = line.split("-", 1)
+            return int(start), int(end)
+        return int(line), int(line)
+    except (ValueError, AttributeError):
+        return None
+
+
+def issue_comment_body(issue: DiffIssue) -> str:
+    """Markdown body of the review comment posted for an issue"""
+    emoji = {"error": "🚫", "warning": "⚠️", "suggestion": "💡"}.get(
+        issue.type, "ℹ️"
+    )
+    return f"""{emoji} **{issue.type.title()}** ({issue.severity} severity)
+
+{issue.message}"""
+
+
+def extract_diff_from_pr(pr_diff_url: str) -> CodeFileDetailsList:
     response = requests.get(pr_diff_url)
     response.raise_for_status()
 
@@ -11,50 +47,53 @@ def extract_diff_from_pr(pr_diff_url: str) -> CodeFileDetails:
     pr_diff_obj: CodeFileDetailsList = CodeFileDetailsList(root=[])
 
     for patched_file in patch:
-        pr_line_data += f"File: {patched_file.path}\n"
         pr_diff_obj.root.append(
             CodeFileDetails(
                 file_path=patched_file.path,
+                full_content="",
                 additions=[line.value.strip() for hunk in patched_file for line in hunk if line.line_type == "+"],
                 deletions=[line.value.strip() for hunk in patched_file for line in hunk if line.line_type == "-"],
             )
         )
-        for hunk in patched_file:
-            for line in hunk:
-                pr_line_data += f"{line.line_type}: {line.value.strip()}\n"
     return pr_diff_obj
 
 
-def _get_diff_line_mapping(payload: GithubPRChanged) -> Dict[str, Dict[int, int]]:
+def diff_line_mapping(diff_text: str) -> Dict[str, Dict[int, int]]:
     """
     Get mapping of file line numbers to diff positions.
     Returns: {file_path: {line_number: diff_position}}
     """
-    try:
-        diff_url = payload.pull_request.diff_url
-        response = requests.get(diff_url)
-        response.raise_for_status()
+    patch = PatchSet(diff_text)
+    line_mapping = {}
 
-        patch = PatchSet(response.text)
-        line_mapping = {}
+    for patched_file in patch:
+        file_path = patched_file.path
+        if file_path.startswith("b/"):
+            file_path = file_path[2:]  # Remove 'b/' prefix
 
-        for patched_file in patch:
-            file_path = patched_file.path
-            if file_path.startswith("b/"):
-                file_path = file_path[2:]  # Remove 'b/' prefix
+        line_mapping[file_path] = {}
+        position = 0
 
-            line_mapping[file_path] = {}
-            position = 0
+        for hunk in patched_file:
+            # Each hunk header takes a position too, except the first one of a file
+            if position:
+                position += 1
+            for line in hunk:
+                position += 1
+                # Only map lines that are additions or context (not deletions)
+                if line.line_type in ["+", " "]:
+                    if line.target_line_no:
+                        line_mapping[file_path][line.target_line_no] = position
+
+    return line_mapping
 
-            for hunk in patched_file:
-                for line in hunk:
-                    position += 1
-                    # Only map lines that are additions or context (not deletions)
-                    if line.line_type in ["+", " "]:
-                        if line.target_line_no:
-                            line_mapping[file_path][line.target_line_no] = position
 
-        return line_mapping
+def _get_diff_line_mapping(payload: GithubPRRequest) -> Dict[str, Dict[int, int]]:
+    try:
+        diff_url = payload.pull_request.diff_url
+        response = requests.get(diff_url)
+        response.raise_for_status()
+        return diff_line_mapping(response.text)
     except Exception as e:
         print(f"Error parsing diff for line mapping: {e}")
         return {}
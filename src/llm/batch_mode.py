@@ -0,0 +1,447 @@
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Protocol
+from pydantic import BaseModel, Field, ValidationError
+from src.config.env import settings
+from src.database import get_connection
+from src.exceptions import DatabaseError
+from src.llm.languages import request_languages
+from src.llm.prompts import review_context, review_prompt
+from src.llm.repair import salvage_json_review
+from src.llm.service import LLMService
+from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_review_jobs (
+    key TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    context TEXT,
+    batch_name TEXT,
+    submitted_at REAL
+);
+"""
+
+
+class BatchJobItem(BaseModel):
+    """One generate-content request inside a provider batch job"""
+
+    key: str
+    system_instruction: str
+    prompt: str
+    response_schema: dict
+
+
+class BatchItemResult(BaseModel):
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchJobStatus(BaseModel):
+    state: str
+    results: Dict[str, BatchItemResult] = Field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class BatchJobBackend(Protocol):
+    """Provider API for asynchronous batch jobs"""
+
+    def submit(self, model: str, items: List[BatchJobItem]) -> str: ...
+
+    def poll(self, name: str) -> BatchJobStatus: ...
+
+    def resume(self, name: str, keys: List[str]) -> None:
+        """Track a job submitted before a restart; `keys` are its items in request order"""
+        ...
+
+
+class GeminiBatchJobBackend:
+    """Gemini Batch API with inlined requests, through the google-genai client"""
+
+    _PENDING_STATES = {
+        "JOB_STATE_QUEUED", "JOB_STATE_PENDING", "JOB_STATE_RUNNING", "JOB_STATE_UPDATING", "JOB_STATE_PAUSED",
+        "JOB_STATE_CANCELLING",
+    }
+    _DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+
+    def __init__(self, api_key: Optional[str] = None):
+        from google import genai
+
+        self.client = genai.Client(api_key=api_key or settings.GPT_API_KEY)
+        self._keys: Dict[str, List[str]] = {}
+
+    def submit(self, model: str, items: List[BatchJobItem]) -> str:
+        from google.genai import types
+
+        job = self.client.batches.create(
+            model=model,
+            src=[
+                types.InlinedRequest(
+                    contents=[types.Content(role="user", parts=[types.Part(text=item.prompt)])],
+                    config=types.GenerateContentConfig(
+                        system_instruction=item.system_instruction,
+                        response_mime_type="application/json",
+                        response_json_schema=item.response_schema,
+                    ),
+                    metadata={"key": item.key},
+                )
+                for item in items
+            ],
+            config=types.CreateBatchJobConfig(display_name=f"testergpt-bulk-{int(time.time())}"),
+        )
+        # Responses come back in request order; keep the keys in case metadata is not echoed
+        self._keys[job.name] = [item.key for item in items]
+        return job.name
+
+    def resume(self, name: str, keys: List[str]) -> None:
+        self._keys[name] = list(keys)
+
+    def poll(self, name: str) -> BatchJobStatus:
+        job = self.client.batches.get(name=name)
+        state = job.state.name if job.state is not None else "JOB_STATE_UNSPECIFIED"
+        if state in self._PENDING_STATES:
+            return BatchJobStatus(state=JOB_PENDING)
+        if state not in self._DONE_STATES:
+            self._keys.pop(name, None)
+            return BatchJobStatus(state=JOB_FAILED, error=f"{state}: {job.error}")
+
+        keys = self._keys.pop(name, [])
+        results = {}
+        for index, inlined in enumerate((job.dest.inlined_responses if job.dest else None) or []):
+            key = (inlined.metadata or {}).get("key") or (keys[index] if index < len(keys) else str(index))
+            if inlined.error is not None or inlined.response is None:
+                results[key] = BatchItemResult(error=str(inlined.error))
+            else:
+                results[key] = BatchItemResult(text=inlined.response.text)
+        return BatchJobStatus(state=JOB_SUCCEEDED, results=results)
+
+
+class InMemoryBatchJobBackend:
+    """Local stand-in for the batch endpoint; `responder` produces each item's output text"""
+
+    def __init__(self, responder: Callable[[BatchJobItem], str], polls_until_done: int = 1):
+        self.responder = responder
+        self.polls_until_done = polls_until_done
+        self.jobs: Dict[str, List[BatchJobItem]] = {}
+        self._polls: Dict[str, int] = {}
+        self._counter = itertools.count(1)
+
+    def submit(self, model: str, items: List[BatchJobItem]) -> str:
+        name = f"batches/local-{next(self._counter)}"
+        self.jobs[name] = list(items)
+        self._polls[name] = 0
+        return name
+
+    def resume(self, name: str, keys: List[str]) -> None:
+        pass
+
+    def poll(self, name: str) -> BatchJobStatus:
+        self._polls[name] += 1
+        if self._polls[name] < self.polls_until_done:
+            return BatchJobStatus(state=JOB_PENDING)
+        results = {}
+        for item in self.jobs[name]:
+            try:
+                results[item.key] = BatchItemResult(text=self.responder(item))
+            except Exception as e:
+                results[item.key] = BatchItemResult(error=str(e))
+        return BatchJobStatus(state=JOB_SUCCEEDED, results=results)
+
+
+class _BulkJob:
+    def __init__(self, key: str, request: ReviewCodeDiffRequest, on_complete: Callable[[ReviewCodeDiffResponse], None]):
+        self.key = key
+        self.request = request
+        self.on_complete = on_complete
+        self.queued_at = time.monotonic()
+
+
+class _SubmittedBatch:
+    def __init__(self, jobs: Dict[str, _BulkJob], submitted_at: float):
+        self.jobs = jobs
+        # Wall-clock time, so the deadline survives a restart
+        self.submitted_at = submitted_at
+
+
+def parse_batch_review(text: str) -> ReviewCodeDiffResponse:
+    """Decode one batch result, keeping whatever issues survive if the JSON is damaged"""
+    try:
+        return ReviewCodeDiffResponse(**json.loads(text))
+    except (json.JSONDecodeError, ValidationError, TypeError) as e:
+        logger.warning(f"Batch review result did not parse completely, salvaging: {e}")
+        return salvage_json_review(text)
+
+
+class BulkReviewLane:
+    """
+    Non-urgent reviews submitted through the provider's asynchronous batch interface,
+    which is billed at a discount. Jobs are gathered for up to `gather_seconds` (or
+    `max_jobs`), submitted as one batch and polled every `poll_seconds`; each result
+    is handed to its job's `on_complete`, which continues the normal posting stage.
+    Jobs whose batch fails, whose item errors or whose batch is still not done (or
+    cannot be polled) after `deadline_seconds` are reviewed through `fallback`.
+
+    Queued jobs and submitted batch names are kept in SQLite with each job's
+    `context`, so `resume` can pick them up again after a restart.
+    """
+
+    def __init__(
+        self,
+        backend: BatchJobBackend,
+        model: str,
+        fallback: Callable[[ReviewCodeDiffRequest], ReviewCodeDiffResponse],
+        gather_seconds: Optional[float] = None,
+        max_jobs: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        deadline_seconds: Optional[float] = None,
+        db_path: Optional[str] = None,
+    ):
+        self.backend = backend
+        self.model = model
+        self.fallback = fallback
+        self.gather_seconds = gather_seconds if gather_seconds is not None else settings.LLM_BULK_GATHER_SECONDS
+        self.max_jobs = max_jobs if max_jobs is not None else settings.LLM_BULK_MAX_JOBS
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.LLM_BULK_POLL_SECONDS
+        self.deadline_seconds = deadline_seconds if deadline_seconds is not None else settings.LLM_BULK_DEADLINE_SECONDS
+        self._queue: List[_BulkJob] = []
+        self._submitted: Dict[str, _SubmittedBatch] = {}
+        self._next_poll = 0.0
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        try:
+            self.conn = get_connection(db_path)
+            self.conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to initialise bulk review jobs: {e}") from e
+
+    def enqueue(
+        self,
+        request: ReviewCodeDiffRequest,
+        on_complete: Callable[[ReviewCodeDiffResponse], None],
+        context: Optional[dict] = None,
+    ) -> None:
+        """
+        Queue a review. `context` (JSON-serialisable) is stored with it and given back
+        to `resume`'s factory to rebuild `on_complete` if the process restarts first.
+        """
+        job = _BulkJob(f"review-{uuid.uuid4().hex}", request, on_complete)
+        try:
+            with self._condition, self.conn:
+                self.conn.execute(
+                    "INSERT INTO bulk_review_jobs (key, request, context) VALUES (?, ?, ?)",
+                    (job.key, request.model_dump_json(), json.dumps(context) if context is not None else None),
+                )
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to store bulk review job: {e}") from e
+        with self._condition:
+            self._queue.append(job)
+            self._start()
+            self._condition.notify_all()
+
+    def resume(self, on_complete_for: Callable[[dict], Callable[[ReviewCodeDiffResponse], None]]) -> int:
+        """
+        Pick up the jobs a previous process left behind: queued ones are queued again
+        and submitted batches are polled again. `on_complete_for` rebuilds a job's
+        completion from its stored context. Returns how many jobs were resumed.
+        """
+        try:
+            with self._condition:
+                rows = self.conn.execute(
+                    "SELECT key, request, context, batch_name, submitted_at FROM bulk_review_jobs ORDER BY rowid"
+                ).fetchall()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to load bulk review jobs: {e}") from e
+
+        queued, batches, dropped = [], {}, []
+        for key, request, context, batch_name, submitted_at in rows:
+            try:
+                if context is None:
+                    raise ValueError("no context stored")
+                job = _BulkJob(key, ReviewCodeDiffRequest.model_validate_json(request), on_complete_for(json.loads(context)))
+            except Exception as e:
+                logger.warning(f"Cannot resume bulk review {key}, dropping it: {e}")
+                dropped.append(key)
+                continue
+            if batch_name is None:
+                queued.append(job)
+            else:
+                batches.setdefault(batch_name, _SubmittedBatch({}, submitted_at)).jobs[key] = job
+
+        for name, batch in batches.items():
+            self.backend.resume(name, list(batch.jobs))
+        with self._condition:
+            self._forget(dropped)
+            known = {job.key for job in self._queue} | {key for batch in self._submitted.values() for key in batch.jobs}
+            self._queue.extend(job for job in queued if job.key not in known)
+            for name, batch in batches.items():
+                self._submitted.setdefault(name, batch)
+            if queued or batches:
+                self._next_poll = time.monotonic()
+                self._start()
+                self._condition.notify_all()
+        resumed = len(queued) + sum(len(batch.jobs) for batch in batches.values())
+        if resumed:
+            logger.debug(f"📮 Resumed {resumed} bulk review(s), {len(batches)} of them in submitted batch jobs")
+        return resumed
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._queue) + sum(len(batch.jobs) for batch in self._submitted.values())
+
+    def _start(self) -> None:
+        # Callers hold the condition
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="llm-bulk-lane", daemon=True)
+            self._worker.start()
+
+    def _forget(self, keys: List[str]) -> None:
+        """Drop finished jobs from the store; callers hold the condition"""
+        if not keys:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany("DELETE FROM bulk_review_jobs WHERE key = ?", [(key,) for key in keys])
+        except sqlite3.Error as e:
+            logger.warning(f"Removing finished bulk review jobs failed: {e}")
+
+    def _item(self, job: _BulkJob) -> BatchJobItem:
+        prompt = review_prompt(
+            job.request.diff_format, request_languages(job.request), linted=job.request.linted_languages
+        )
+        return BatchJobItem(
+            key=job.key,
+            system_instruction=prompt.prefix,
+            prompt=prompt.suffix.format(diff=job.request.diff, context=review_context(job.request.context)),
+            response_schema=ReviewCodeDiffResponse.model_json_schema(),
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    gather_due = self._queue and (
+                        len(self._queue) >= self.max_jobs or now - self._queue[0].queued_at >= self.gather_seconds
+                    )
+                    poll_due = self._submitted and now >= self._next_poll
+                    if gather_due or poll_due:
+                        break
+                    deadlines = []
+                    if self._queue:
+                        deadlines.append(self._queue[0].queued_at + self.gather_seconds)
+                    if self._submitted:
+                        deadlines.append(self._next_poll)
+                    self._condition.wait(max(min(deadlines) - now, 0.01) if deadlines else None)
+                batch = []
+                if gather_due:
+                    batch, self._queue = self._queue[: self.max_jobs], self._queue[self.max_jobs:]
+                to_poll = list(self._submitted) if poll_due else []
+                if poll_due:
+                    self._next_poll = now + self.poll_seconds
+
+            if batch:
+                self._submit(batch)
+            for name in to_poll:
+                self._poll(name)
+
+    def _submit(self, batch: List[_BulkJob]) -> None:
+        try:
+            name = self.backend.submit(self.model, [self._item(job) for job in batch])
+        except Exception as e:
+            logger.warning(f"Batch submission of {len(batch)} review(s) failed, reviewing them directly: {e}")
+            for job in batch:
+                self._complete_directly(job)
+            return
+        logger.debug(f"📮 Submitted batch job {name} with {len(batch)} review(s)")
+        submitted_at = time.time()
+        with self._condition:
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE bulk_review_jobs SET batch_name = ?, submitted_at = ? WHERE key = ?",
+                        [(name, submitted_at, job.key) for job in batch],
+                    )
+            except sqlite3.Error as e:
+                # The batch still runs; only a restart before it finishes would resubmit these jobs
+                logger.warning(f"Storing batch job {name} failed: {e}")
+            self._submitted[name] = _SubmittedBatch({job.key: job for job in batch}, submitted_at)
+            if len(self._submitted) == 1:
+                self._next_poll = time.monotonic() + self.poll_seconds
+            self._condition.notify_all()
+
+    def _poll(self, name: str) -> None:
+        with self._condition:
+            batch = self._submitted.get(name)
+        if batch is None:
+            return
+        overdue = time.time() - batch.submitted_at > self.deadline_seconds
+        try:
+            status = self.backend.poll(name)
+        except Exception as e:
+            if not overdue:
+                logger.warning(f"Polling batch job {name} failed, will retry: {e}")
+                return
+            status = BatchJobStatus(state=JOB_FAILED, error=f"polling failed past the deadline: {e}")
+        if status.state == JOB_PENDING:
+            if not overdue:
+                return
+            status = BatchJobStatus(state=JOB_FAILED, error="not done by the deadline")
+
+        with self._condition:
+            batch = self._submitted.pop(name, None)
+        jobs = batch.jobs if batch is not None else {}
+        if status.state == JOB_FAILED:
+            logger.warning(f"Batch job {name} failed ({status.error}); reviewing {len(jobs)} job(s) directly")
+        logger.debug(f"📬 Batch job {name} finished with {len(status.results)} result(s)")
+        for key, job in jobs.items():
+            result = status.results.get(key)
+            if result is None or result.text is None:
+                self._complete_directly(job)
+                continue
+            self._complete(job, parse_batch_review(result.text))
+
+    def _complete(self, job: _BulkJob, response: ReviewCodeDiffResponse) -> None:
+        try:
+            job.on_complete(response)
+        except Exception as e:
+            # One PR's posting stage must not take the lane down
+            logger.error(f"Error: bulk review completion : {e}")
+        finally:
+            with self._condition:
+                self._forget([job.key])
+
+    def _complete_directly(self, job: _BulkJob) -> None:
+        try:
+            response = self.fallback(job.request)
+        except Exception as e:
+            logger.error(f"Error: bulk review fallback : {e}")
+            with self._condition:
+                self._forget([job.key])
+            return
+        self._complete(job, response)
+
+
+_default_bulk_lane: Optional[BulkReviewLane] = None
+_default_bulk_lane_lock = threading.Lock()
+
+
+def default_bulk_lane() -> BulkReviewLane:
+    """Process-wide bulk lane on the strong model, backed by the Gemini Batch API"""
+    global _default_bulk_lane
+    with _default_bulk_lane_lock:
+        if _default_bulk_lane is None:
+            fallback = LLMService(model=settings.LLM_STRONG_MODEL)
+            _default_bulk_lane = BulkReviewLane(
+                GeminiBatchJobBackend(), settings.LLM_STRONG_MODEL, lambda request: fallback.review_code_diff(request)
+            )
+        return _default_bulk_lane
@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from src.config.env import settings
+from src.github.types import DiffIssue
+from src.llm.languages import request_files
+from src.llm.service import LLMService
+from src.llm.tokens import estimate_tokens
+from src.llm.types import (
+    BatchReviewRequest,
+    BatchSection,
+    ReviewCodeDiffRequest,
+    ReviewCodeDiffResponse,
+    VerifyIssuesRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+class _PendingReview:
+    def __init__(self, request: ReviewCodeDiffRequest):
+        self.request = request
+        self.tokens = estimate_tokens(request.diff)
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """
+    Packs small review requests from concurrent PR pipelines into one LLM call.
+    The first request opens a window; everything of the same diff format that arrives
+    before it closes (or until the item/token cap) goes out as one batch of delimited
+    sections, and each caller gets back only its own section. Findings for files
+    outside a section are dropped, and sections the model left out are reviewed
+    on their own.
+    """
+
+    def __init__(
+        self,
+        llm: LLMService,
+        window_ms: Optional[float] = None,
+        max_items: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        max_diff_tokens: Optional[int] = None,
+    ):
+        self.llm = llm
+        self.window_ms = window_ms if window_ms is not None else settings.LLM_MICRO_BATCH_WINDOW_MS
+        self.max_items = max_items if max_items is not None else settings.LLM_MICRO_BATCH_MAX_ITEMS
+        self.max_tokens = max_tokens if max_tokens is not None else settings.LLM_MICRO_BATCH_MAX_TOKENS
+        self.max_diff_tokens = max_diff_tokens if max_diff_tokens is not None else settings.LLM_MICRO_BATCH_MAX_DIFF_TOKENS
+        self._queues: Dict[str, List[_PendingReview]] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm-batch")
+        self._worker: Optional[threading.Thread] = None
+
+    def _batchable(self, code_diff_request: ReviewCodeDiffRequest, kwargs: dict) -> bool:
+        # Sections of a batch carry no per-request context
+        return (
+            not kwargs
+            and not code_diff_request.context
+            and estimate_tokens(code_diff_request.diff) <= self.max_diff_tokens
+        )
+
+    def review_code_diff(self, code_diff_request: ReviewCodeDiffRequest, **kwargs) -> ReviewCodeDiffResponse:
+        if not self._batchable(code_diff_request, kwargs):
+            return self.llm.review_code_diff(code_diff_request, **kwargs)
+        pending = _PendingReview(code_diff_request)
+        with self._condition:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="llm-micro-batcher", daemon=True)
+                self._worker.start()
+            queue = self._queues.setdefault(code_diff_request.diff_format, [])
+            if not queue:
+                self._opened_at[code_diff_request.diff_format] = time.monotonic()
+            queue.append(pending)
+            self._condition.notify_all()
+        return pending.future.result()
+
+    def stream_review_code_diff(
+        self,
+        code_diff_request: ReviewCodeDiffRequest,
+        on_issue: Callable[[DiffIssue], None],
+        **kwargs,
+    ) -> ReviewCodeDiffResponse:
+        """Small diffs are batched rather than streamed; their issues are emitted once the batch returns"""
+        if not self._batchable(code_diff_request, kwargs):
+            return self.llm.stream_review_code_diff(code_diff_request, on_issue, **kwargs)
+        response = self.review_code_diff(code_diff_request)
+        for issue in response.issues:
+            on_issue(issue)
+        return response
+
+    def verify_prior_issues(self, verify_request: VerifyIssuesRequest) -> ReviewCodeDiffResponse:
+        return self.llm.verify_prior_issues(verify_request)
+
+    def combine_summaries(self, summaries: List[str]) -> str:
+        return self.llm.combine_summaries(summaries)
+
+    def _ready(self, diff_format: str) -> bool:
+        queue = self._queues[diff_format]
+        elapsed_ms = (time.monotonic() - self._opened_at[diff_format]) * 1000
+        return (
+            elapsed_ms >= self.window_ms
+            or len(queue) >= self.max_items
+            or sum(pending.tokens for pending in queue) >= self.max_tokens
+        )
+
+    def _take(self, diff_format: str) -> List[_PendingReview]:
+        queue = self._queues[diff_format]
+        batch, tokens = [], 0
+        while queue and len(batch) < self.max_items and (not batch or tokens + queue[0].tokens <= self.max_tokens):
+            tokens += queue[0].tokens
+            batch.append(queue.pop(0))
+        if queue:
+            self._opened_at[diff_format] = time.monotonic()
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    waiting = [fmt for fmt, queue in self._queues.items() if queue]
+                    ready = [fmt for fmt in waiting if self._ready(fmt)]
+                    if ready:
+                        break
+                    if waiting:
+                        next_close = min(self._opened_at[fmt] for fmt in waiting) + self.window_ms / 1000
+                        self._condition.wait(max(next_close - time.monotonic(), 0.001))
+                    else:
+                        self._condition.wait()
+                batches = [self._take(fmt) for fmt in ready]
+            for batch in batches:
+                self._executor.submit(self._dispatch, batch)
+
+    def _review_alone(self, pending: _PendingReview) -> None:
+        try:
+            pending.future.set_result(self.llm.review_code_diff(pending.request))
+        except Exception as e:
+            pending.future.set_exception(e)
+
+    def _dispatch(self, batch: List[_PendingReview]) -> None:
+        if len(batch) == 1:
+            self._review_alone(batch[0])
+            return
+
+        logger.debug(f"📦 Reviewing {len(batch)} small diffs in one request")
+        sections = {str(index + 1): pending for index, pending in enumerate(batch)}
+        try:
+            response = self.llm.review_batch(
+                BatchReviewRequest(
+                    sections=[BatchSection(id=section_id, diff=p.request.diff) for section_id, p in sections.items()],
+                    diff_format=batch[0].request.diff_format,
+                    # Style checks are only left to local linters where every section had them
+                    linted_languages=sorted(
+                        set.intersection(*(set(p.request.linted_languages) for p in batch))
+                    ),
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Batched review of {len(batch)} diffs failed, reviewing them one by one: {e}")
+            for pending in batch:
+                self._executor.submit(self._review_alone, pending)
+            return
+
+        reviews = {review.section.strip(): review for review in response.sections}
+        for section_id, pending in sections.items():
+            review = reviews.get(section_id)
+            if review is None:
+                logger.debug(f"Section {section_id} missing from batched response, reviewing it alone")
+                self._executor.submit(self._review_alone, pending)
+                continue
+            files = request_files(pending.request)
+            issues = [issue for issue in review.issues if issue.file.removeprefix("b/").removeprefix("a/") in files]
+            if len(issues) < len(review.issues):
+                logger.warning(f"Dropped {len(review.issues) - len(issues)} finding(s) outside section {section_id}")
+            pending.future.set_result(
+                ReviewCodeDiffResponse(issues=issues, summary=review.summary, confidence=review.confidence)
+            )
+
+
+_default_batchers: Dict[str, MicroBatcher] = {}
+_default_batchers_lock = threading.Lock()
+
+
+def default_micro_batcher(llm: LLMService) -> MicroBatcher:
+    """Process-wide batcher for the model behind `llm`, so PRs reviewed concurrently share windows"""
+    with _default_batchers_lock:
+        if llm.model not in _default_batchers:
+            _default_batchers[llm.model] = MicroBatcher(llm)
+        return _default_batchers[llm.model]
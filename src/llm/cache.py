@@ -0,0 +1,196 @@
+import itertools
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Protocol, Tuple
+from pydantic import BaseModel
+from src.config.constant import LLM_PROMPT_CACHE_MIN_TOKENS_BY_MODEL
+from src.config.env import settings
+from src.llm.tokens import estimate_tokens
+from src.llm.types import CacheablePrompt
+
+logger = logging.getLogger(__name__)
+
+_CACHE_MISS_RE = re.compile(r"cached ?content\S*.*?(not found|expired|permission denied)", re.IGNORECASE | re.DOTALL)
+
+
+def min_cache_tokens(model: str) -> int:
+    """Provider minimum for a cached prefix; unknown models get the largest known one"""
+    for prefix, tokens in sorted(LLM_PROMPT_CACHE_MIN_TOKENS_BY_MODEL.items(), key=lambda item: -len(item[0])):
+        if model.startswith(prefix):
+            return tokens
+    return max(LLM_PROMPT_CACHE_MIN_TOKENS_BY_MODEL.values())
+
+
+def is_cache_miss(error: BaseException) -> bool:
+    """True when a call failed because its cached-content handle is gone (expired, evicted or deleted)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        # SDK errors carry the HTTP status; the call's only other resource is the model itself
+        if getattr(error, "code", None) == 404 or _CACHE_MISS_RE.search(str(error)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class PromptCacheBackend(Protocol):
+    """Provider API for creating and deleting cached-content handles"""
+
+    def create(self, model: str, system_instruction: str, ttl_seconds: int) -> str: ...
+
+    def delete(self, name: str) -> None: ...
+
+
+class GeminiPromptCacheBackend:
+    """Gemini explicit context caching through the google-genai client"""
+
+    def __init__(self, api_key: Optional[str] = None):
+        from google import genai
+
+        self.client = genai.Client(api_key=api_key or settings.GPT_API_KEY)
+
+    def create(self, model: str, system_instruction: str, ttl_seconds: int) -> str:
+        from google.genai import types
+
+        cache = self.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        return cache.name
+
+    def delete(self, name: str) -> None:
+        self.client.caches.delete(name=name)
+
+
+class InMemoryPromptCacheBackend:
+    """Local stand-in for the provider cache API, for tests and offline runs"""
+
+    def __init__(self):
+        self._counter = itertools.count(1)
+        self.handles: Dict[str, Tuple[str, str, float]] = {}
+        self.created: List[str] = []
+        self.deleted: List[str] = []
+
+    def create(self, model: str, system_instruction: str, ttl_seconds: int) -> str:
+        name = f"cachedContents/local-{next(self._counter)}"
+        self.handles[name] = (model, system_instruction, time.monotonic() + ttl_seconds)
+        self.created.append(name)
+        return name
+
+    def delete(self, name: str) -> None:
+        self.handles.pop(name, None)
+        self.deleted.append(name)
+
+
+class _CacheEntry(BaseModel):
+    name: str
+    version: str
+    expires_at: float
+
+
+class PromptCache:
+    """
+    Hands out provider cached-content handles for the static prefix of a prompt.
+    A handle is reused until it comes within `refresh_margin_seconds` of its TTL,
+    and is replaced (and the old one deleted) as soon as the prompt's version changes.
+    The provider calls run outside the lock; concurrent callers needing the same new
+    handle wait for the one call creating it. Prefixes shorter than the provider's minimum cacheable size for the model (or
+    `min_tokens`, when set) are never cached.
+    """
+
+    def __init__(
+        self,
+        backend: PromptCacheBackend,
+        ttl_seconds: Optional[int] = None,
+        refresh_margin_seconds: Optional[int] = None,
+        min_tokens: Optional[int] = None,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.LLM_PROMPT_CACHE_TTL_SECONDS
+        self.refresh_margin_seconds = (
+            refresh_margin_seconds
+            if refresh_margin_seconds is not None
+            else settings.LLM_PROMPT_CACHE_REFRESH_MARGIN_SECONDS
+        )
+        self.min_tokens = min_tokens if min_tokens is not None else settings.LLM_PROMPT_CACHE_MIN_TOKENS
+        self._entries: Dict[Tuple[str, str], _CacheEntry] = {}
+        # Handles being created: key -> (prompt version, future of the handle name or None)
+        self._pending: Dict[Tuple[str, str], Tuple[str, Future]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str, prompt: CacheablePrompt) -> Optional[str]:
+        """Return a live handle for the prompt prefix, creating one if needed; None if not cacheable"""
+        min_tokens = self.min_tokens if self.min_tokens is not None else min_cache_tokens(model)
+        if estimate_tokens(prompt.prefix) < min_tokens:
+            return None
+
+        key = (model, prompt.name)
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry and entry.version == prompt.version and entry.expires_at - self.refresh_margin_seconds > now:
+                return entry.name
+            pending = self._pending.get(key)
+            if pending and pending[0] == prompt.version:
+                creating = pending[1]
+            else:
+                creating = None
+                future: Future = Future()
+                self._pending[key] = (prompt.version, future)
+                stale = self._entries.pop(key, None)
+        if creating is not None:
+            return creating.result()
+
+        if stale:
+            self._delete(stale.name)
+        try:
+            name = self.backend.create(model, prompt.prefix, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Failed to create cached content for prompt {prompt.name}: {e}")
+            name = None
+        with self._lock:
+            # A caller with a newer version took over the key meanwhile; this handle then
+            # only serves the callers already waiting for it and expires on its own
+            if self._pending.get(key, (None, None))[1] is future:
+                del self._pending[key]
+                if name is not None:
+                    self._entries[key] = _CacheEntry(name=name, version=prompt.version, expires_at=now + self.ttl_seconds)
+        future.set_result(name)
+        if name is not None:
+            logger.debug(f"🗄️ Created cached content {name} for prompt {prompt.name}@{prompt.version}")
+        return name
+
+    def invalidate(self, model: str, prompt: CacheablePrompt) -> None:
+        """Forget (and delete) the handle for a prompt, e.g. after the provider rejected it"""
+        with self._lock:
+            entry = self._entries.pop((model, prompt.name), None)
+        if entry:
+            self._delete(entry.name)
+
+    def _delete(self, name: str) -> None:
+        try:
+            self.backend.delete(name)
+        except Exception as e:
+            # The handle expires on its own; a failed delete only costs storage until then
+            logger.debug(f"Failed to delete cached content {name}: {e}")
+
+
+_default_prompt_cache: Optional[PromptCache] = None
+_default_prompt_cache_lock = threading.Lock()
+
+
+def default_prompt_cache() -> Optional[PromptCache]:
+    """Process-wide prompt cache backed by Gemini, or None when caching is disabled"""
+    global _default_prompt_cache
+    if not settings.LLM_PROMPT_CACHE_ENABLED:
+        return None
+    with _default_prompt_cache_lock:
+        if _default_prompt_cache is None:
+            _default_prompt_cache = PromptCache(GeminiPromptCacheBackend())
+        return _default_prompt_cache
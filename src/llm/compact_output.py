@@ -0,0 +1,147 @@
+import logging
+import re
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from src.github.types import DiffIssue
+from src.llm.types import CacheablePrompt, ReviewCodeDiffResponse
+
+logger = logging.getLogger(__name__)
+
+# One record per line, `|`-separated; the message is last so it may contain `|`.
+#   I|<file>|<line or start-end>|<E|W|S>|<severity 1-10>|<message>
+#   S|<summary>
+#   C|<confidence 0-1>
+ISSUE_RECORD = "I"
+SUMMARY_RECORD = "S"
+CONFIDENCE_RECORD = "C"
+TYPE_CODES = {"E": "error", "W": "warning", "S": "suggestion"}
+TYPE_LETTERS = {name: code for code, name in TYPE_CODES.items()}
+
+_LINE_RE = re.compile(r"^\d+(?:-\d+)?$")
+
+COMPACT_OUTPUT_INSTRUCTIONS = """
+OUTPUT FORMAT (strict, plain text, no JSON, no markdown, one record per line):
+I|<file>|<line or start-end>|<E for error, W for warning, S for suggestion>|<severity 1-10>|<message>
+S|<summary on one line>
+C|<confidence from 0 to 1 that the review is complete and correct>
+Write one I line per issue, then exactly one S line and one C line.
+"""
+
+
+class CompactLineError(BaseModel):
+    """A record in compact model output that failed validation"""
+
+    line_no: int
+    text: str
+    error: str
+
+
+class CompactParseResult(BaseModel):
+    response: ReviewCodeDiffResponse
+    errors: List[CompactLineError] = Field(default_factory=list)
+    complete: bool = True
+
+
+def with_compact_output(prompt: CacheablePrompt) -> CacheablePrompt:
+    """Variant of a prompt whose static prefix asks for the compact output format"""
+    return CacheablePrompt(
+        name=f"{prompt.name}+compact-output",
+        prefix=prompt.prefix + COMPACT_OUTPUT_INSTRUCTIONS,
+        suffix=prompt.suffix,
+    )
+
+
+def parse_issue_record(line: str) -> DiffIssue:
+    """Parse one `I|...` record; raises ValueError with the reason when it is malformed"""
+    parts = line.split("|", 5)
+    if len(parts) != 6:
+        raise ValueError(f"expected 6 fields, got {len(parts)}")
+    _, file, line_ref, type_code, severity, message = (part.strip() for part in parts)
+    if not file:
+        raise ValueError("empty file")
+    if not _LINE_RE.match(line_ref):
+        raise ValueError(f"invalid line {line_ref!r}")
+    if type_code.upper() not in TYPE_CODES:
+        raise ValueError(f"invalid type {type_code!r}")
+    if not severity.isdigit() or not 1 <= int(severity) <= 10:
+        raise ValueError(f"invalid severity {severity!r}")
+    if not message:
+        raise ValueError("empty message")
+    return DiffIssue(
+        file=file, line=line_ref, type=TYPE_CODES[type_code.upper()], severity=int(severity), message=message
+    )
+
+
+class CompactOutputParser:
+    """
+    Line-by-line parser for the compact output format. Can be fed a token stream
+    (issues are returned as soon as their line is complete) or a whole response.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.issues: List[DiffIssue] = []
+        self.errors: List[CompactLineError] = []
+        self.summary = ""
+        self.confidence: Optional[float] = None
+        self._line_no = 0
+        self.complete = False
+
+    def feed(self, chunk: str) -> List[DiffIssue]:
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split("\n")
+        completed = [issue for issue in map(self._parse_line, lines) if issue is not None]
+        self.issues.extend(completed)
+        return completed
+
+    def _parse_line(self, raw: str) -> Optional[DiffIssue]:
+        self._line_no += 1
+        line = raw.strip()
+        if not line or line.startswith("```"):
+            return None
+        record = line.split("|", 1)[0].strip().upper()
+        try:
+            if record == ISSUE_RECORD:
+                return parse_issue_record(line)
+            if record == SUMMARY_RECORD:
+                self.summary = " ".join(filter(None, [self.summary, line.split("|", 1)[1].strip()]))
+            elif record == CONFIDENCE_RECORD:
+                self.confidence = min(max(float(line.split("|", 1)[1]), 0.0), 1.0)
+            else:
+                raise ValueError(f"unknown record type {record!r}")
+        except (ValueError, IndexError) as e:
+            self.errors.append(CompactLineError(line_no=self._line_no, text=raw, error=str(e)))
+            logger.warning(f"Compact output line {self._line_no} rejected ({e}): {raw!r}")
+        return None
+
+    def finish(self) -> ReviewCodeDiffResponse:
+        tail, self.buffer = self.buffer, ""
+        issue = self._parse_line(tail) if tail else None
+        # The S and C trailer lines come last, so output cut off by the token limit has neither
+        self.complete = bool(self.summary) or self.confidence is not None
+        if issue is not None:
+            if self.complete:
+                self.issues.append(issue)
+            else:
+                # An unterminated issue line in truncated output is most likely cut off mid-message
+                logger.warning(f"Dropping unterminated issue line from truncated output: {tail!r}")
+        return ReviewCodeDiffResponse(issues=self.issues, summary=self.summary, confidence=self.confidence)
+
+
+def parse_compact_review(text: str) -> CompactParseResult:
+    parser = CompactOutputParser()
+    parser.feed(text)
+    response = parser.finish()
+    return CompactParseResult(response=response, errors=parser.errors, complete=parser.complete)
+
+
+def render_compact_review(response: ReviewCodeDiffResponse) -> str:
+    """Encode a response in the compact format (the inverse of `parse_compact_review`)"""
+    lines = [
+        f"I|{issue.file}|{issue.line}|{TYPE_LETTERS.get(issue.type, 'S')}|{issue.severity}|{issue.message}"
+        for issue in response.issues
+    ]
+    lines.append(f"S|{' '.join(response.summary.split())}")
+    if response.confidence is not None:
+        lines.append(f"C|{response.confidence:g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,223 @@
+import json
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+from pydantic import BaseModel
+from src.config.env import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+THROTTLE_STATUS_CODES = {429, 503}
+RETRYABLE_STATUS_CODES = THROTTLE_STATUS_CODES | {500, 502, 504}
+
+# Wrapped provider errors sometimes only keep the google.rpc status name in their message
+_STATUS_NAMES = {"RESOURCE_EXHAUSTED": 429, "UNAVAILABLE": 503, "INTERNAL": 500, "DEADLINE_EXCEEDED": 504}
+_STATUS_RE = re.compile(r"\b(RESOURCE_EXHAUSTED|UNAVAILABLE|INTERNAL|DEADLINE_EXCEEDED)\b")
+_RETRY_DELAY_RES = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"['\"]retryDelay['\"]\s*:\s*['\"](\d+(?:\.\d+)?)s['\"]"),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+]
+
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider error, looking through wrapped exceptions and the message text"""
+    for err in _error_chain(error):
+        for value in (getattr(err, "code", None), getattr(err, "status_code", None)):
+            if isinstance(value, int) and 100 <= value < 600:
+                return value
+        response = getattr(err, "response", None)
+        if isinstance(getattr(response, "status_code", None), int):
+            return response.status_code
+    match = _STATUS_RE.search(str(error))
+    return _STATUS_NAMES[match.group(1)] if match else None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Server-suggested wait from a `Retry-After` header or a Gemini `RetryInfo` detail"""
+    for err in _error_chain(error):
+        headers = getattr(getattr(err, "response", None), "headers", None)
+        if headers is not None:
+            value = headers.get("Retry-After") or headers.get("retry-after")
+            try:
+                if value is not None:
+                    return max(float(value), 0.0)
+            except ValueError:
+                pass
+        details = getattr(err, "details", None)
+        text = json.dumps(details) if isinstance(details, (dict, list)) else str(err)
+        for pattern in _RETRY_DELAY_RES:
+            match = pattern.search(text)
+            if match:
+                return float(match.group(1))
+    return None
+
+
+class LimiterStats(BaseModel):
+    """Point-in-time view of an adaptive limiter"""
+
+    name: str
+    limit: int
+    in_flight: int
+    waiting: int
+    throttle_events: int
+    latency_backoffs: int
+    retries: int
+    blocked_for_seconds: float
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit for calls to one provider model. Every call that finishes
+    under the latency target grows the limit additively (by one per `limit` calls);
+    a 429/503 cuts it multiplicatively and a slow call cuts it more gently. A
+    server-suggested Retry-After pauses new calls until it has passed, and throttled
+    calls are retried after it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        latency_target_ms: Optional[float] = None,
+        backoff_factor: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.name = name
+        self.min_limit = min_limit if min_limit is not None else settings.LLM_CONCURRENCY_MIN
+        self.max_limit = max_limit if max_limit is not None else settings.LLM_CONCURRENCY_MAX
+        initial = initial_limit if initial_limit is not None else settings.LLM_CONCURRENCY_INITIAL
+        self.latency_target_ms = (
+            latency_target_ms if latency_target_ms is not None else settings.LLM_CONCURRENCY_LATENCY_TARGET_MS
+        )
+        self.backoff_factor = backoff_factor if backoff_factor is not None else settings.LLM_CONCURRENCY_BACKOFF
+        self.max_retries = max_retries if max_retries is not None else settings.LLM_CONCURRENCY_MAX_RETRIES
+        self.clock = clock
+        self.sleep = sleep
+
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiting = 0
+        self._blocked_until = 0.0
+        self._throttle_events = 0
+        self._latency_backoffs = 0
+        self._retries = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> None:
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    pause = self._blocked_until - self.clock()
+                    if pause > 0:
+                        self._condition.wait(pause)
+                    elif self._in_flight >= self.limit:
+                        self._condition.wait()
+                    else:
+                        break
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+
+    def release(self, latency_ms: Optional[float] = None, error: Optional[BaseException] = None) -> None:
+        """Free a slot and adjust the limit from how the call went"""
+        with self._condition:
+            self._in_flight -= 1
+            previous = self.limit
+            status = status_code_of(error) if error is not None else None
+            if status in THROTTLE_STATUS_CODES:
+                self._throttle_events += 1
+                self._limit = max(self.min_limit, self._limit * self.backoff_factor)
+                retry_after = retry_after_seconds(error)
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, self.clock() + retry_after)
+            elif error is None and latency_ms is not None:
+                if latency_ms > self.latency_target_ms:
+                    self._latency_backoffs += 1
+                    self._limit = max(self.min_limit, self._limit * (1 + self.backoff_factor) / 2)
+                else:
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            if self.limit != previous:
+                logger.debug(f"🚦 {self.name} concurrency limit {previous} -> {self.limit} (status {status})")
+            self._condition.notify_all()
+
+    def run(self, fn: Callable[[], T], can_retry: Callable[[], bool] = lambda: True) -> T:
+        """
+        Run `fn` inside a slot. Throttled and transient provider errors are retried,
+        after the suggested Retry-After or an exponential backoff, while `can_retry()`.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            started = self.clock()
+            try:
+                result = fn()
+            except Exception as e:
+                self.release(error=e)
+                status = status_code_of(e)
+                if status not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries or not can_retry():
+                    raise
+                attempt += 1
+                with self._condition:
+                    self._retries += 1
+                delay = retry_after_seconds(e) or min(2 ** attempt, 60)
+                logger.warning(f"{self.name} call failed with {status}, retry {attempt} in {delay:.1f}s")
+                self.sleep(delay)
+                continue
+            self.release(latency_ms=(self.clock() - started) * 1000)
+            return result
+
+    def stats(self) -> LimiterStats:
+        with self._condition:
+            return LimiterStats(
+                name=self.name,
+                limit=self.limit,
+                in_flight=self._in_flight,
+                waiting=self._waiting,
+                throttle_events=self._throttle_events,
+                latency_backoffs=self._latency_backoffs,
+                retries=self._retries,
+                blocked_for_seconds=max(self._blocked_until - self.clock(), 0.0),
+            )
+
+
+_default_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_default_limiters_lock = threading.Lock()
+
+
+def default_concurrency_limiter(model: str) -> Optional[AdaptiveConcurrencyLimiter]:
+    """Process-wide limiter for a model (rate limits are per model), or None when disabled"""
+    if not settings.LLM_ADAPTIVE_CONCURRENCY_ENABLED:
+        return None
+    with _default_limiters_lock:
+        if model not in _default_limiters:
+            _default_limiters[model] = AdaptiveConcurrencyLimiter(model)
+        return _default_limiters[model]
+
+
+def limiter_stats() -> Dict[str, LimiterStats]:
+    """Stats of every process-wide limiter, keyed by model"""
+    with _default_limiters_lock:
+        limiters = list(_default_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, List, Optional, Protocol
+from pydantic import BaseModel
+from src.config.env import settings
+from src.github.types import DiffIssue
+from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse, VerifyIssuesRequest
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewBackend(Protocol):
+    """A model or provider that can review diffs; LLMService is the production implementation"""
+
+    def review_code_diff(self, code_diff_request: ReviewCodeDiffRequest, **kwargs) -> ReviewCodeDiffResponse: ...
+
+    def verify_prior_issues(self, verify_request: VerifyIssuesRequest) -> ReviewCodeDiffResponse: ...
+
+    def combine_summaries(self, summaries: List[str]) -> str: ...
+
+
+class HedgeStats(BaseModel):
+    """Counters of a hedge policy"""
+
+    calls: int
+    hedged: int
+    hedge_wins: int
+    budget_denied: int
+    delay_seconds: float
+
+
+class HedgePolicy:
+    """
+    When to send a hedge: after the configured percentile of recent primary latencies,
+    and only while hedged calls stay within a fraction of all calls. Shared by every
+    review in the process so the latency window and the budget outlive a single PR.
+    """
+
+    def __init__(
+        self,
+        percentile: Optional[float] = None,
+        budget: Optional[float] = None,
+        min_delay_seconds: Optional[float] = None,
+        default_delay_seconds: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        window: int = 200,
+    ):
+        self.percentile = percentile if percentile is not None else settings.LLM_HEDGE_PERCENTILE
+        self.budget = budget if budget is not None else settings.LLM_HEDGE_BUDGET
+        self.min_delay_seconds = (
+            min_delay_seconds if min_delay_seconds is not None else settings.LLM_HEDGE_MIN_DELAY_SECONDS
+        )
+        self.default_delay_seconds = (
+            default_delay_seconds if default_delay_seconds is not None else settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        )
+        self.min_samples = min_samples if min_samples is not None else settings.LLM_HEDGE_MIN_SAMPLES
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._calls = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._budget_denied = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Seconds to wait on the primary before hedging"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_delay_seconds
+            latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile))
+        return max(latencies[index], self.min_delay_seconds)
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def start_call(self) -> None:
+        with self._lock:
+            self._calls += 1
+
+    def try_hedge(self) -> bool:
+        """Take a hedge from the budget; False once hedges would exceed `budget` of all calls"""
+        with self._lock:
+            if self._hedged + 1 > self.budget * self._calls:
+                self._budget_denied += 1
+                return False
+            self._hedged += 1
+            return True
+
+    def record_hedge_win(self) -> None:
+        with self._lock:
+            self._hedge_wins += 1
+
+    def stats(self) -> HedgeStats:
+        delay = self.delay()
+        with self._lock:
+            return HedgeStats(
+                calls=self._calls,
+                hedged=self._hedged,
+                hedge_wins=self._hedge_wins,
+                budget_denied=self._budget_denied,
+                delay_seconds=delay,
+            )
+
+
+class HedgedReviewer:
+    """
+    Sends a review to the primary backend and, if it is still running after the
+    policy's delay, a duplicate to the secondary backend. The first valid result
+    wins. The other call is cancelled if it has not started yet and otherwise left
+    to finish in the background with its result discarded, since a blocking HTTP
+    call cannot be interrupted from another thread.
+    """
+
+    def __init__(self, primary: ReviewBackend, secondary: ReviewBackend, policy: Optional[HedgePolicy] = None):
+        self.primary = primary
+        self.secondary = secondary
+        self.policy = policy or default_hedge_policy()
+
+    def _hedged(self, call: Callable[[ReviewBackend], ReviewCodeDiffResponse]) -> ReviewCodeDiffResponse:
+        self.policy.start_call()
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm-hedge")
+        try:
+            started = time.monotonic()
+            primary = executor.submit(call, self.primary)
+            primary.add_done_callback(lambda _: self.policy.record_latency(time.monotonic() - started))
+            pending: List[Future] = [primary]
+
+            done, _ = wait(pending, timeout=self.policy.delay())
+            if not done and self.policy.try_hedge():
+                logger.debug(f"🪃 Primary review still running after {time.monotonic() - started:.1f}s, hedging")
+                pending.append(executor.submit(call, self.secondary))
+
+            errors: Dict[Future, Exception] = {}
+            while True:
+                done, _ = wait([f for f in pending if f not in errors], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is not primary:
+                            self.policy.record_hedge_win()
+                        return future.result()
+                    errors[future] = future.exception()
+                if len(errors) == len(pending):
+                    raise errors[primary]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def review_code_diff(self, code_diff_request: ReviewCodeDiffRequest, **kwargs) -> ReviewCodeDiffResponse:
+        return self._hedged(lambda backend: backend.review_code_diff(code_diff_request, **kwargs))
+
+    def stream_review_code_diff(
+        self,
+        code_diff_request: ReviewCodeDiffRequest,
+        on_issue: Callable[[DiffIssue], None],
+        **kwargs,
+    ) -> ReviewCodeDiffResponse:
+        """
+        Hedged reviews are not streamed: issues from a losing call could not be taken
+        back. The winning response's issues are handed to `on_issue` once it is known.
+        """
+        response = self.review_code_diff(code_diff_request, **kwargs)
+        for issue in response.issues:
+            on_issue(issue)
+        return response
+
+    def verify_prior_issues(self, verify_request: VerifyIssuesRequest) -> ReviewCodeDiffResponse:
+        return self._hedged(lambda backend: backend.verify_prior_issues(verify_request))
+
+    def combine_summaries(self, summaries: List[str]) -> str:
+        # Short, non-blocking step of a map-reduce review; not worth a hedge
+        return self.primary.combine_summaries(summaries)
+
+
+_default_hedge_policy: Optional[HedgePolicy] = None
+_default_hedge_policy_lock = threading.Lock()
+
+
+def default_hedge_policy() -> HedgePolicy:
+    """Process-wide hedge policy"""
+    global _default_hedge_policy
+    with _default_hedge_policy_lock:
+        if _default_hedge_policy is None:
+            _default_hedge_policy = HedgePolicy()
+        return _default_hedge_policy
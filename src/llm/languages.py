@@ -0,0 +1,43 @@
+import os
+import re
+from typing import Iterable, List, Set
+from src.github.utils import file_path_of, parse_diff
+from src.llm.types import ReviewCodeDiffRequest
+
+# File extension (or exact file name) -> key into src.llm.prompts.LANGUAGE_CHECKS
+LANGUAGE_EXTENSIONS = {
+    ".py": "python", ".pyi": "python",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".cjs": "javascript",
+    ".ts": "javascript", ".tsx": "javascript",
+    ".go": "go",
+    ".java": "java", ".kt": "java", ".kts": "java",
+    ".rs": "rust",
+    ".rb": "ruby", ".rake": "ruby", "Gemfile": "ruby",
+    ".c": "c", ".h": "c", ".cc": "c", ".cpp": "c", ".cxx": "c", ".hpp": "c",
+    ".sh": "shell", ".bash": "shell",
+    ".sql": "sql",
+}
+
+# The whole header line as render_compact writes it; paths may contain spaces
+_COMPACT_FILE_RE = re.compile(r"^FILE (.+?)(?: \((?:new|deleted|renamed from .+)\))?$", re.MULTILINE)
+
+
+def language_of(path: str) -> str:
+    """Language key for a path, or "" when there is no specific guidance for it"""
+    name = os.path.basename(path)
+    return LANGUAGE_EXTENSIONS.get(name) or LANGUAGE_EXTENSIONS.get(os.path.splitext(name)[1].lower(), "")
+
+
+def languages_of(paths: Iterable[str]) -> List[str]:
+    return sorted({language_of(path) for path in paths} - {""})
+
+
+def request_files(code_diff_request: ReviewCodeDiffRequest) -> Set[str]:
+    """Paths a review request covers"""
+    if code_diff_request.diff_format == "compact":
+        return set(_COMPACT_FILE_RE.findall(code_diff_request.diff))
+    return {file_path_of(patched_file) for patched_file in parse_diff(code_diff_request.diff)}
+
+
+def request_languages(code_diff_request: ReviewCodeDiffRequest) -> List[str]:
+    return languages_of(request_files(code_diff_request))
@@ -0,0 +1,146 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from src.config.constant import LLM_MODEL_PRICING_PER_MILLION_TOKENS
+from src.config.env import settings
+from src.database import get_connection
+from src.exceptions import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    tier TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    latency_ms REAL NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL,
+    cost_usd REAL NOT NULL,
+    escalated INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_tier ON llm_calls (tier, created_at);
+"""
+
+
+class LLMCallRecord(BaseModel):
+    """Latency, token usage and cost of a single LLM call"""
+
+    tier: str
+    model: str
+    prompt: str
+    latency_ms: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+    escalated: bool = False
+    created_at: float = Field(default_factory=time.time)
+
+
+class TierSummary(BaseModel):
+    """Aggregated call statistics for one model tier"""
+
+    tier: str
+    model: str
+    calls: int
+    avg_latency_ms: float
+    p90_latency_ms: float
+    avg_input_tokens: float
+    avg_cost_usd: float
+    escalations: int
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    """Cost in USD; cached input tokens are billed at a quarter of the input price"""
+    for prefix, (input_price, output_price) in sorted(
+        LLM_MODEL_PRICING_PER_MILLION_TOKENS.items(), key=lambda item: -len(item[0])
+    ):
+        if model.startswith(prefix):
+            uncached = max(input_tokens - cached_tokens, 0)
+            return (uncached * input_price + cached_tokens * input_price / 4 + output_tokens * output_price) / 1e6
+    return 0.0
+
+
+class LLMCallRecorder:
+    """Persists per-call LLM statistics so routing thresholds can be tuned from real traffic"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        try:
+            self.conn = get_connection(db_path)
+            self.conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to initialise LLM call store: {e}") from e
+        self._lock = threading.Lock()
+
+    def record(self, record: LLMCallRecord) -> None:
+        try:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "INSERT INTO llm_calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        record.tier,
+                        record.model,
+                        record.prompt,
+                        record.latency_ms,
+                        record.input_tokens,
+                        record.output_tokens,
+                        record.cached_tokens,
+                        record.cost_usd,
+                        int(record.escalated),
+                        record.created_at,
+                    ),
+                )
+        except sqlite3.Error as e:
+            # Metrics must never fail a review
+            logger.warning(f"Failed to record LLM call: {e}")
+
+    def tier_summary(self, since: float = 0.0) -> List[TierSummary]:
+        """Per-tier call counts, latency, token and cost averages since a unix timestamp"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT tier, model, latency_ms, input_tokens, cost_usd, escalated FROM llm_calls "
+                "WHERE created_at >= ? ORDER BY tier, model",
+                (since,),
+            ).fetchall()
+
+        grouped = {}
+        for tier, model, latency_ms, input_tokens, cost_usd, escalated in rows:
+            grouped.setdefault((tier, model), []).append((latency_ms, input_tokens, cost_usd, escalated))
+
+        summaries = []
+        for (tier, model), calls in grouped.items():
+            latencies = sorted(call[0] for call in calls)
+            summaries.append(
+                TierSummary(
+                    tier=tier,
+                    model=model,
+                    calls=len(calls),
+                    avg_latency_ms=sum(latencies) / len(calls),
+                    p90_latency_ms=latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))],
+                    avg_input_tokens=sum(call[1] for call in calls) / len(calls),
+                    avg_cost_usd=sum(call[2] for call in calls) / len(calls),
+                    escalations=sum(call[3] for call in calls),
+                )
+            )
+        return summaries
+
+
+_default_recorder: Optional[LLMCallRecorder] = None
+_default_recorder_lock = threading.Lock()
+
+
+def default_call_recorder() -> Optional[LLMCallRecorder]:
+    """Process-wide call recorder, or None when LLM metrics are disabled"""
+    global _default_recorder
+    if not settings.LLM_METRICS_ENABLED:
+        return None
+    with _default_recorder_lock:
+        if _default_recorder is None:
+            _default_recorder = LLMCallRecorder()
+        return _default_recorder
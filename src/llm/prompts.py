@@ -1,16 +1,16 @@
-FLOW_SYNTAX_AND_SEMANTIC_CHECK_PROMPT = """
-You are an AI code syntax and semantic analyzer. 
-Focus specifically on syntax validation and semantic correctness of the provided git diff.
-
-Diff:
-```diff
-{diff}
-```
+from functools import lru_cache
+from typing import Iterable, Tuple
+from src.llm.types import CacheablePrompt
 
-SYNTAX AND SEMANTIC ANALYSIS INSTRUCTIONS:
+SYNTAX_CHECKS = """
+SYNTAX ANALYSIS INSTRUCTIONS:
 - Perform comprehensive syntax validation on all added/modified code (lines starting with '+')
-- Check for semantic correctness and logical consistency
 - Validate proper language-specific syntax rules
+"""
+
+SEMANTIC_CHECKS = """
+SEMANTIC ANALYSIS INSTRUCTIONS:
+- Check for semantic correctness and logical consistency
 - Identify potential runtime errors and type mismatches
 - Check for proper variable declarations and scope issues
 - Validate function/method signatures and return types
@@ -18,37 +18,107 @@ SYNTAX AND SEMANTIC ANALYSIS INSTRUCTIONS:
 - Check for undefined variables, functions, or classes
 - Validate proper exception handling patterns
 - Identify potential null/undefined reference errors
+- Missing or incorrect docstrings/comments
+- Overly complex functions or expressions
+- Magic numbers or hardcoded values
+- Proper error handling practices
+"""
 
+LINTING_CHECKS = """
 LINTING CHECKS:
 - Code formatting and style consistency
 - Naming conventions (variables, functions, classes)
 - Proper indentation and whitespace usage
-- Missing or incorrect docstrings/comments
 - Unused imports or variables
-- Overly complex functions or expressions
-- Magic numbers or hardcoded values
-- Proper error handling practices
+"""
+
+# Replaces SYNTAX_CHECKS and LINTING_CHECKS for languages checked by the local
+# pre-pass in src.review.lint, whose findings are posted without the LLM.
+LOCAL_CHECKS_NOTE = """
+LOCAL CHECKS:
+Syntax errors and lint findings (formatting, naming, unused imports or variables, style rules) in {languages}
+files are reported separately by a compiler and linters. Do not report them for those files.
+"""
 
-LANGUAGE-SPECIFIC CHECKS:
-For Python:
-- PEP 8 compliance
+# Per-language guidance, keyed by the names in src.llm.languages. Only the
+# sections for languages present in a diff are put into its prompt.
+LANGUAGE_CHECKS = {
+    "python": """For Python:
 - Proper use of list comprehensions vs loops
 - Correct exception handling with try/except
 - Type hints usage and correctness
 - Proper use of f-strings vs format()
-
-For JavaScript/TypeScript:
-- ESLint rule compliance
+""",
+    "javascript": """For JavaScript/TypeScript:
 - Proper async/await usage
 - Type safety (for TypeScript)
 - Proper Promise handling
 - Variable declaration best practices (const/let)
+""",
+    "go": """For Go:
+- Every returned error is checked or explicitly ignored
+- Errors wrapped with %w when context is added
+- Goroutines that can leak, and missing context cancellation
+- Data races on shared maps/slices without a mutex or channel
+- defer inside loops and deferred Close on nil values
+""",
+    "java": """For Java/Kotlin:
+- Resources closed with try-with-resources / use {}
+- equals/hashCode consistency and == on objects or strings
+- Null handling (Optional, nullable types, !! in Kotlin)
+- Checked exceptions swallowed or rethrown without cause
+- Thread safety of shared mutable state
+""",
+    "rust": """For Rust:
+- unwrap()/expect() on values that can fail at runtime
+- Unnecessary clone() and needless borrows
+- unsafe blocks and their invariants
+- Error propagation with ? and meaningful error types
+""",
+    "ruby": """For Ruby:
+- nil handling and safe navigation (&.)
+- Mutating frozen strings or shared constants
+- N+1 queries in ActiveRecord code
+- rescue without an exception class
+""",
+    "c": """For C/C++:
+- Buffer overflows, off-by-one errors and unchecked lengths
+- Memory leaks, double frees and use after free; prefer RAII/smart pointers in C++
+- Uninitialised variables and undefined behaviour
+- Integer overflow and signed/unsigned comparisons
+""",
+    "shell": """For shell scripts:
+- Unquoted variable expansions and word splitting
+- Missing set -euo pipefail or unchecked command failures
+- Non-portable bashisms in /bin/sh scripts
+""",
+    "sql": """For SQL:
+- Destructive statements without a WHERE clause
+- Migrations that lock large tables or are not reversible
+- Missing indexes for new filter/join columns
+""",
+}
+
+# Style-rule lines of LANGUAGE_CHECKS, left out for languages covered by local linters
+LANGUAGE_LINT_CHECKS = {
+    "python": "- PEP 8 compliance\n",
+    "javascript": "- ESLint rule compliance\n",
+}
+
+# Prompts are split into a static instruction prefix (sent as the system
+# instruction, so it can be cached provider-side) and a short per-request suffix
+# holding the diff. Keep anything that varies per review out of the prefixes.
+
+FLOW_SYNTAX_AND_SEMANTIC_CHECK_HEADER = """
+You are an AI code syntax and semantic analyzer. 
+Focus specifically on syntax validation and semantic correctness of the git diff provided by the user.
+"""
 
-For each issue found, specify:
+FLOW_SYNTAX_AND_SEMANTIC_CHECK_OUTPUT = """For each issue found, specify:
 - type: "error" for syntax errors, "warning" for potential issues, "suggestion" for style improvements
 - line: Use the NEW file line number from diff hunks for added/modified lines
 - message: Clear description focusing on syntax/semantic issue
-- severity: "high" for syntax errors, "medium" for semantic issues, "low" for style suggestions
+- severity: 1-10; 8-10 for syntax errors, 4-7 for semantic issues, 1-3 for style suggestions
 - file: Extract file path from diff headers, removing 'a/' or 'b/' prefixes
 
 CRITICAL FILE PATH EXTRACTION:
@@ -64,4 +134,173 @@ CRITICAL LINE NUMBER EXTRACTION:
 - Only report line numbers for lines that actually exist in the diff
 
 Provide a summary focusing on syntax correctness, semantic validity, and code quality improvements.
-"""
\ No newline at end of file
+"""
+
+# Same review with the diff pre-annotated by src.review.render.render_compact,
+# so the model no longer parses hunk headers or counts line numbers itself.
+FLOW_SYNTAX_AND_SEMANTIC_CHECK_COMPACT_HEADER = """
+You are an AI code syntax and semantic analyzer. 
+Focus specifically on syntax validation and semantic correctness of the code changes provided by the user.
+
+CHANGES FORMAT:
+- "FILE <path>" starts each file; use that path as-is
+- "+<n>|code" is an added line at NEW file line <n>
+- " code" is an unchanged context line
+- "-code" is a removed line
+- "..." marks lines left out
+"""
+
+FLOW_SYNTAX_AND_SEMANTIC_CHECK_COMPACT_OUTPUT = """For each issue found, specify:
+- type: "error" for syntax errors, "warning" for potential issues, "suggestion" for style improvements
+- line: The <n> of the added line (or "<n>-<m>" for a range); only use numbers shown in the changes
+- message: Clear description focusing on syntax/semantic issue
+- severity: 1-10; 8-10 for syntax errors, 4-7 for semantic issues, 1-3 for style suggestions
+- file: The path from the FILE line
+
+Provide a summary focusing on syntax correctness, semantic validity, and code quality improvements.
+"""
+
+
+VERIFY_PRIOR_ISSUES_PROMPT = """
+You are an AI code reviewer. The hunks provided by the user are near-identical to code that was already reviewed.
+Do not review them from scratch. Only verify the earlier findings listed with them against the new code.
+
+For each earlier finding, keep it only if it still applies to the new code, adjusting the file and
+NEW file line number if needed. Drop findings that no longer apply. Do not add unrelated findings.
+Provide a one-sentence summary.
+"""
+
+COMBINE_SUMMARIES_PROMPT = """
+You are an AI code reviewer. The user gives you review summaries of different parts of one large pull request.
+Combine them into a single summary of the whole pull request in at most 8 short bullet points.
+Lead with the most severe problems, merge points that repeat across parts, and do not invent anything
+that is not in the partial summaries. Reply with the bullet points only.
+"""
+
+GENERATE_TESTS_PROMPT = """
+You are an AI test engineer. Write pytest unit tests for the Python changes in the diff the user provides.
+
+- Test the behaviour the added or modified code introduces, including edge cases and error handling.
+- Import the code under test by its module path from the repository root; do not copy it into the test.
+- Tests must be self-contained and deterministic: no network, no external services, no sleeping, and
+  only temporary files (use the tmp_path fixture). Use only the standard library, pytest and packages
+  the changed code already imports.
+- Put each test module under tests/ with a name ending in _generated.py, and never overwrite existing files.
+- Keep each test small and independent so it can run on its own.
+Provide a one-sentence summary of what the tests cover.
+"""
+
+UNIFIED_DIFF_SUFFIX = """Diff:
+```diff
+{diff}
+```"""
+
+COMPACT_DIFF_SUFFIX = """Changes:
+```
+{diff}
+```"""
+
+# Filled into the "{context}" slot of review suffixes (empty when there is no context)
+REVIEW_CONTEXT_BLOCK = """Definitions referenced by the changes, from elsewhere in the repository (context only; do not review them):
+```
+{definitions}
+```
+
+"""
+
+GENERATE_TESTS_SUFFIX = UNIFIED_DIFF_SUFFIX
+
+COMBINE_SUMMARIES_SUFFIX = """Partial summaries:
+{summaries}"""
+
+VERIFY_PRIOR_ISSUES_SUFFIX = UNIFIED_DIFF_SUFFIX + """
+
+Earlier findings (file:line type severity message):
+{issues}"""
+
+BATCH_SECTIONS_INSTRUCTIONS = """
+BATCHED INPUT:
+The input holds several unrelated changes from different pull requests, each between
+"=== SECTION <id> ===" and "=== END SECTION <id> ===". Review every section on its own as described above.
+Never relate code, findings or file paths across sections. Return one entry per section with its id,
+its own issues and its own summary.
+"""
+
+BATCH_SECTIONS_SUFFIX = """Sections:
+{sections}"""
+
+
+
+def _language_checks(languages: Tuple[str, ...], linted: Tuple[str, ...]) -> str:
+    if not languages:
+        return ""
+    sections = [
+        LANGUAGE_CHECKS[language] + ("" if language in linted else LANGUAGE_LINT_CHECKS.get(language, ""))
+        for language in languages
+    ]
+    return "LANGUAGE-SPECIFIC CHECKS:\n" + "\n".join(sections) + "\n"
+
+
+def _general_checks(languages: Tuple[str, ...], linted: Tuple[str, ...]) -> str:
+    if not linted:
+        return SYNTAX_CHECKS + SEMANTIC_CHECKS + LINTING_CHECKS
+    note = LOCAL_CHECKS_NOTE.format(languages=", ".join(linted))
+    if set(languages) <= set(linted):
+        return SEMANTIC_CHECKS + note
+    return SYNTAX_CHECKS + SEMANTIC_CHECKS + LINTING_CHECKS + note
+
+
+@lru_cache(maxsize=256)
+def _review_prompt(
+    diff_format: str, languages: Tuple[str, ...], batch: bool, linted: Tuple[str, ...]
+) -> CacheablePrompt:
+    if diff_format == "compact":
+        header, output, suffix = (
+            FLOW_SYNTAX_AND_SEMANTIC_CHECK_COMPACT_HEADER, FLOW_SYNTAX_AND_SEMANTIC_CHECK_COMPACT_OUTPUT, COMPACT_DIFF_SUFFIX
+        )
+    else:
+        header, output, suffix = (
+            FLOW_SYNTAX_AND_SEMANTIC_CHECK_HEADER, FLOW_SYNTAX_AND_SEMANTIC_CHECK_OUTPUT, UNIFIED_DIFF_SUFFIX
+        )
+    prefix = header + _general_checks(languages, linted) + _language_checks(languages, linted) + output
+    name = f"review-{diff_format}"
+    if batch:
+        prefix += BATCH_SECTIONS_INSTRUCTIONS
+        suffix = BATCH_SECTIONS_SUFFIX
+        name += "-batch"
+    else:
+        suffix = "{context}" + suffix
+    name += f"[{','.join(languages)}]"
+    if linted:
+        name += f"-linted[{','.join(linted)}]"
+    return CacheablePrompt(name=name, prefix=prefix, suffix=suffix)
+
+
+def review_prompt(
+    diff_format: str = "unified",
+    languages: Iterable[str] = (),
+    batch: bool = False,
+    linted: Iterable[str] = (),
+) -> CacheablePrompt:
+    """
+    Review prompt with the language-specific sections for `languages` only, and without
+    the syntax and style checks for `linted` languages (covered by the local lint pre-pass).
+    Each distinct variant is built once; its name lists the languages and its
+    version follows the assembled prefix, so prompt caches keep one handle per variant.
+    """
+    selected = tuple(sorted(set(languages) & LANGUAGE_CHECKS.keys()))
+    return _review_prompt(diff_format, selected, batch, tuple(sorted(set(linted) & set(selected))))
+
+
+def review_context(definitions: str) -> str:
+    """Value for the "{context}" variable of a (non-batch) review prompt"""
+    return REVIEW_CONTEXT_BLOCK.format(definitions=definitions) if definitions.strip() else ""
+
+
+VERIFY_PRIOR_ISSUES = CacheablePrompt(
+    name="verify-prior-issues", prefix=VERIFY_PRIOR_ISSUES_PROMPT, suffix=VERIFY_PRIOR_ISSUES_SUFFIX
+)
+COMBINE_SUMMARIES = CacheablePrompt(
+    name="combine-summaries", prefix=COMBINE_SUMMARIES_PROMPT, suffix=COMBINE_SUMMARIES_SUFFIX
+)
+GENERATE_TESTS = CacheablePrompt(name="generate-tests", prefix=GENERATE_TESTS_PROMPT, suffix=GENERATE_TESTS_SUFFIX)
@@ -0,0 +1,69 @@
+import json
+import logging
+import re
+from typing import List, Tuple
+from src.github.types import DiffIssue
+from src.llm.streaming import IncrementalIssueParser
+from src.llm.types import ReviewCodeDiffResponse
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_RE = re.compile(r'"summary"\s*:\s*("(?:[^"\\]|\\.)*")')
+_CONFIDENCE_RE = re.compile(r'"confidence"\s*:\s*([0-9.]+)')
+
+
+def salvage_json_review(text: str) -> ReviewCodeDiffResponse:
+    """
+    Recover what can be recovered from a truncated or malformed JSON review:
+    every issue object that closed cleanly, plus the summary and confidence
+    when their values are complete.
+    """
+    parser = IncrementalIssueParser()
+    parser.feed(text or "")
+    summary = ""
+    match = _SUMMARY_RE.search(parser.buffer)
+    if match:
+        try:
+            summary = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            pass
+    confidence = None
+    match = _CONFIDENCE_RE.search(parser.buffer)
+    if match:
+        try:
+            confidence = min(max(float(match.group(1)), 0.0), 1.0)
+        except ValueError:
+            pass
+    logger.debug(f"🩹 Salvaged {len(parser.issues)} issue(s) from a partial review response")
+    return ReviewCodeDiffResponse(issues=parser.issues, summary=summary, confidence=confidence)
+
+
+def unreviewed_files(files: List[str], issues: List[DiffIssue]) -> List[str]:
+    """
+    Files of a partial review that still need a pass, given the diff's files in order.
+    The model reports issues in diff order, so everything after the last file it
+    reported on produced nothing; that last file is included as it may have been cut
+    off mid-way.
+    """
+    reported = {issue.file for issue in issues}
+    last = max((index for index, path in enumerate(files) if path in reported), default=0)
+    return files[last:]
+
+
+def merge_retry(
+    salvaged: ReviewCodeDiffResponse, retried: ReviewCodeDiffResponse
+) -> Tuple[ReviewCodeDiffResponse, List[DiffIssue]]:
+    """
+    Combine a salvaged partial review with the retry of its unreviewed files.
+    Returns the merged response and the issues the retry added.
+    """
+    seen = {(issue.file, issue.line, issue.type) for issue in salvaged.issues}
+    added = [issue for issue in retried.issues if (issue.file, issue.line, issue.type) not in seen]
+    summary = "\n\n".join(filter(None, [salvaged.summary, retried.summary]))
+    confidences = [c for c in (salvaged.confidence, retried.confidence) if c is not None]
+    response = ReviewCodeDiffResponse(
+        issues=salvaged.issues + added,
+        summary=summary,
+        confidence=min(confidences) if confidences else None,
+    )
+    return response, added
@@ -0,0 +1,164 @@
+import logging
+import re
+from typing import Callable, List, Optional
+from pydantic import BaseModel, Field
+from src.config.env import settings
+from src.exceptions import PartialResponseError
+from src.github.types import DiffIssue
+from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse
+
+logger = logging.getLogger(__name__)
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+
+# Word boundaries inside identifiers: camelCase humps and the end of an acronym (JWTToken)
+_CAMEL_BOUNDARY_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+
+
+def path_words(path: str) -> str:
+    """Lowercased path with camelCase words split by `_`, for whole-word matching"""
+    return _CAMEL_BOUNDARY_RE.sub("_", path).lower()
+
+
+def risky_path_re(patterns: List[str]) -> Optional[re.Pattern]:
+    """
+    Regex matching paths (as given by `path_words`) in which a pattern is a whole
+    word: `auth` matches `src/auth/`, `auth_service.py` and `userAuth.ts`, but not
+    `author.py` or `oauth.py`.
+    """
+    if not patterns:
+        return None
+    return re.compile(rf"(?<![a-z0-9])(?:{'|'.join(patterns)})(?![a-z0-9])", re.IGNORECASE)
+
+
+class DiffSignals(BaseModel):
+    """Cheap features of a diff used to pick a model tier"""
+
+    files: List[str] = Field(default_factory=list)
+    changed_lines: int = 0
+    estimated_tokens: int = 0
+
+
+class TierDecision(BaseModel):
+    tier: str
+    reason: str
+
+
+class TierRouter:
+    """
+    Picks the model tier for a review from diff size, file types and risky paths.
+    Small diffs, and diffs that only touch docs or config, go to the fast tier;
+    anything large or touching security-sensitive paths goes to the strong tier.
+    """
+
+    def __init__(
+        self,
+        fast_max_tokens: Optional[int] = None,
+        fast_max_files: Optional[int] = None,
+        risky_path_patterns: Optional[List[str]] = None,
+        low_risk_extensions: Optional[List[str]] = None,
+    ):
+        self.fast_max_tokens = fast_max_tokens if fast_max_tokens is not None else settings.LLM_FAST_MAX_TOKENS
+        self.fast_max_files = fast_max_files if fast_max_files is not None else settings.LLM_FAST_MAX_FILES
+        patterns = risky_path_patterns if risky_path_patterns is not None else settings.LLM_RISKY_PATH_PATTERNS
+        self.risky_path_re = risky_path_re(patterns)
+        self.low_risk_extensions = tuple(
+            low_risk_extensions if low_risk_extensions is not None else settings.LLM_LOW_RISK_EXTENSIONS
+        )
+
+    def choose(self, signals: DiffSignals) -> TierDecision:
+        if self.risky_path_re:
+            risky = [path for path in signals.files if self.risky_path_re.search(path_words(path))]
+            if risky:
+                return TierDecision(tier=STRONG_TIER, reason=f"risky path {risky[0]}")
+
+        if signals.files and all(path.endswith(self.low_risk_extensions) for path in signals.files):
+            return TierDecision(tier=FAST_TIER, reason="docs/config only")
+
+        if signals.estimated_tokens > self.fast_max_tokens:
+            return TierDecision(tier=STRONG_TIER, reason=f"{signals.estimated_tokens} tokens")
+        if len(signals.files) > self.fast_max_files:
+            return TierDecision(tier=STRONG_TIER, reason=f"{len(signals.files)} files")
+        return TierDecision(tier=FAST_TIER, reason="small diff")
+
+
+def needs_escalation(
+    response: ReviewCodeDiffResponse,
+    severity_threshold: Optional[int] = None,
+    min_confidence: Optional[float] = None,
+) -> Optional[str]:
+    """Why a fast-tier result should be re-run on the strong tier, or None if it can stand"""
+    severity_threshold = severity_threshold if severity_threshold is not None else settings.LLM_ESCALATE_SEVERITY
+    min_confidence = min_confidence if min_confidence is not None else settings.LLM_ESCALATE_MIN_CONFIDENCE
+
+    severe = [issue for issue in response.issues if issue.severity >= severity_threshold]
+    if severe:
+        return f"{len(severe)} high-severity finding(s)"
+    if response.confidence is not None and response.confidence < min_confidence:
+        return f"low confidence {response.confidence:.2f}"
+    return None
+
+
+def _on_backend(backend, method: str, *args, **kwargs) -> ReviewCodeDiffResponse:
+    """Call a review method, recording on a partial-response error which backend produced it"""
+    try:
+        return getattr(backend, method)(*args, **kwargs)
+    except PartialResponseError as e:
+        if e.backend is None:
+            e.backend = backend
+        raise
+
+
+class ModelCascade:
+    """
+    Routes reviews to a fast or strong LLMService and escalates fast-tier results
+    to the strong tier only when they report severe findings or low confidence.
+    Partial responses carry the backend that produced them, so their retry stays
+    on that tier.
+    """
+
+    def __init__(self, fast, strong, router: Optional[TierRouter] = None):
+        self.fast = fast
+        self.strong = strong
+        self.router = router or TierRouter()
+
+    def review_code_diff(self, code_diff_request: ReviewCodeDiffRequest, signals: DiffSignals) -> ReviewCodeDiffResponse:
+        decision = self.router.choose(signals)
+        logger.debug(f"🧭 Routing review to {decision.tier} tier ({decision.reason})")
+        if decision.tier == STRONG_TIER:
+            return _on_backend(self.strong, "review_code_diff", code_diff_request)
+
+        response = _on_backend(self.fast, "review_code_diff", code_diff_request)
+        reason = needs_escalation(response)
+        if reason is None:
+            return response
+
+        logger.debug(f"⏫ Escalating review to {STRONG_TIER} tier: {reason}")
+        return _on_backend(self.strong, "review_code_diff", code_diff_request, escalated=True)
+
+    def stream_review_code_diff(
+        self,
+        code_diff_request: ReviewCodeDiffRequest,
+        signals: DiffSignals,
+        on_issue: Callable[[DiffIssue], None],
+    ) -> ReviewCodeDiffResponse:
+        """
+        Streaming variant of `review_code_diff`. Strong-tier reviews stream straight to
+        `on_issue`; fast-tier results are held back until it is clear they will not be
+        escalated, so issues from a discarded fast pass are never emitted.
+        """
+        decision = self.router.choose(signals)
+        logger.debug(f"🧭 Routing review to {decision.tier} tier ({decision.reason})")
+        if decision.tier == STRONG_TIER:
+            return _on_backend(self.strong, "stream_review_code_diff", code_diff_request, on_issue)
+
+        response = _on_backend(self.fast, "review_code_diff", code_diff_request)
+        reason = needs_escalation(response)
+        if reason is None:
+            for issue in response.issues:
+                on_issue(issue)
+            return response
+
+        logger.debug(f"⏫ Escalating review to {STRONG_TIER} tier: {reason}")
+        return _on_backend(self.strong, "stream_review_code_diff", code_diff_request, on_issue, escalated=True)
@@ -1,18 +1,57 @@
 
 import logging
 import json
+import time
+from typing import Callable, List, Optional, Type
+from pydantic import BaseModel
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import SystemMessage
+from langchain_core.messages.ai import add_usage
 from langchain_core.prompts import ChatPromptTemplate
 from src.config.env import settings
-from src.llm.prompts import FLOW_SYNTAX_AND_SEMANTIC_CHECK_PROMPT
-from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse
+from src.exceptions import PartialResponseError
+from src.github.types import DiffIssue
+from src.llm.cache import PromptCache, default_prompt_cache, is_cache_miss
+from src.llm.concurrency import AdaptiveConcurrencyLimiter, default_concurrency_limiter
+from src.llm.compact_output import CompactOutputParser, parse_compact_review, with_compact_output
+from src.llm.metrics import LLMCallRecord, LLMCallRecorder, default_call_recorder, estimate_cost
+from src.llm.languages import request_languages
+from src.llm.prompts import COMBINE_SUMMARIES, GENERATE_TESTS, VERIFY_PRIOR_ISSUES, review_context, review_prompt
+from src.llm.repair import salvage_json_review
+from src.llm.streaming import IncrementalIssueParser
+from src.llm.types import (
+    BatchReviewRequest,
+    BatchReviewResponse,
+    CacheablePrompt,
+    GenerateTestsRequest,
+    GenerateTestsResponse,
+    ReviewCodeDiffRequest,
+    ReviewCodeDiffResponse,
+    VerifyIssuesRequest,
+)
 
 logger = logging.getLogger(__name__)
 
 class LLMService:
     llm = None
 
-    def __init__(self, model="gemini-2.5-pro", temperature=0.2):
+    def __init__(
+        self,
+        model="gemini-2.5-pro",
+        temperature=0.2,
+        prompt_cache: Optional[PromptCache] = None,
+        tier: str = "strong",
+        recorder: Optional[LLMCallRecorder] = None,
+        output_format: Optional[str] = None,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ):
+        self.model = model
+        self.tier = tier
+        self.prompt_cache = prompt_cache if prompt_cache is not None else default_prompt_cache()
+        self.recorder = recorder if recorder is not None else default_call_recorder()
+        # "json" uses the provider's JSON-schema mode, "compact" the line format from src.llm.compact_output
+        self.output_format = output_format if output_format is not None else settings.LLM_OUTPUT_FORMAT
+        self.limiter = limiter if limiter is not None else default_concurrency_limiter(model)
         if self.llm is None:
             if not settings.GPT_API_KEY or settings.GPT_API_KEY == "sk-YourAIKeyHere":
                 raise ValueError("Google API key missing. Please set GPT_API_KEY in your .env file")
@@ -21,20 +60,178 @@ class LLMService:
                     model=model,
                     temperature=temperature,
                     google_api_key=settings.GPT_API_KEY,
-                    convert_system_message_to_human=True,
+                    # With a limiter in front, it owns retries so it sees throttling and honours Retry-After
+                    **({"max_retries": 1} if self.limiter else {}),
                 )
             except Exception as e:
                 logging.error(f"Failed to initialize LLM client: {e}")
                 raise
-    
-    def review_code_diff(self, code_diff_request: ReviewCodeDiffRequest) -> ReviewCodeDiffResponse:
+
+    def _review_prompt(self, prompt: CacheablePrompt) -> CacheablePrompt:
+        return with_compact_output(prompt) if self.output_format == "compact" else prompt
+
+    def _call(
+        self,
+        prompt: CacheablePrompt,
+        run: Callable,
+        can_retry: Callable[[], bool] = lambda: True,
+        max_output_tokens: Optional[int] = None,
+    ):
+        """
+        Call `run(template, llm)` for a prompt. The static prefix is served from a
+        provider cached-content handle when one is available, otherwise it is sent
+        as the system instruction ahead of the per-request suffix.
+        """
+        base_llm = self.llm
+        if max_output_tokens is not None:
+            base_llm = self.llm.model_copy(update={"max_output_tokens": max_output_tokens})
+        cached_content = self.prompt_cache.get(self.model, prompt) if self.prompt_cache else None
+        if cached_content:
+            try:
+                llm = base_llm.model_copy(update={"cached_content": cached_content})
+                template = ChatPromptTemplate.from_messages([("human", prompt.suffix)])
+                return self._limited(lambda: run(template, llm), can_retry)
+            except PartialResponseError:
+                # The call went through; re-running it uncached would pay for the whole diff again
+                raise
+            except Exception as e:
+                # Other failures say nothing about the handle; keep it and let the caller see the error
+                if not is_cache_miss(e) or not can_retry():
+                    raise
+                # Handle expired or evicted provider-side: drop it and fall back to an uncached call
+                logger.warning(f"Cached content for prompt {prompt.name} is gone, retrying uncached: {e}")
+                self.prompt_cache.invalidate(self.model, prompt)
+
+        template = ChatPromptTemplate.from_messages([SystemMessage(content=prompt.prefix), ("human", prompt.suffix)])
+        return self._limited(lambda: run(template, base_llm), can_retry)
+
+    def _limited(self, fn: Callable, can_retry: Callable[[], bool]):
+        if self.limiter is None:
+            return fn()
+        return self.limiter.run(fn, can_retry=can_retry)
+
+    def _invoke_review(
+        self,
+        prompt: CacheablePrompt,
+        variables: dict,
+        escalated: bool = False,
+        max_output_tokens: Optional[int] = None,
+    ) -> ReviewCodeDiffResponse:
+        prompt = self._review_prompt(prompt)
+        run = self._run_compact if self.output_format == "compact" else self._run_json
+        return self._call(
+            prompt,
+            lambda template, llm: run(template, llm, prompt, variables, escalated),
+            max_output_tokens=max_output_tokens,
+        )
+
+    def _run_json(
+        self,
+        template,
+        llm,
+        prompt: CacheablePrompt,
+        variables: dict,
+        escalated: bool,
+        schema: Type[BaseModel] = ReviewCodeDiffResponse,
+    ):
+        started = time.monotonic()
+        result = (template | llm.with_structured_output(schema, include_raw=True)).invoke(variables)
+        latency_ms = (time.monotonic() - started) * 1000
+
+        self._record(prompt, latency_ms, getattr(result["raw"], "usage_metadata", None), escalated)
+        if result["parsing_error"] is not None or result["parsed"] is None:
+            raw_text = result["raw"].text if result["raw"] is not None else ""
+            raise PartialResponseError(
+                f"Failed to parse structured LLM output: {result['parsing_error']}",
+                response=salvage_json_review(raw_text) if schema is ReviewCodeDiffResponse else None,
+            )
+        return result["parsed"]
+
+    def _run_compact(self, template, llm, prompt: CacheablePrompt, variables: dict, escalated: bool) -> ReviewCodeDiffResponse:
+        started = time.monotonic()
+        message = (template | llm).invoke(variables)
+        latency_ms = (time.monotonic() - started) * 1000
+
+        self._record(prompt, latency_ms, message.usage_metadata, escalated)
+        result = parse_compact_review(message.text)
+        if not result.complete:
+            raise PartialResponseError(
+                f"Compact LLM output ended without its summary ({len(result.errors)} rejected line(s))",
+                response=result.response,
+            )
+        return result.response
+
+    def _run_text(self, template, llm, prompt: CacheablePrompt, variables: dict) -> str:
+        started = time.monotonic()
+        message = (template | llm).invoke(variables)
+        self._record(prompt, (time.monotonic() - started) * 1000, message.usage_metadata, False)
+        return message.text.strip()
+
+    def _record(self, prompt: CacheablePrompt, latency_ms: float, usage: Optional[dict], escalated: bool) -> None:
+        if not self.recorder:
+            return
+        usage = usage or {}
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        self.recorder.record(
+            LLMCallRecord(
+                tier=self.tier,
+                model=self.model,
+                prompt=prompt.name,
+                latency_ms=latency_ms,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cached_tokens=cached_tokens,
+                cost_usd=estimate_cost(self.model, input_tokens, output_tokens, cached_tokens),
+                escalated=escalated,
+            )
+        )
+
+    def _stream(self, template, llm, prompt: CacheablePrompt, variables: dict, on_issue, escalated: bool):
+        if self.output_format == "compact":
+            parser = CompactOutputParser()
+        else:
+            llm = llm.bind(
+                response_mime_type="application/json",
+                response_json_schema=ReviewCodeDiffResponse.model_json_schema(),
+            )
+            parser = IncrementalIssueParser()
+        usage = None
+        started = time.monotonic()
+        for chunk in (template | llm).stream(variables):
+            if chunk.usage_metadata:
+                usage = add_usage(usage, chunk.usage_metadata)
+            for issue in parser.feed(chunk.text):
+                on_issue(issue)
+        self._record(prompt, (time.monotonic() - started) * 1000, usage, escalated)
+        response = parser.finish()
+        if not parser.complete:
+            raise PartialResponseError("Streamed LLM output was truncated or malformed", response=response)
+        return response
+
+    def review_code_diff(
+        self,
+        code_diff_request: ReviewCodeDiffRequest,
+        escalated: bool = False,
+        max_output_tokens: Optional[int] = None,
+    ) -> ReviewCodeDiffResponse:
+        """
+        Review a diff. Raises PartialResponseError carrying the salvaged issues when
+        the output is truncated or malformed, so callers can retry only what is missing.
+        """
         try:
             if not code_diff_request.diff.strip():
                 raise ValueError("Diff content is empty or invalid")
-            structured_llm = self.llm.with_structured_output(ReviewCodeDiffResponse)
-            prompt = ChatPromptTemplate.from_template(FLOW_SYNTAX_AND_SEMANTIC_CHECK_PROMPT)
-            chain = prompt | structured_llm
-            response = chain.invoke({"diff": code_diff_request.diff})
+            prompt = review_prompt(
+                code_diff_request.diff_format,
+                request_languages(code_diff_request),
+                linted=code_diff_request.linted_languages,
+            )
+            variables = {"diff": code_diff_request.diff, "context": review_context(code_diff_request.context)}
+            response = self._invoke_review(
+                prompt, variables, escalated=escalated, max_output_tokens=max_output_tokens
+            )
 
             if not response:
                 raise RuntimeError("Empty response from LLM")
@@ -42,3 +239,119 @@ class LLMService:
         except Exception as e:
             logger.error(f"Error: review_code_diff : {e}")
             raise
+
+    def stream_review_code_diff(
+        self,
+        code_diff_request: ReviewCodeDiffRequest,
+        on_issue: Callable[[DiffIssue], None],
+        escalated: bool = False,
+    ) -> ReviewCodeDiffResponse:
+        """
+        Review a diff while streaming the model output, calling `on_issue` for each
+        issue as soon as it is complete. Returns the full response (issues and summary)
+        once the stream ends.
+        """
+        try:
+            if not code_diff_request.diff.strip():
+                raise ValueError("Diff content is empty or invalid")
+            prompt = review_prompt(
+                code_diff_request.diff_format,
+                request_languages(code_diff_request),
+                linted=code_diff_request.linted_languages,
+            )
+            prompt = self._review_prompt(prompt)
+            variables = {"diff": code_diff_request.diff, "context": review_context(code_diff_request.context)}
+            emitted = []
+
+            def emit(issue: DiffIssue) -> None:
+                emitted.append(issue)
+                on_issue(issue)
+
+            # A failed cached stream is only retried while nothing has been handed to the caller yet
+            return self._call(
+                prompt,
+                lambda template, llm: self._stream(template, llm, prompt, variables, emit, escalated),
+                can_retry=lambda: not emitted,
+            )
+        except Exception as e:
+            logger.error(f"Error: stream_review_code_diff : {e}")
+            raise
+
+    def review_batch(self, batch_request: BatchReviewRequest) -> BatchReviewResponse:
+        """
+        Review several unrelated small diffs in one call; each section gets its own
+        entry in the response. Always uses structured JSON output.
+        """
+        try:
+            if not batch_request.sections:
+                raise ValueError("Batch has no sections")
+            languages = {
+                language
+                for section in batch_request.sections
+                for language in request_languages(
+                    ReviewCodeDiffRequest(diff=section.diff, diff_format=batch_request.diff_format)
+                )
+            }
+            prompt = review_prompt(
+                batch_request.diff_format, languages, batch=True, linted=batch_request.linted_languages
+            )
+            sections = "\n\n".join(
+                f"=== SECTION {section.id} ===\n{section.diff}\n=== END SECTION {section.id} ==="
+                for section in batch_request.sections
+            )
+            return self._call(
+                prompt,
+                lambda template, llm: self._run_json(
+                    template, llm, prompt, {"sections": sections}, False, schema=BatchReviewResponse
+                ),
+            )
+        except Exception as e:
+            logger.error(f"Error: review_batch : {e}")
+            raise
+
+    def verify_prior_issues(self, verify_request: VerifyIssuesRequest) -> ReviewCodeDiffResponse:
+        """Re-check findings carried over from near-identical, previously reviewed hunks"""
+        try:
+            if not verify_request.diff.strip():
+                raise ValueError("Diff content is empty or invalid")
+            issues = "\n".join(
+                f"- {issue.file}:{issue.line} {issue.type} {issue.severity} {issue.message}"
+                for issue in verify_request.issues
+            ) or "- (none)"
+            response = self._invoke_review(VERIFY_PRIOR_ISSUES, {"diff": verify_request.diff, "issues": issues})
+
+            if not response:
+                raise RuntimeError("Empty response from LLM")
+            return response
+        except Exception as e:
+            logger.error(f"Error: verify_prior_issues : {e}")
+            raise
+
+    def combine_summaries(self, summaries: List[str]) -> str:
+        """Merge review summaries of separately reviewed parts of a PR into one PR-level summary"""
+        try:
+            if not summaries:
+                raise ValueError("No summaries to combine")
+            text = "\n\n".join(f"Part {index}:\n{summary}" for index, summary in enumerate(summaries, 1))
+            return self._call(
+                COMBINE_SUMMARIES,
+                lambda template, llm: self._run_text(template, llm, COMBINE_SUMMARIES, {"summaries": text}),
+            )
+        except Exception as e:
+            logger.error(f"Error: combine_summaries : {e}")
+            raise
+
+    def generate_tests(self, generate_request: GenerateTestsRequest) -> GenerateTestsResponse:
+        """Write pytest modules for the Python changes in a diff"""
+        try:
+            if not generate_request.diff.strip():
+                raise ValueError("Diff content is empty or invalid")
+            return self._call(
+                GENERATE_TESTS,
+                lambda template, llm: self._run_json(
+                    template, llm, GENERATE_TESTS, {"diff": generate_request.diff}, False, schema=GenerateTestsResponse
+                ),
+            )
+        except Exception as e:
+            logger.error(f"Error: generate_tests : {e}")
+            raise
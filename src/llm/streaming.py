@@ -0,0 +1,77 @@
+import json
+import logging
+from typing import List
+from pydantic import ValidationError
+from src.github.types import DiffIssue
+from src.llm.types import ReviewCodeDiffResponse
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalIssueParser:
+    """
+    Pulls complete `DiffIssue` objects out of a streamed ReviewCodeDiffResponse JSON
+    document as soon as each one closes, without waiting for the rest of the output.
+    Objects directly inside the root object's array are issues; the response schema
+    has no other array.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.issues: List[DiffIssue] = []
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._issue_start = -1
+        self.complete = False
+
+    def feed(self, chunk: str) -> List[DiffIssue]:
+        """Consume the next piece of model output and return the issues it completed"""
+        self.buffer += chunk
+        completed = []
+        while self._pos < len(self.buffer):
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._stack == ["{", "["]:
+                    self._issue_start = self._pos
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if char == "}" and self._stack == ["{", "["] and self._issue_start >= 0:
+                    issue = self._parse_issue(self.buffer[self._issue_start:self._pos + 1])
+                    if issue is not None:
+                        completed.append(issue)
+                    self._issue_start = -1
+            self._pos += 1
+        self.issues.extend(completed)
+        return completed
+
+    def _parse_issue(self, text: str):
+        try:
+            return DiffIssue(**json.loads(text))
+        except (json.JSONDecodeError, ValidationError, TypeError) as e:
+            logger.warning(f"Skipping malformed streamed issue: {e}")
+            return None
+
+    def finish(self) -> ReviewCodeDiffResponse:
+        """Parse the complete output; issues already emitted are kept even if the tail is malformed"""
+        try:
+            data = json.loads(self.buffer)
+            self.complete = True
+            return ReviewCodeDiffResponse(
+                issues=self.issues, summary=data.get("summary", ""), confidence=data.get("confidence")
+            )
+        except (json.JSONDecodeError, ValidationError, AttributeError) as e:
+            logger.warning(f"Streamed review output did not parse completely: {e}")
+            return ReviewCodeDiffResponse(issues=self.issues, summary="")
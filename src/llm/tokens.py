@@ -0,0 +1,17 @@
+import re
+
+# Words are split into ~4 character sub-words by BPE tokenizers, while each
+# punctuation mark and each whitespace run is usually a token of its own.
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d|[^A-Za-z\d\s]|\s+")
+CHARS_PER_WORD_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, offline estimate of how many tokens `text` costs as LLM input"""
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece[0].isalpha():
+            count += -(-len(piece) // CHARS_PER_WORD_TOKEN)
+        else:
+            count += 1
+    return count
@@ -1,16 +1,101 @@
 
-from typing import List
+import hashlib
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
+from src.github.types import DiffIssue
 
 
 class ReviewCodeDiffRequest(BaseModel):
     """LLM request model for code review"""
 
     diff: str
+    # "compact" diffs come from src.review.render.render_compact
+    diff_format: Literal["unified", "compact"] = "unified"
+    # Languages whose syntax and lint findings come from the local pre-pass (src.review.lint)
+    linted_languages: List[str] = Field(default_factory=list)
+    # Signatures of symbols the diff references, from src.review.symbols
+    context: str = ""
 
 
 class ReviewCodeDiffResponse(BaseModel):
     """LLM response model for general code review"""
 
-    issues: List[str] = Field(default_factory=list)
-    summary: str = ""
\ No newline at end of file
+    issues: List[DiffIssue] = Field(default_factory=list)
+    summary: str = ""
+    confidence: Optional[float] = Field(
+        None, description="Confidence from 0 (guessing) to 1 (certain) that the review is complete and correct"
+    )
+
+
+class BatchSection(BaseModel):
+    """One independent diff inside a micro-batched review request"""
+
+    id: str
+    diff: str
+
+
+class BatchReviewRequest(BaseModel):
+    """LLM request model for reviewing several small, unrelated diffs in one call"""
+
+    sections: List[BatchSection]
+    diff_format: Literal["unified", "compact"] = "unified"
+    linted_languages: List[str] = Field(default_factory=list)
+
+
+class SectionReview(BaseModel):
+    """Review of a single section of a batched request"""
+
+    section: str = Field(..., description="Id of the section this review belongs to")
+    issues: List[DiffIssue] = Field(default_factory=list)
+    summary: str = ""
+    confidence: Optional[float] = Field(
+        None, description="Confidence from 0 (guessing) to 1 (certain) that the review is complete and correct"
+    )
+
+
+class BatchReviewResponse(BaseModel):
+    """LLM response model for a batched review, one entry per section"""
+
+    sections: List[SectionReview] = Field(default_factory=list)
+
+
+class VerifyIssuesRequest(BaseModel):
+    """LLM request model for re-checking findings carried over from a similar hunk"""
+
+    diff: str
+    issues: List[DiffIssue] = Field(default_factory=list)
+
+
+class GenerateTestsRequest(BaseModel):
+    """LLM request model for writing unit tests for the changes of a PR"""
+
+    diff: str
+
+
+class GeneratedTestFile(BaseModel):
+    """One generated test module"""
+
+    path: str = Field(..., description="Repository-relative path of the new test file, e.g. tests/test_parser_generated.py")
+    content: str = Field(..., description="Complete source of the test file")
+
+
+class GenerateTestsResponse(BaseModel):
+    """LLM response model for generated unit tests"""
+
+    files: List[GeneratedTestFile] = Field(default_factory=list, description="Generated test files")
+    summary: str = Field("", description="What the tests cover")
+
+
+class CacheablePrompt(BaseModel):
+    """
+    Prompt split into a static instruction prefix, sent as the system instruction
+    and cacheable provider-side, and a per-request suffix template.
+    """
+
+    name: str
+    prefix: str
+    suffix: str
+
+    @property
+    def version(self) -> str:
+        return hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()[:12]
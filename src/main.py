@@ -1,6 +1,13 @@
 from fastapi import FastAPI, Request
+import asyncio
 import logging
+import time
+from src.config.env import settings
 from src.github.router import github_router
+from src.github.service import resume_bulk_reviews
+from src.llm.concurrency import limiter_stats
+from src.llm.hedging import default_hedge_policy
+from src.llm.metrics import default_call_recorder
 
 app = FastAPI()
 logger = logging.getLogger("main")
@@ -9,6 +16,24 @@ logger = logging.getLogger("main")
 app.include_router(github_router)
 
 
+@app.on_event("startup")
+async def resume_background_work():
+    # Bulk reviews submitted before a restart are still running at the provider
+    await asyncio.to_thread(resume_bulk_reviews)
+
+
+@app.get("/metrics")
+async def metrics(window_seconds: float = 3600):
+    """LLM limiter state, hedging counters and per-tier call statistics of the last `window_seconds`"""
+    recorder = default_call_recorder()
+    tiers = await asyncio.to_thread(recorder.tier_summary, time.time() - window_seconds) if recorder else []
+    return {
+        "limiters": limiter_stats(),
+        "hedging": default_hedge_policy().stats() if settings.LLM_HEDGING_ENABLED else None,
+        "tiers": tiers,
+    }
+
+
 @app.get("/")
 async def root():
     message = "This is an example of FastAPI with Jinja2 - go to /hi/<name> to see a template rendered"
@@ -0,0 +1,58 @@
+import os
+from typing import List, Tuple
+from unidiff import PatchSet
+from unidiff.patch import PatchedFile
+from src.github.utils import file_path_of, parse_diff
+from src.llm.tokens import estimate_tokens
+
+
+def diff_file_header(patched_file: PatchedFile) -> str:
+    """The `diff --git` / `---` / `+++` lines of a file, without its hunks"""
+    text = str(patched_file)
+    return text[: len(text) - sum(len(str(hunk)) for hunk in patched_file)]
+
+
+def _pieces(patched_file: PatchedFile, max_tokens: int) -> List[str]:
+    """The file's diff, split between hunks into pieces of at most `max_tokens` where possible"""
+    text = str(patched_file)
+    if estimate_tokens(text) <= max_tokens or len(patched_file) <= 1:
+        return [text]
+
+    header = diff_file_header(patched_file)
+    pieces, current, tokens = [], [], estimate_tokens(header)
+    for hunk in patched_file:
+        hunk_text = str(hunk)
+        hunk_tokens = estimate_tokens(hunk_text)
+        if current and tokens + hunk_tokens > max_tokens:
+            pieces.append(header + "".join(current))
+            current, tokens = [], estimate_tokens(header)
+        current.append(hunk_text)
+        tokens += hunk_tokens
+    if current:
+        pieces.append(header + "".join(current))
+    return pieces
+
+
+def chunk_patch(patch: PatchSet, max_tokens: int) -> List[PatchSet]:
+    """
+    Split a patch into chunks of roughly `max_tokens` for independent review.
+    Files are grouped by directory so related changes stay together; files too big
+    for one chunk are split between hunks. A single hunk is never split.
+    """
+    pieces: List[Tuple[str, str, int]] = []
+    for patched_file in patch:
+        directory = os.path.dirname(file_path_of(patched_file))
+        for piece in _pieces(patched_file, max_tokens):
+            pieces.append((directory, piece, estimate_tokens(piece)))
+    pieces.sort(key=lambda piece: piece[0])
+
+    chunks, current, tokens = [], [], 0
+    for _, piece, piece_tokens in pieces:
+        if current and tokens + piece_tokens > max_tokens:
+            chunks.append(current)
+            current, tokens = [], 0
+        current.append(piece)
+        tokens += piece_tokens
+    if current:
+        chunks.append(current)
+    return [parse_diff("".join(chunk)) for chunk in chunks]
@@ -0,0 +1,103 @@
+import ast
+import io
+import logging
+import re
+import textwrap
+import tokenize
+from typing import List, Optional
+from unidiff.patch import Hunk
+from src.config.env import settings
+from src.github.utils import file_path_of
+from src.review.types import PreparedDiff
+
+logger = logging.getLogger(__name__)
+
+PYTHON_EXTENSIONS = (".py", ".pyi", ".pyw", ".pyx", ".pxd")
+# Other formats where indentation is structure (YAML nesting, a Makefile recipe's tab): leading whitespace must not change
+INDENT_SENSITIVE_EXTENSIONS = (".yaml", ".yml", ".mk", ".coffee", ".sass", ".haml", ".pug", ".slim")
+INDENT_SENSITIVE_NAMES = ("Makefile", "makefile", "GNUmakefile")
+
+# String literals, words, single brackets and separators, and runs of other symbols
+_TOKEN_RE = re.compile(
+    r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`|\w+|[()\[\]{},;]|[^\w\s()\[\]{},;]+"
+)
+
+
+def _tokens(lines: List[str]) -> List[str]:
+    """
+    Tokens of the lines, string literals kept whole. Whitespace only separates tokens,
+    so spacing and line breaks don't matter, but `return x` and `returnx` still differ.
+    """
+    return [token for line in lines for token in _TOKEN_RE.findall(line)]
+
+
+def _indentation(lines: List[str]) -> List[str]:
+    return [line[: len(line) - len(line.lstrip())] for line in lines if line.strip()]
+
+
+def _indent_profile(lines: List[str]) -> List[int]:
+    """Indentation of non-blank lines as ranks, so a consistent re-indent keeps the same profile"""
+    widths = [len(line.expandtabs(4)) - len(line.expandtabs(4).lstrip()) for line in lines if line.strip()]
+    ranks = {width: rank for rank, width in enumerate(sorted(set(widths)))}
+    return [ranks[width] for width in widths]
+
+
+def _python_fingerprint(lines: List[str]) -> Optional[str]:
+    """AST dump plus comments of a code fragment, or None if the fragment does not parse on its own"""
+    source = textwrap.dedent("".join(lines))
+    try:
+        tree = ast.parse(source)
+        comments = [
+            token.string.lstrip("#").strip()
+            for token in tokenize.generate_tokens(io.StringIO(source).readline)
+            if token.type == tokenize.COMMENT
+        ]
+    except (SyntaxError, tokenize.TokenError, IndentationError, ValueError):
+        return None
+    return ast.dump(tree) + "\n#".join([""] + comments)
+
+
+def is_cosmetic_hunk(hunk: Hunk, path: str, python_ast: bool = True) -> bool:
+    """
+    True when the hunk changes only formatting: its old and new sides have the same
+    tokens. Indentation is significant in Python, so Python hunks must also keep their
+    indentation structure, or compare equal as ASTs when `python_ast` is set (which
+    also covers quote style, trailing commas and re-wrapped lines). In other
+    indentation-sensitive formats the leading whitespace must be unchanged.
+    """
+    if not any(line.is_added or line.is_removed for line in hunk):
+        return False
+
+    source = [line.value for line in hunk if not line.is_added]
+    target = [line.value for line in hunk if not line.is_removed]
+
+    if not path.endswith(PYTHON_EXTENSIONS):
+        if path.endswith(INDENT_SENSITIVE_EXTENSIONS) or path.rsplit("/", 1)[-1] in INDENT_SENSITIVE_NAMES:
+            return _tokens(source) == _tokens(target) and _indentation(source) == _indentation(target)
+        return _tokens(source) == _tokens(target)
+
+    if python_ast:
+        source_fp, target_fp = _python_fingerprint(source), _python_fingerprint(target)
+        if source_fp is not None and target_fp is not None:
+            return source_fp == target_fp
+
+    return _tokens(source) == _tokens(target) and _indent_profile(source) == _indent_profile(target)
+
+
+def drop_cosmetic_hunks(prepared: PreparedDiff, python_ast: Optional[bool] = None) -> int:
+    """Remove formatting-only hunks from the prepared diff and note how many were dropped"""
+    python_ast = settings.REVIEW_COSMETIC_PYTHON_AST if python_ast is None else python_ast
+    dropped, files = 0, set()
+    for patched_file in prepared.patch:
+        path = file_path_of(patched_file)
+        for hunk in list(patched_file):
+            if is_cosmetic_hunk(hunk, path, python_ast):
+                patched_file.remove(hunk)
+                dropped += 1
+                files.add(path)
+    prepared.drop_empty_files()
+
+    if dropped:
+        prepared.notes.append(f"Skipped {dropped} formatting-only hunk(s) in {len(files)} file(s).")
+        logger.debug(f"🧹 Dropped {dropped} cosmetic hunks")
+    return dropped
@@ -0,0 +1,296 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+from typing import Iterable, List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field
+from unidiff.patch import Hunk, PatchedFile
+from src.config.env import settings
+from src.database import get_connection
+from src.exceptions import DatabaseError
+from src.github.types import DiffIssue
+from src.github.utils import file_path_of, parse_issue_line
+from src.review.types import PreparedDiff
+
+logger = logging.getLogger(__name__)
+
+SIMHASH_BITS = 64
+# 4 bands of 16 bits: by pigeonhole, two fingerprints within Hamming distance 3
+# (similarity >= 0.95) always share at least one band, so lookups stay exact
+# down to that threshold while only touching indexed rows.
+SIMHASH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+SHINGLE_SIZE = 3
+
+_TOKEN_RE = re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|[A-Za-z_]\w*|\d+(?:\.\d+)?|\S")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hunk_fingerprints (
+    repository TEXT NOT NULL,
+    simhash INTEGER NOT NULL,
+    band0 INTEGER NOT NULL,
+    band1 INTEGER NOT NULL,
+    band2 INTEGER NOT NULL,
+    band3 INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    issues TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    content_hash TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (repository, simhash)
+);
+CREATE INDEX IF NOT EXISTS idx_hunk_fp_band0 ON hunk_fingerprints (repository, band0);
+CREATE INDEX IF NOT EXISTS idx_hunk_fp_band1 ON hunk_fingerprints (repository, band1);
+CREATE INDEX IF NOT EXISTS idx_hunk_fp_band2 ON hunk_fingerprints (repository, band2);
+CREATE INDEX IF NOT EXISTS idx_hunk_fp_band3 ON hunk_fingerprints (repository, band3);
+"""
+
+
+class StoredIssue(BaseModel):
+    """Issue stored relative to the first new-file line of its hunk"""
+
+    type: str
+    start_offset: int
+    end_offset: int
+    message: str
+    severity: int
+
+
+class HunkMatch(BaseModel):
+    """A hunk in the current diff that is near-identical to a previously reviewed one"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    path: str
+    hunk: Hunk
+    similarity: float
+    # Same changed lines as the stored hunk, not just the same SimHash
+    exact: bool = False
+    issues: List[DiffIssue] = Field(default_factory=list)
+
+
+def normalise_tokens(lines: List[str]) -> List[str]:
+    """Tokenise added lines, collapsing string literals and ignoring whitespace"""
+    tokens = []
+    for line in lines:
+        for token in _TOKEN_RE.findall(line):
+            tokens.append("<str>" if token[0] in "\"'" else token)
+    return tokens
+
+
+def simhash(tokens: List[str]) -> int:
+    """64-bit SimHash over token shingles"""
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = [" ".join(tokens)]
+    else:
+        shingles = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        digest = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if digest >> bit & 1 else -1
+
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def similarity(a: int, b: int) -> float:
+    return 1 - bin(a ^ b).count("1") / SIMHASH_BITS
+
+
+def _bands(fingerprint: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [fingerprint >> (i * BAND_BITS) & mask for i in range(SIMHASH_BANDS)]
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << SIMHASH_BITS) if value < 0 else value
+
+
+def _added_lines(hunk: Hunk) -> List[str]:
+    return [line.value for line in hunk if line.is_added]
+
+
+def content_hash(hunk: Hunk) -> str:
+    """Hash of the hunk's added and removed lines, ignoring whitespace; equal only for the same change"""
+    changed = [f"{line.line_type}{' '.join(line.value.split())}" for line in hunk if line.is_added or line.is_removed]
+    return hashlib.sha1("\n".join(changed).encode("utf-8")).hexdigest()
+
+
+def _hunk_range(hunk: Hunk) -> Tuple[int, int]:
+    return hunk.target_start, hunk.target_start + max(hunk.target_length, 1) - 1
+
+
+class NearDuplicateIndex:
+    """
+    Locality-sensitive index of previously reviewed hunks, scoped per repository.
+    Fingerprints are SimHashes of the normalised tokens of a hunk's added lines,
+    stored in SQLite together with the issues the review produced for that hunk.
+    """
+
+    def __init__(
+        self,
+        repository: str,
+        threshold: Optional[float] = None,
+        reuse_threshold: Optional[float] = None,
+        min_tokens: Optional[int] = None,
+        db_path: Optional[str] = None,
+    ):
+        self.repository = repository
+        self.threshold = threshold if threshold is not None else settings.REVIEW_DEDUP_THRESHOLD
+        self.reuse_threshold = (
+            reuse_threshold if reuse_threshold is not None else settings.REVIEW_DEDUP_REUSE_THRESHOLD
+        )
+        self.min_tokens = min_tokens if min_tokens is not None else settings.REVIEW_DEDUP_MIN_TOKENS
+        try:
+            self.conn = get_connection(db_path)
+            self.conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(hunk_fingerprints)")}
+            if "content_hash" not in columns:
+                # Stores created before exact matching; their rows never count as exact
+                self.conn.execute("ALTER TABLE hunk_fingerprints ADD COLUMN content_hash TEXT NOT NULL DEFAULT ''")
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to initialise hunk fingerprint store: {e}") from e
+
+    def fingerprint(self, hunk: Hunk) -> Optional[int]:
+        """SimHash of the hunk, or None if it has too few tokens to match reliably"""
+        tokens = normalise_tokens(_added_lines(hunk))
+        if len(tokens) < self.min_tokens:
+            return None
+        return simhash(tokens)
+
+    def lookup(self, path: str, hunk: Hunk) -> Optional[HunkMatch]:
+        """Find the most similar previously reviewed hunk above the threshold"""
+        fingerprint = self.fingerprint(hunk)
+        if fingerprint is None:
+            return None
+
+        bands = _bands(fingerprint)
+        rows = self.conn.execute(
+            """
+            SELECT simhash, issues, content_hash FROM hunk_fingerprints
+            WHERE repository = ? AND (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?)
+            """,
+            (self.repository, *bands),
+        ).fetchall()
+
+        best: Optional[Tuple[float, str, str]] = None
+        for stored_hash, issues_json, stored_content in rows:
+            score = similarity(fingerprint, _to_unsigned(stored_hash))
+            if score >= self.threshold and (best is None or score > best[0]):
+                best = (score, issues_json, stored_content)
+        if best is None:
+            return None
+
+        start, _ = _hunk_range(hunk)
+        issues = []
+        for stored in json.loads(best[1]):
+            stored = StoredIssue(**stored)
+            first, last = start + stored.start_offset, start + stored.end_offset
+            issues.append(
+                DiffIssue(
+                    type=stored.type,
+                    line=str(first) if first == last else f"{first}-{last}",
+                    message=stored.message,
+                    severity=stored.severity,
+                    file=path,
+                )
+            )
+        return HunkMatch(
+            path=path, hunk=hunk, similarity=best[0], exact=best[2] == content_hash(hunk), issues=issues
+        )
+
+    def record(self, path: str, hunk: Hunk, issues: List[DiffIssue]) -> None:
+        """Store the review outcome of a hunk, replacing any entry with the same fingerprint"""
+        fingerprint = self.fingerprint(hunk)
+        if fingerprint is None:
+            return
+
+        start, end = _hunk_range(hunk)
+        stored = []
+        for issue in issues:
+            line_range = parse_issue_line(issue.line)
+            if issue.file != path or line_range is None or not start <= line_range[0] <= end:
+                continue
+            stored.append(
+                StoredIssue(
+                    type=issue.type,
+                    start_offset=line_range[0] - start,
+                    end_offset=line_range[1] - start,
+                    message=issue.message,
+                    severity=issue.severity,
+                ).model_dump()
+            )
+
+        try:
+            with self.conn:
+                self.conn.execute(
+                    """
+                    INSERT OR REPLACE INTO hunk_fingerprints
+                    (repository, simhash, band0, band1, band2, band3, path, issues, updated_at, content_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        self.repository,
+                        _to_signed(fingerprint),
+                        *_bands(fingerprint),
+                        path,
+                        json.dumps(stored),
+                        time.time(),
+                        content_hash(hunk),
+                    ),
+                )
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to record hunk fingerprint: {e}") from e
+
+    def apply(self, prepared: PreparedDiff) -> List[HunkMatch]:
+        """
+        Take near-duplicate hunks out of the LLM payload.
+        Matches at or above the reuse threshold have their stored issues reused as-is;
+        the remaining matches are returned so their issues can be verified by a short prompt.
+        A clean result is only reused for the exact same change: a near-duplicate of a
+        clean hunk (say, one with a bounds check removed) stays in the payload.
+        """
+        reused, to_verify = 0, []
+        for patched_file in prepared.patch:
+            path = file_path_of(patched_file)
+            for hunk in list(patched_file):
+                match = self.lookup(path, hunk)
+                if match is None or (not match.issues and not match.exact):
+                    continue
+                patched_file.remove(hunk)
+                if match.similarity >= self.reuse_threshold or not match.issues:
+                    prepared.reused_issues.extend(match.issues)
+                    reused += 1
+                else:
+                    to_verify.append(match)
+        prepared.drop_empty_files()
+
+        if reused or to_verify:
+            prepared.notes.append(
+                f"Matched {reused + len(to_verify)} hunk(s) to previously reviewed code "
+                f"({reused} reused as-is, {len(to_verify)} re-verified)."
+            )
+        return to_verify
+
+    def record_review(self, files: Iterable[PatchedFile], issues: List[DiffIssue]) -> None:
+        """Index every hunk of the reviewed files with the issues reported inside it"""
+        for patched_file in files:
+            path = file_path_of(patched_file)
+            for hunk in patched_file:
+                self.record(path, hunk, issues)
+
+
+def render_matches(matches: List[HunkMatch]) -> Tuple[str, List[DiffIssue]]:
+    """Build the diff text and earlier findings for a verification prompt"""
+    diff_parts, issues = [], []
+    for match in matches:
+        diff_parts.append(f"--- a/{match.path}\n+++ b/{match.path}\n{match.hunk}")
+        issues.extend(match.issues)
+    return "".join(diff_parts), issues
@@ -0,0 +1,159 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Pattern, Tuple
+from unidiff.patch import PatchedFile
+from src.config.env import settings
+from src.github.utils import file_path_of
+from src.review.types import PreparedDiff, SkippedFile
+
+logger = logging.getLogger(__name__)
+
+# Markers that code generators put in the first lines of their output
+GENERATED_HEADER_RE = re.compile(
+    r"@generated|do not edit|code generated by|auto-?generated|generated by the protocol buffer compiler",
+    re.IGNORECASE,
+)
+GENERATED_HEADER_LINES = 10
+
+
+def glob_to_regex(pattern: str) -> Pattern:
+    """
+    Compile a gitignore-style glob. `**` matches across directories, `*` and `?`
+    stay within one path segment, and patterns without a slash match the basename
+    at any depth.
+    """
+    anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.lstrip("/")
+    if pattern.endswith("/"):
+        pattern += "**"
+
+    i, out = 0, []
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            out.append("[^/]*")
+        elif char == "?":
+            out.append("[^/]")
+        else:
+            out.append(re.escape(char))
+        i += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    return re.compile(f"^{prefix}{''.join(out)}$")
+
+
+@lru_cache(maxsize=256)
+def parse_gitattributes(text: str) -> Tuple[Tuple[Pattern, str, bool], ...]:
+    """
+    Extract `linguist-generated` / `linguist-vendored` rules from a .gitattributes file.
+    Returns (pattern, attribute, excluded) triples in file order; like git, the last
+    match wins, separately for each attribute.
+    """
+    rules = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+        pattern, *attributes = line.split()
+        for attribute in attributes:
+            name, _, value = attribute.partition("=")
+            unset = name.startswith(("-", "!"))
+            name = name.lstrip("-!")
+            if name not in ("linguist-generated", "linguist-vendored"):
+                continue
+            excluded = not unset and value.lower() not in ("false", "0")
+            rules.append((glob_to_regex(pattern), name, excluded))
+    return tuple(rules)
+
+
+class ExclusionRules:
+    """
+    Decides which files in a diff are not worth sending to the LLM.
+    Patterns are compiled once on construction; use `default_exclusion_rules()`
+    to share the instance built from settings.
+    """
+
+    def __init__(
+        self,
+        globs: List[str],
+        regexes: List[str],
+        max_changed_lines: int,
+        max_line_length: int,
+        detect_generated: bool = True,
+    ):
+        self.globs = [(glob, glob_to_regex(glob)) for glob in globs]
+        self.regexes = [(regex, re.compile(regex)) for regex in regexes]
+        self.max_changed_lines = max_changed_lines
+        self.max_line_length = max_line_length
+        self.detect_generated = detect_generated
+
+    def reason_for(self, patched_file: PatchedFile, gitattributes: Optional[str] = None) -> Optional[str]:
+        """Return why a file should be skipped, or None if it should be reviewed"""
+        path = file_path_of(patched_file)
+
+        if patched_file.is_binary_file:
+            return "binary file"
+
+        if gitattributes:
+            states: Dict[str, bool] = {}
+            for pattern, attribute, is_excluded in parse_gitattributes(gitattributes):
+                if pattern.match(path):
+                    states[attribute] = is_excluded
+            marked = [attribute for attribute, is_excluded in states.items() if is_excluded]
+            if marked:
+                return f"marked {' and '.join(sorted(marked))} in .gitattributes"
+
+        for glob, pattern in self.globs:
+            if pattern.match(path):
+                return f"matches exclusion glob `{glob}`"
+        for regex, pattern in self.regexes:
+            if pattern.search(path):
+                return f"matches exclusion regex `{regex}`"
+
+        changed_lines = patched_file.added + patched_file.removed
+        if self.max_changed_lines and changed_lines > self.max_changed_lines:
+            return f"{changed_lines} changed lines exceeds limit of {self.max_changed_lines}"
+
+        added = [line.value for hunk in patched_file for line in hunk if line.is_added]
+        if self.max_line_length and any(len(value) > self.max_line_length for value in added):
+            return f"contains lines longer than {self.max_line_length} characters (minified?)"
+
+        if self.detect_generated and self._has_generated_header(patched_file):
+            return "generated file header"
+
+        return None
+
+    def _has_generated_header(self, patched_file: PatchedFile) -> bool:
+        if not len(patched_file) or patched_file[0].target_start > GENERATED_HEADER_LINES:
+            return False
+        head = [line.value for line in patched_file[0] if not line.is_removed][:GENERATED_HEADER_LINES]
+        return any(GENERATED_HEADER_RE.search(value) for value in head)
+
+    def apply(self, prepared: PreparedDiff, gitattributes: Optional[str] = None) -> None:
+        """Remove excluded files from the prepared diff and record them as skipped"""
+        for patched_file in list(prepared.patch):
+            reason = self.reason_for(patched_file, gitattributes)
+            if reason is None:
+                continue
+            prepared.patch.remove(patched_file)
+            prepared.skipped.append(SkippedFile(path=file_path_of(patched_file), reason=reason))
+        logger.debug(f"🚫 Excluded {len(prepared.skipped)} file(s) before review")
+
+
+@lru_cache(maxsize=1)
+def default_exclusion_rules() -> ExclusionRules:
+    return ExclusionRules(
+        globs=settings.REVIEW_EXCLUDE_GLOBS,
+        regexes=settings.REVIEW_EXCLUDE_REGEXES,
+        max_changed_lines=settings.REVIEW_MAX_FILE_CHANGED_LINES,
+        max_line_length=settings.REVIEW_MAX_LINE_LENGTH,
+    )
@@ -0,0 +1,272 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Protocol, Set, Tuple
+from pydantic import BaseModel
+from unidiff.patch import PatchedFile
+from src.config.env import settings
+from src.github.types import DiffIssue
+from src.github.utils import file_path_of
+from src.llm.languages import language_of
+from src.review.types import PreparedDiff
+
+logger = logging.getLogger(__name__)
+
+# flake8's "serious" selection (syntax errors, undefined names, invalid comparisons);
+# every other rule is reported as a style suggestion
+_RUFF_WARNING_PREFIXES = ("E9", "F63", "F7", "F82")
+
+
+class LintFinding(BaseModel):
+    """One finding of a local linter, at a NEW file line"""
+
+    line: int
+    code: str
+    message: str
+    type: str
+    severity: int
+
+
+class Linter(Protocol):
+    """A local compiler or linter that checks one file's content"""
+
+    name: str
+    languages: Tuple[str, ...]
+    # Whether it checks style rules as well as syntax
+    style: bool
+
+    def available(self) -> bool: ...
+
+    def lint(self, path: str, source: str) -> List[LintFinding]: ...
+
+
+class PythonCompileLinter:
+    """Syntax check with the built-in compiler; never needs an external tool"""
+
+    name = "python-compile"
+    languages = ("python",)
+    style = False
+
+    def available(self) -> bool:
+        return True
+
+    def lint(self, path: str, source: str) -> List[LintFinding]:
+        try:
+            compile(source, path, "exec", dont_inherit=True)
+        except SyntaxError as e:
+            return [LintFinding(line=e.lineno or 1, code=type(e).__name__, message=e.msg, type="error", severity=9)]
+        except ValueError as e:
+            # e.g. null bytes in the source
+            return [LintFinding(line=1, code="ValueError", message=str(e), type="error", severity=9)]
+        return []
+
+
+class CommandLinter(ABC):
+    """
+    Linter run as a subprocess that reads the file from stdin. The executable is
+    resolved once, so instances held by the pool stay warm across reviews; pointing
+    the command at a daemon client (such as eslint_d) also keeps the tool itself warm.
+    """
+
+    name = "command"
+    languages: Tuple[str, ...] = ()
+    style = True
+
+    def __init__(self, command: str, timeout_seconds: Optional[float] = None):
+        self.command = command
+        self.timeout_seconds = timeout_seconds if timeout_seconds is not None else settings.REVIEW_LINT_TIMEOUT_SECONDS
+        self._executable = shutil.which(command)
+        if self._executable is None:
+            logger.debug(f"🧹 {self.name} not found as '{command}', skipping it")
+
+    def available(self) -> bool:
+        return self._executable is not None
+
+    @abstractmethod
+    def arguments(self, path: str) -> List[str]:
+        """Command-line arguments to lint `path`, read from stdin"""
+
+    @abstractmethod
+    def parse(self, output: str) -> List[LintFinding]:
+        """Findings in the tool's report"""
+
+    def lint(self, path: str, source: str) -> List[LintFinding]:
+        result = subprocess.run(
+            [self._executable, *self.arguments(path)],
+            input=source,
+            capture_output=True,
+            text=True,
+            timeout=self.timeout_seconds,
+        )
+        # Linters exit non-zero when they have findings; only a missing report is a failure
+        if not result.stdout.strip():
+            raise RuntimeError(f"{self.name} exited with {result.returncode}: {result.stderr.strip()[:200]}")
+        return self.parse(result.stdout)
+
+
+class RuffLinter(CommandLinter):
+    name = "ruff"
+    languages = ("python",)
+
+    def __init__(self, command: Optional[str] = None, timeout_seconds: Optional[float] = None):
+        super().__init__(command or settings.REVIEW_LINT_RUFF_COMMAND, timeout_seconds)
+
+    def arguments(self, path: str) -> List[str]:
+        return ["check", "--output-format", "json", "--no-cache", "--stdin-filename", path, "-"]
+
+    def parse(self, output: str) -> List[LintFinding]:
+        findings = []
+        for item in json.loads(output):
+            code = item.get("code")
+            if not code:
+                # Syntax errors are left to PythonCompileLinter
+                continue
+            serious = code.startswith(_RUFF_WARNING_PREFIXES)
+            findings.append(
+                LintFinding(
+                    line=item["location"]["row"],
+                    code=code,
+                    message=item["message"],
+                    type="warning" if serious else "suggestion",
+                    severity=6 if serious else 2,
+                )
+            )
+        return findings
+
+
+class EslintLinter(CommandLinter):
+    name = "eslint"
+    languages = ("javascript",)
+
+    def __init__(self, command: Optional[str] = None, timeout_seconds: Optional[float] = None):
+        super().__init__(command or settings.REVIEW_LINT_ESLINT_COMMAND, timeout_seconds)
+
+    def arguments(self, path: str) -> List[str]:
+        return ["--format", "json", "--stdin", "--stdin-filename", path]
+
+    def parse(self, output: str) -> List[LintFinding]:
+        findings = []
+        for result in json.loads(output):
+            for message in result.get("messages", []):
+                if message.get("fatal"):
+                    finding_type, severity = "error", 8
+                elif message.get("severity") == 2:
+                    finding_type, severity = "warning", 4
+                else:
+                    finding_type, severity = "suggestion", 2
+                findings.append(
+                    LintFinding(
+                        line=message.get("line") or 1,
+                        code=message.get("ruleId") or "parse-error",
+                        message=message["message"],
+                        type=finding_type,
+                        severity=severity,
+                    )
+                )
+        return findings
+
+
+LINTERS: Dict[str, Callable[[], Linter]] = {
+    PythonCompileLinter.name: PythonCompileLinter,
+    RuffLinter.name: RuffLinter,
+    EslintLinter.name: EslintLinter,
+}
+
+
+def changed_lines(patched_file: PatchedFile) -> Set[int]:
+    """NEW file line numbers of the lines the diff adds"""
+    return {line.target_line_no for hunk in patched_file for line in hunk if line.is_added}
+
+
+class LintPool:
+    """
+    Configured linters plus the worker threads that run them, created once per
+    process. Files are fetched and linted concurrently; findings are only kept
+    for lines the diff changes.
+    """
+
+    def __init__(self, linters: Optional[List[Linter]] = None, workers: Optional[int] = None):
+        if linters is None:
+            linters = [LINTERS[name]() for name in settings.REVIEW_LINTERS if name in LINTERS]
+        self.linters = [linter for linter in linters if linter.available()]
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers if workers is not None else settings.REVIEW_LINT_WORKERS, thread_name_prefix="lint"
+        )
+
+    def linters_for(self, path: str) -> List[Linter]:
+        language = language_of(path)
+        return [linter for linter in self.linters if language and language in linter.languages]
+
+    def _lint_file(
+        self, patched_file: PatchedFile, fetch: Callable[[str], Optional[str]]
+    ) -> Optional[List[DiffIssue]]:
+        """Issues on the file's changed lines, or None if it could not be fully linted"""
+        path = file_path_of(patched_file)
+        try:
+            source = fetch(path)
+            if source is None:
+                return None
+            lines = changed_lines(patched_file)
+            issues = []
+            for linter in self.linters_for(path):
+                for finding in linter.lint(path, source):
+                    if finding.line in lines:
+                        issues.append(
+                            DiffIssue(
+                                type=finding.type,
+                                line=str(finding.line),
+                                message=f"{finding.message} ({linter.name} {finding.code})",
+                                severity=finding.severity,
+                                file=path,
+                            )
+                        )
+            return issues
+        except Exception as e:
+            logger.warning(f"Local lint of {path} failed, leaving it to the LLM: {e}")
+            return None
+
+    def run(self, prepared: PreparedDiff, fetch: Callable[[str], Optional[str]]) -> List[DiffIssue]:
+        """
+        Lint the changed files of `prepared` at the head revision (`fetch` returns a
+        file's content, or None). Records the findings and the languages whose every
+        file was linted on `prepared`, so the LLM prompt can leave those checks out.
+        """
+        files = [f for f in prepared.patch if not f.is_removed_file and self.linters_for(file_path_of(f))]
+        results = list(self._executor.map(lambda f: self._lint_file(f, fetch), files))
+
+        linted, failed = set(), set()
+        for patched_file, issues in zip(files, results):
+            path = file_path_of(patched_file)
+            language = language_of(path)
+            if issues is None or not any(linter.style for linter in self.linters_for(path)):
+                failed.add(language)
+                continue
+            linted.add(language)
+        for issues in results:
+            prepared.lint_issues.extend(issues or [])
+        # Only languages whose every file went through a style linter lose the prompt's syntax/style checks
+        prepared.linted_languages = sorted(linted - failed)
+        if files:
+            prepared.notes.append(
+                f"Local checks ({', '.join(linter.name for linter in self.linters)}) ran on {len(files)} file(s) "
+                f"and reported {len(prepared.lint_issues)} finding(s) on changed lines"
+            )
+        logger.debug(f"🧹 Lint pre-pass: {len(prepared.lint_issues)} finding(s) in {len(files)} file(s)")
+        return prepared.lint_issues
+
+
+_default_lint_pool: Optional[LintPool] = None
+_default_lint_pool_lock = threading.Lock()
+
+
+def default_lint_pool() -> LintPool:
+    """Process-wide lint pool, so linters and workers are set up once and stay warm"""
+    global _default_lint_pool
+    with _default_lint_pool_lock:
+        if _default_lint_pool is None:
+            _default_lint_pool = LintPool()
+        return _default_lint_pool
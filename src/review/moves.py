@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from unidiff.constants import LINE_TYPE_CONTEXT
+from unidiff.patch import Hunk, Line
+from src.config.env import settings
+from src.github.mirror import RenamedFile
+from src.github.types import GitHubCommitFile
+from src.github.utils import file_path_of
+from src.review.types import PreparedDiff, SkippedFile
+
+logger = logging.getLogger(__name__)
+
+# Lines without at least this much code (blank lines, lone braces, `end`) match anywhere,
+# so they never anchor a moved block; they only join one around them
+_SIGNIFICANT_RE = re.compile(r"\w.*\w|\w{2,}")
+
+
+def _normalise(line: Line) -> str:
+    # Moved code is often re-indented (a function moved into a class), so indentation is ignored
+    return " ".join(line.value.split())
+
+
+def _significant(line: Line) -> bool:
+    return bool(_SIGNIFICANT_RE.search(line.value))
+
+
+def _runs(hunk: Hunk, removed: bool) -> List[List[Line]]:
+    """Maximal runs of consecutive removed (or added) lines of a hunk"""
+    runs, current = [], []
+    for line in hunk:
+        if (line.is_removed if removed else line.is_added):
+            current.append(line)
+        elif current and not (line.is_added if removed else line.is_removed):
+            runs.append(current)
+            current = []
+    if current:
+        runs.append(current)
+    return runs
+
+
+def _window_key(lines: List[Line]) -> str:
+    return hashlib.sha1("\n".join(_normalise(line) for line in lines).encode()).hexdigest()
+
+
+def _windows(run: List[Line], size: int) -> Iterable[Tuple[str, List[Line]]]:
+    significant = [line for line in run if _significant(line)]
+    for start in range(len(significant) - size + 1):
+        window = significant[start:start + size]
+        yield _window_key(window), window
+
+
+def _close_gaps(run: List[Line], moved: Set[int]) -> None:
+    """Mark the insignificant lines of a run as moved when the significant lines around them are"""
+    before: List[Optional[bool]] = []
+    last = None
+    for line in run:
+        if _significant(line):
+            last = id(line) in moved
+        before.append(last)
+    after = None
+    for i in range(len(run) - 1, -1, -1):
+        line = run[i]
+        if _significant(line):
+            after = id(line) in moved
+            continue
+        neighbours = [flag for flag in (before[i], after) if flag is not None]
+        if neighbours and all(neighbours):
+            moved.add(id(line))
+
+
+def find_moved_lines(prepared: PreparedDiff, min_lines: int) -> Tuple[Set[int], Set[int]]:
+    """
+    Ids of the added and removed lines that belong to blocks moved within or across
+    files: runs of at least `min_lines` significant lines whose hashed, whitespace-
+    normalised content is both removed somewhere in the diff and added somewhere else.
+    """
+    removed_windows: Dict[str, List[List[Line]]] = {}
+    added_runs, removed_runs = [], []
+    for patched_file in prepared.patch:
+        for hunk in patched_file:
+            removed_runs.extend(_runs(hunk, removed=True))
+            added_runs.extend(_runs(hunk, removed=False))
+    for run in removed_runs:
+        for key, window in _windows(run, min_lines):
+            removed_windows.setdefault(key, []).append(window)
+
+    moved_added: Set[int] = set()
+    moved_removed: Set[int] = set()
+    for run in added_runs:
+        for key, window in _windows(run, min_lines):
+            for source in removed_windows.get(key, []):
+                moved_added.update(id(line) for line in window)
+                moved_removed.update(id(line) for line in source)
+    for run in added_runs:
+        _close_gaps(run, moved_added)
+    for run in removed_runs:
+        _close_gaps(run, moved_removed)
+    return moved_added, moved_removed
+
+
+def _strip_moved(hunk: Hunk, moved_added: Set[int], moved_removed: Set[int]) -> int:
+    """
+    Turn the moved added lines of a hunk into context and take out its moved removed
+    lines, so only the edits around and inside moved code stay changes. Added lines keep
+    their new line numbers, which is what prompts and comments refer to.
+    """
+    stripped = 0
+    kept = []
+    for line in hunk:
+        if id(line) in moved_removed:
+            stripped += 1
+            continue
+        if id(line) in moved_added:
+            line.line_type = LINE_TYPE_CONTEXT
+            stripped += 1
+        kept.append(line)
+    hunk[:] = kept
+    hunk.source_length = sum(1 for line in hunk if not line.is_added)
+    return stripped
+
+
+def pure_renames(files: Iterable[GitHubCommitFile]) -> Dict[str, str]:
+    """New path -> old path of the files the GitHub file listing reports as renamed without edits"""
+    return {
+        commit_file.filename: commit_file.previous_filename
+        for commit_file in files
+        if commit_file.status == "renamed" and commit_file.changes == 0 and commit_file.previous_filename
+    }
+
+
+def pure_git_renames(renames: Iterable[RenamedFile]) -> Dict[str, str]:
+    """New path -> old path of the files git's rename detection finds renamed without edits"""
+    return {renamed.new_path: renamed.old_path for renamed in renames if renamed.similarity == 100}
+
+
+def drop_moved_code(
+    prepared: PreparedDiff,
+    min_lines: Optional[int] = None,
+    commit_files: Optional[List[GitHubCommitFile]] = None,
+    renames: Optional[List[RenamedFile]] = None,
+) -> int:
+    """
+    Skip renamed files without edits and code moved within or across files unchanged,
+    keeping genuine edits inside moved code. `commit_files` (the REST file listing) or
+    `renames` (from the git mirror), when given, identify pure renames in diffs rendered
+    without rename detection (as a delete plus an add).
+    Returns how many moved lines were taken out of review.
+    """
+    min_lines = min_lines if min_lines is not None else settings.REVIEW_MOVED_MIN_LINES
+    renamed = {**pure_renames(commit_files or []), **pure_git_renames(renames or [])}
+    for patched_file in list(prepared.patch):
+        path = file_path_of(patched_file)
+        if (patched_file.is_rename and not len(patched_file)) or path in renamed or path in renamed.values():
+            prepared.patch.remove(patched_file)
+            if path not in renamed.values():
+                old_path = renamed.get(path) or patched_file.source_file[2:]
+                prepared.skipped.append(SkippedFile(path=path, reason=f"renamed from {old_path} without changes"))
+
+    moved_added, moved_removed = find_moved_lines(prepared, min_lines)
+    stripped, files = 0, set()
+    for patched_file in prepared.patch:
+        for hunk in list(patched_file):
+            if not any(id(line) in moved_added or id(line) in moved_removed for line in hunk):
+                continue
+            stripped += _strip_moved(hunk, moved_added, moved_removed)
+            files.add(file_path_of(patched_file))
+            if not any(line.is_added or line.is_removed for line in hunk):
+                patched_file.remove(hunk)
+    prepared.drop_empty_files()
+
+    if stripped:
+        prepared.notes.append(f"Skipped {stripped} line(s) of code moved without changes in {len(files)} file(s).")
+        logger.debug(f"🚚 Took {stripped} moved lines in {len(files)} files out of review")
+    return stripped
@@ -0,0 +1,66 @@
+from typing import List, Optional
+from unidiff import PatchSet
+from unidiff.patch import Hunk, PatchedFile
+from src.github.utils import file_path_of
+
+GAP_MARKER = "..."
+
+
+def _file_header(patched_file: PatchedFile) -> str:
+    path = file_path_of(patched_file)
+    if patched_file.is_added_file:
+        return f"FILE {path} (new)"
+    if patched_file.is_removed_file:
+        return f"FILE {path} (deleted)"
+    if patched_file.is_rename:
+        return f"FILE {path} (renamed from {patched_file.source_file[2:]})"
+    return f"FILE {path}"
+
+
+def _render_hunk(hunk: Hunk, context_lines: Optional[int], include_removed: bool) -> List[str]:
+    lines = list(hunk)
+    changed = [i for i, line in enumerate(lines) if line.is_added or (include_removed and line.is_removed)]
+    if context_lines is None:
+        context_lines = len(lines)
+    keep = set()
+    for i in changed:
+        keep.update(range(max(0, i - context_lines), min(len(lines), i + context_lines + 1)))
+
+    out, previous = [], None
+    for i in sorted(keep):
+        line = lines[i]
+        if line.is_removed and not include_removed:
+            continue
+        if previous is not None and i != previous + 1:
+            out.append(GAP_MARKER)
+        previous = i
+
+        value = line.value.rstrip("\n")
+        if line.is_added:
+            out.append(f"+{line.target_line_no}|{value}")
+        elif line.is_removed:
+            out.append(f"-{value}")
+        else:
+            out.append(f" {value}")
+    return out
+
+
+def render_compact(patch: PatchSet, context_lines: Optional[int] = 1, include_removed: bool = True) -> str:
+    """
+    Render a patch in the compact prompt format: one `FILE` header per file and
+    no git/hunk headers. Added lines carry their new-file line number as
+    `+<n>|code`; context lines (` code`) and removed lines (`-code`) are left
+    unnumbered since issues are only reported on added lines. `...` marks
+    skipped lines and context is trimmed to `context_lines` around each change
+    (None keeps all of it).
+    """
+    out = []
+    for patched_file in patch:
+        out.append(_file_header(patched_file))
+        if patched_file.is_removed_file:
+            continue
+        for index, hunk in enumerate(patched_file):
+            if index:
+                out.append(GAP_MARKER)
+            out.extend(_render_hunk(hunk, context_lines, include_removed))
+    return "\n".join(out) + "\n"
@@ -0,0 +1,181 @@
+import logging
+import math
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+from pydantic import BaseModel, Field
+from src.config.env import settings
+from src.database import get_connection
+from src.exceptions import DatabaseError
+from src.github.types import DiffIssue
+from src.github.utils import file_path_of
+from src.llm.languages import language_of
+from src.llm.routing import path_words, risky_path_re
+from src.llm.tokens import estimate_tokens
+from src.review.types import PreparedDiff, SkippedFile
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS path_review_history (
+    repository TEXT NOT NULL,
+    path TEXT NOT NULL,
+    reviews INTEGER NOT NULL,
+    issues INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (repository, path)
+);
+"""
+
+_TEST_PATH_RE = re.compile(r"(^|/)(tests?|__tests__|spec)/|(_test|\.test|\.spec|_spec)\.\w+$|(^|/)test_[^/]+$")
+
+
+class PathHistory(BaseModel):
+    """How often a path was reviewed and how many issues those reviews found in it"""
+
+    reviews: int = 0
+    issues: int = 0
+
+    @property
+    def issue_density(self) -> float:
+        # One imaginary clean review keeps a single noisy review from dominating
+        return self.issues / (self.reviews + 1)
+
+
+class ReviewHistory:
+    """Per-path review and issue counts of a repository, kept in SQLite"""
+
+    def __init__(self, repository: str, db_path: Optional[str] = None):
+        self.repository = repository
+        try:
+            self.conn = get_connection(db_path)
+            self.conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to initialise review history: {e}") from e
+
+    def lookup(self, paths: Iterable[str]) -> Dict[str, PathHistory]:
+        paths = list(dict.fromkeys(paths))
+        found = {}
+        for start in range(0, len(paths), 500):
+            batch = paths[start:start + 500]
+            rows = self.conn.execute(
+                f"""
+                SELECT path, reviews, issues FROM path_review_history
+                WHERE repository = ? AND path IN ({",".join("?" * len(batch))})
+                """,
+                (self.repository, *batch),
+            ).fetchall()
+            found.update({path: PathHistory(reviews=reviews, issues=issues) for path, reviews, issues in rows})
+        return found
+
+    def record(self, paths: Iterable[str], issues: List[DiffIssue]) -> None:
+        """Count one more review of each path, with the issues it produced there"""
+        counts: Dict[str, int] = {path: 0 for path in paths}
+        for issue in issues:
+            path = issue.file.removeprefix("b/").removeprefix("a/")
+            if path in counts:
+                counts[path] += 1
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    """
+                    INSERT INTO path_review_history (repository, path, reviews, issues, updated_at)
+                    VALUES (?, ?, 1, ?, ?)
+                    ON CONFLICT (repository, path) DO UPDATE SET
+                        reviews = reviews + 1, issues = issues + excluded.issues, updated_at = excluded.updated_at
+                    """,
+                    [(self.repository, path, count, time.time()) for path, count in counts.items()],
+                )
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to record review history: {e}") from e
+
+
+class FileRisk(BaseModel):
+    """Review priority of one changed file and what drove it"""
+
+    path: str
+    score: float
+    tokens: int
+    reasons: List[str] = Field(default_factory=list)
+
+
+class RiskScorer:
+    """
+    Ranks changed files by cheap signals: change size, file type, risky path patterns,
+    how often the path changes (churn) and how many issues earlier reviews found there.
+    The factors multiply, so a large change to a docs file still ranks below a small
+    change to an authentication module with a history of findings.
+    """
+
+    def __init__(
+        self,
+        history: Optional[ReviewHistory] = None,
+        risky_path_patterns: Optional[List[str]] = None,
+        low_risk_extensions: Optional[List[str]] = None,
+    ):
+        self.history = history
+        patterns = risky_path_patterns if risky_path_patterns is not None else settings.LLM_RISKY_PATH_PATTERNS
+        self.risky_path_re = risky_path_re(patterns)
+        self.low_risk_extensions = tuple(
+            low_risk_extensions if low_risk_extensions is not None else settings.LLM_LOW_RISK_EXTENSIONS
+        )
+
+    def _type_weight(self, path: str) -> float:
+        if path.endswith(self.low_risk_extensions):
+            return 0.2
+        if _TEST_PATH_RE.search(path):
+            return 0.5
+        return 1.0 if language_of(path) else 0.6
+
+    def rank(self, prepared: PreparedDiff) -> List[FileRisk]:
+        """Changed files of `prepared`, highest review priority first"""
+        paths = [file_path_of(patched_file) for patched_file in prepared.patch]
+        history = self.history.lookup(paths) if self.history is not None else {}
+        ranked = []
+        for patched_file, path in zip(prepared.patch, paths):
+            changed = patched_file.added + patched_file.removed
+            past = history.get(path, PathHistory())
+            score = self._type_weight(path) * (1 + math.log1p(changed))
+            reasons = [f"{changed} changed lines"]
+            if self.risky_path_re and self.risky_path_re.search(path_words(path)):
+                score *= 3
+                reasons.append("risky path")
+            if past.reviews:
+                score *= 1 + 0.25 * math.log1p(past.reviews)
+                score *= 1 + 2 * past.issue_density
+                reasons.append(f"{past.issues} past issue(s) in {past.reviews} review(s)")
+            ranked.append(
+                FileRisk(path=path, score=round(score, 2), tokens=estimate_tokens(str(patched_file)), reasons=reasons)
+            )
+        return sorted(ranked, key=lambda risk: -risk.score)
+
+
+def sample_by_risk(prepared: PreparedDiff, scorer: RiskScorer, max_tokens: Optional[int] = None) -> List[FileRisk]:
+    """
+    Keep the highest-risk files of `prepared` that fit in `max_tokens` of diff and move
+    the rest to `skipped`. Every file's score is kept in `prepared.priorities`, so later
+    stages can schedule work in the same order. Returns the files left out.
+    """
+    max_tokens = max_tokens if max_tokens is not None else settings.REVIEW_SAMPLE_MAX_TOKENS
+    ranked = scorer.rank(prepared)
+    prepared.priorities = {risk.path: risk.score for risk in ranked}
+    if sum(risk.tokens for risk in ranked) <= max_tokens:
+        return []
+
+    used, left_out = 0, []
+    for risk in ranked:
+        # Lower-ranked files that still fit are taken, so the budget is not wasted on one large file
+        if used + risk.tokens <= max_tokens:
+            used += risk.tokens
+        else:
+            left_out.append(risk)
+    dropped = {risk.path for risk in left_out}
+    for patched_file in [f for f in prepared.patch if file_path_of(f) in dropped]:
+        prepared.patch.remove(patched_file)
+    prepared.skipped.extend(
+        SkippedFile(path=risk.path, reason=f"over the review budget (risk {risk.score}: {', '.join(risk.reasons)})")
+        for risk in left_out
+    )
+    logger.debug(f"🎯 Review budget of {max_tokens} tokens: kept {len(ranked) - len(left_out)} of {len(ranked)} file(s)")
+    return left_out
@@ -0,0 +1,228 @@
+import ast
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+from unidiff.patch import Hunk, PatchedFile
+from src.config.env import settings
+from src.github.utils import file_path_of, parse_diff
+from src.llm.languages import language_of
+from src.llm.tokens import estimate_tokens
+from src.review.chunking import diff_file_header
+from src.review.types import PreparedDiff
+
+logger = logging.getLogger(__name__)
+
+Scope = Tuple[int, int]
+
+BRACE_LANGUAGES = {"javascript", "go", "java", "rust", "c"}
+# Blocks opened by these are statements inside a scope, not scopes of their own
+_CONTROL_RE = re.compile(r"^\s*(?:}\s*)?(?:if|else|for|while|do|switch|try|catch|finally|case|default|select|loop|match)\b")
+_RUBY_OPEN_RE = re.compile(r"^(\s*)(?:def|class|module)\b")
+
+
+def _python_scopes(source: str) -> List[Scope]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    return [
+        (min([node.lineno] + [decorator.lineno for decorator in node.decorator_list]), node.end_lineno)
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    ]
+
+
+def _strip_literals(line: str, in_comment: bool) -> Tuple[str, bool]:
+    """The line's code with strings and comments removed, and whether a /* comment is still open"""
+    out, i, quote = [], 0, None
+    while i < len(line):
+        char, pair = line[i], line[i:i + 2]
+        if in_comment:
+            if pair == "*/":
+                in_comment, i = False, i + 2
+                continue
+        elif quote:
+            if char == "\\":
+                i += 1
+            elif char == quote:
+                quote = None
+        elif pair == "//":
+            break
+        elif pair == "/*":
+            in_comment, i = True, i + 2
+            continue
+        elif char in "\"'`":
+            quote = char
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out), in_comment
+
+
+def _brace_scopes(source: str) -> List[Scope]:
+    """Blocks opened at the end of a declaration line (functions, methods, classes, structs), closed by brace matching"""
+    scopes, stack, in_comment = [], [], False
+    lines = source.splitlines()
+    for number, line in enumerate(lines, 1):
+        code, in_comment = _strip_literals(line, in_comment)
+        for char in code:
+            if char == "{":
+                stack.append(number)
+            elif char == "}" and stack:
+                start = stack.pop()
+                if start != number and not _CONTROL_RE.match(lines[start - 1]):
+                    scopes.append((start, number))
+    return scopes
+
+
+def _ruby_scopes(source: str) -> List[Scope]:
+    scopes, lines = [], source.splitlines()
+    for number, line in enumerate(lines, 1):
+        match = _RUBY_OPEN_RE.match(line)
+        if not match:
+            continue
+        indent = match.group(1)
+        for end in range(number + 1, len(lines) + 1):
+            if lines[end - 1].rstrip() == f"{indent}end":
+                scopes.append((number, end))
+                break
+    return scopes
+
+
+def enclosing_scopes(path: str, source: str) -> List[Scope]:
+    """Line ranges of the functions, methods and classes in a file, from a lightweight per-language parse"""
+    language = language_of(path)
+    if language == "python":
+        return _python_scopes(source)
+    if language in BRACE_LANGUAGES:
+        return _brace_scopes(source)
+    if language == "ruby":
+        return _ruby_scopes(source)
+    return []
+
+
+def _innermost(scopes: List[Scope], line: int) -> Optional[Scope]:
+    containing = [scope for scope in scopes if scope[0] <= line <= scope[1]]
+    return min(containing, key=lambda scope: scope[1] - scope[0]) if containing else None
+
+
+def _target_range(hunk: Hunk) -> Scope:
+    return hunk.target_start, hunk.target_start + max(hunk.target_length, 1) - 1
+
+
+def _first_lines(hunk: Hunk) -> Tuple[int, int]:
+    """Old and new line number at which the hunk starts (an empty side starts after its `start`)"""
+    return (
+        hunk.source_start + (hunk.source_length == 0),
+        hunk.target_start + (hunk.target_length == 0),
+    )
+
+
+def _matches_source(patched_file: PatchedFile, lines: List[str]) -> bool:
+    """Whether the head content is the one the diff was made against"""
+    for hunk in patched_file:
+        for line in hunk:
+            if line.is_removed or line.target_line_no is None or line.value.startswith("\\"):
+                continue
+            if line.target_line_no > len(lines) or lines[line.target_line_no - 1].rstrip("\r\n") != line.value.rstrip("\r\n"):
+                return False
+    return True
+
+
+def expanded_regions(patched_file: PatchedFile, lines: List[str], scopes: List[Scope], max_tokens: int) -> List[Scope]:
+    """
+    NEW file line range to show for each hunk: the hunk grown to the innermost scopes
+    around its first and last changed lines. Expansions are taken cheapest first while
+    the extra lines fit in `max_tokens`; the others keep the hunk's own range.
+    """
+    regions, costs = [], []
+    for hunk in patched_file:
+        start, end = _target_range(hunk)
+        changed = [line.target_line_no for line in hunk if line.is_added] or [start]
+        first, last = _innermost(scopes, min(changed)), _innermost(scopes, max(changed))
+        grown = (min(start, first[0]) if first else start, max(end, last[1]) if last else end)
+        extra = lines[grown[0] - 1:start - 1] + lines[end:grown[1]]
+        regions.append([(start, end), grown])
+        costs.append(estimate_tokens("".join(extra)))
+
+    used = 0
+    chosen = [region[0] for region in regions]
+    for index in sorted(range(len(regions)), key=lambda i: costs[i]):
+        if regions[index][1] != regions[index][0] and used + costs[index] <= max_tokens:
+            chosen[index] = regions[index][1]
+            used += costs[index]
+    return chosen
+
+
+def _render_file(patched_file: PatchedFile, lines: List[str], regions: List[Scope]) -> str:
+    """The file's diff with each hunk padded to its region, merging hunks whose regions meet"""
+    hunks = list(patched_file)
+    groups: List[List[int]] = []
+    for index in range(len(hunks)):
+        if groups and regions[index][0] <= max(regions[i][1] for i in groups[-1]) + 1:
+            groups[-1].append(index)
+        else:
+            groups.append([index])
+
+    out = [diff_file_header(patched_file)]
+    for group in groups:
+        start = min(regions[index][0] for index in group)
+        end = max(regions[index][1] for index in group)
+        first = hunks[group[0]]
+        source_first, target_first = _first_lines(first)
+        offset = source_first - target_first
+        body, source_length, target_length, position = [], 0, 0, start
+
+        def pad(upto: int) -> None:
+            nonlocal position, source_length, target_length
+            for number in range(position, upto):
+                body.append(" " + lines[number - 1].rstrip("\r\n") + "\n")
+                source_length += 1
+                target_length += 1
+            position = max(position, upto)
+
+        for index in group:
+            hunk = hunks[index]
+            target_first = _first_lines(hunk)[1]
+            pad(target_first)
+            body.extend(str(line) for line in hunk)
+            source_length += hunk.source_length
+            target_length += hunk.target_length
+            position = max(position, target_first + hunk.target_length)
+        pad(end + 1)
+        section = f" {first.section_header}" if first.section_header else ""
+        out.append(f"@@ -{start + offset},{source_length} +{start},{target_length} @@{section}\n")
+        out.extend(body)
+    return "".join(out)
+
+
+def expand_to_scopes(prepared: PreparedDiff, contents: Dict[str, Optional[str]], max_tokens: Optional[int] = None) -> int:
+    """
+    Grow each hunk of `prepared` to its enclosing function or class, using the head
+    `contents` of its file, within `max_tokens` of extra context per file. Returns
+    how many files were expanded.
+    """
+    max_tokens = max_tokens if max_tokens is not None else settings.REVIEW_SCOPE_MAX_FILE_TOKENS
+    expanded = 0
+    for index, patched_file in enumerate(prepared.patch):
+        path = file_path_of(patched_file)
+        source = contents.get(path)
+        if source is None or patched_file.is_added_file or patched_file.is_removed_file or not len(patched_file):
+            continue
+        lines = source.splitlines(keepends=True)
+        scopes = enclosing_scopes(path, source)
+        if not scopes:
+            continue
+        if not _matches_source(patched_file, lines):
+            logger.debug(f"Head content of {path} does not match the diff, not expanding it")
+            continue
+        regions = expanded_regions(patched_file, lines, scopes, max_tokens)
+        if regions == [_target_range(hunk) for hunk in patched_file]:
+            continue
+        prepared.unexpanded_files.setdefault(path, patched_file)
+        prepared.patch[index] = parse_diff(_render_file(patched_file, lines, regions))[0]
+        expanded += 1
+    if expanded:
+        prepared.expanded_to_scope = True
+        logger.debug(f"🔭 Expanded the hunks of {expanded} file(s) to their enclosing scopes")
+    return expanded
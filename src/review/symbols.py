@@ -0,0 +1,494 @@
+import ast
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from pydantic import BaseModel, Field
+from src.config.env import settings
+from src.database import get_connection
+from src.exceptions import DatabaseError
+from src.github.utils import file_path_of
+from src.llm.languages import language_of
+from src.llm.tokens import estimate_tokens
+from src.review.types import PreparedDiff
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbol_refs (
+    repository TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (repository, ref)
+);
+CREATE TABLE IF NOT EXISTS symbol_files (
+    repository TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    path TEXT NOT NULL,
+    blob_sha TEXT NOT NULL,
+    PRIMARY KEY (repository, ref, path)
+);
+CREATE TABLE IF NOT EXISTS symbol_definitions (
+    repository TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    signature TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_symbol_def_name ON symbol_definitions (repository, ref, name);
+CREATE INDEX IF NOT EXISTS idx_symbol_def_path ON symbol_definitions (repository, ref, path);
+CREATE TABLE IF NOT EXISTS symbol_imports (
+    repository TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    path TEXT NOT NULL,
+    module TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_symbol_imp_path ON symbol_imports (repository, ref, path);
+CREATE TABLE IF NOT EXISTS symbol_calls (
+    repository TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_symbol_call_name ON symbol_calls (repository, ref, name);
+CREATE INDEX IF NOT EXISTS idx_symbol_call_path ON symbol_calls (repository, ref, path);
+"""
+# Columns after (repository, ref) of each per-file table, for seeding one ref's index from another
+_FILE_TABLES = {
+    "symbol_files": "path, blob_sha",
+    "symbol_definitions": "path, name, kind, line, signature",
+    "symbol_imports": "path, module, name",
+    "symbol_calls": "path, name, line",
+}
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_$][\w$]*")
+_CALL_RE = re.compile(r"([A-Za-z_$][\w$]*)\s*\(")
+_NOT_CALLS = {
+    "if", "for", "while", "switch", "return", "catch", "function", "func", "fn", "def", "elif", "and", "or", "not",
+    "in", "sizeof", "typeof", "new", "await", "super", "print", "len", "str", "int",
+}
+MAX_SIGNATURE_CHARS = 200
+# A name defined in more places than this is too ambiguous to attach (get, run, init...)
+MAX_DEFINITIONS_PER_NAME = 3
+
+# (kind, pattern with the name in group 1) per language, for languages without an in-process parser
+_DEFINITION_PATTERNS: Dict[str, List[Tuple[str, re.Pattern]]] = {
+    "javascript": [
+        ("function", re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)\s*\(")),
+        ("function", re.compile(
+            r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s*)?(?:\([^)]*\)|[A-Za-z_$][\w$]*)\s*(?::[^=]+)?=>"
+        )),
+        ("class", re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)")),
+        ("type", re.compile(r"^\s*(?:export\s+)?(?:interface|type)\s+([A-Za-z_$][\w$]*)")),
+    ],
+    "go": [
+        ("function", re.compile(r"^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)\s*[\[(]")),
+        ("type", re.compile(r"^type\s+([A-Za-z_]\w*)\s")),
+    ],
+    "rust": [
+        ("function", re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:const\s+)?(?:async\s+)?(?:unsafe\s+)?fn\s+([A-Za-z_]\w*)")),
+        ("type", re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|type)\s+([A-Za-z_]\w*)")),
+    ],
+    "ruby": [
+        ("function", re.compile(r"^\s*def\s+(?:self\.)?([A-Za-z_]\w*[?!=]?)")),
+        ("class", re.compile(r"^\s*(?:class|module)\s+([A-Z]\w*)")),
+    ],
+}
+_IMPORT_PATTERNS: Dict[str, re.Pattern] = {
+    # import a, { b, c as d } from "module"
+    "javascript": re.compile(r"^\s*import\s+(?:type\s+)?(?:([\w$]+)\s*,?\s*)?(?:\{([^}]*)\})?[^'\"]*from\s*['\"]([^'\"]+)['\"]"),
+}
+
+
+class SymbolDefinition(BaseModel):
+    """A function, class or type defined in the repository"""
+
+    path: str
+    name: str
+    kind: str
+    line: int
+    signature: str
+
+
+class ImportRecord(BaseModel):
+    path: str
+    module: str
+    name: str
+
+
+class FileSymbols(BaseModel):
+    """What one file defines, imports and calls"""
+
+    definitions: List[SymbolDefinition] = Field(default_factory=list)
+    imports: List[ImportRecord] = Field(default_factory=list)
+    calls: List[Tuple[str, int]] = Field(default_factory=list)
+
+
+def _clip(signature: str) -> str:
+    signature = " ".join(signature.split()).rstrip("{:").strip()
+    return signature if len(signature) <= MAX_SIGNATURE_CHARS else signature[: MAX_SIGNATURE_CHARS - 3] + "..."
+
+
+def _python_symbols(path: str, source: str) -> Optional[FileSymbols]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    symbols = FileSymbols()
+
+    def define(node: ast.AST, owner: str) -> None:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+            signature = f"{prefix} {owner}{node.name}({ast.unparse(node.args)}){returns}"
+            symbols.definitions.append(
+                SymbolDefinition(path=path, name=node.name, kind="function", line=node.lineno, signature=_clip(signature))
+            )
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases + node.keywords)
+            signature = f"class {owner}{node.name}({bases})" if bases else f"class {owner}{node.name}"
+            symbols.definitions.append(
+                SymbolDefinition(path=path, name=node.name, kind="class", line=node.lineno, signature=_clip(signature))
+            )
+            for child in node.body:
+                define(child, f"{owner}{node.name}.")
+
+    for node in tree.body:
+        define(node, "")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                symbols.imports.append(ImportRecord(path=path, module=alias.name, name=alias.asname or alias.name))
+        elif isinstance(node, ast.ImportFrom):
+            module = "." * node.level + (node.module or "")
+            for alias in node.names:
+                symbols.imports.append(ImportRecord(path=path, module=module, name=alias.name))
+        elif isinstance(node, ast.Call):
+            func = node.func
+            name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+            if name:
+                symbols.calls.append((name, node.lineno))
+    return symbols
+
+
+def _pattern_symbols(path: str, source: str, language: str) -> FileSymbols:
+    symbols = FileSymbols()
+    import_pattern = _IMPORT_PATTERNS.get(language)
+    for number, line in enumerate(source.splitlines(), 1):
+        defined = None
+        for kind, pattern in _DEFINITION_PATTERNS[language]:
+            match = pattern.match(line)
+            if match:
+                defined = match.group(1)
+                symbols.definitions.append(
+                    SymbolDefinition(path=path, name=defined, kind=kind, line=number, signature=_clip(line))
+                )
+                break
+        if import_pattern is not None:
+            match = import_pattern.match(line)
+            if match:
+                default, named, module = match.groups()
+                names = [default] if default else []
+                names += [part.split(" as ")[0].strip() for part in (named or "").split(",") if part.strip()]
+                symbols.imports.extend(ImportRecord(path=path, module=module, name=name) for name in names)
+                continue
+        for call in _CALL_RE.findall(line):
+            if call != defined and call not in _NOT_CALLS:
+                symbols.calls.append((call, number))
+    return symbols
+
+
+def extract_symbols(path: str, source: str) -> Optional[FileSymbols]:
+    """Definitions, imports and call sites of a file, or None for unsupported or unparsable files"""
+    language = language_of(path)
+    if language == "python":
+        return _python_symbols(path, source)
+    if language in _DEFINITION_PATTERNS:
+        return _pattern_symbols(path, source, language)
+    return None
+
+
+def indexable(path: str) -> bool:
+    language = language_of(path)
+    return language == "python" or language in _DEFINITION_PATTERNS
+
+
+def _module_matches(module: str, path: str) -> bool:
+    """Whether an import's module plausibly refers to the file at `path`"""
+    stem = os.path.splitext(path)[0]
+    if stem.endswith("/__init__") or stem.endswith("/index"):
+        stem = stem.rsplit("/", 1)[0]
+    dotted = module.lstrip(".").replace(".", "/")
+    return bool(dotted) and (stem == dotted or stem.endswith("/" + dotted) or stem.endswith(module.lstrip("./")))
+
+
+class SymbolIndex:
+    """
+    Index of definitions, imports and call sites of one ref of a repository (a PR's
+    head, say), stored in SQLite. Each ref has its own index, so concurrent PRs do not
+    overwrite each other's files. `sync` compares a tree's blob SHAs with what was
+    indexed and re-parses only the files that changed; a ref seen for the first time
+    starts from a copy of the repository's most recently synced index, so only the
+    first review of a repository builds one from scratch. Indexes of refs not synced
+    for REVIEW_SYMBOL_INDEX_TTL_DAYS are dropped.
+    """
+
+    def __init__(
+        self,
+        repository: str,
+        ref: str,
+        db_path: Optional[str] = None,
+        max_file_bytes: Optional[int] = None,
+        ttl_days: Optional[float] = None,
+    ):
+        self.repository = repository
+        self.ref = ref
+        self.max_file_bytes = max_file_bytes if max_file_bytes is not None else settings.REVIEW_SYMBOL_INDEX_MAX_FILE_BYTES
+        self.ttl_days = ttl_days if ttl_days is not None else settings.REVIEW_SYMBOL_INDEX_TTL_DAYS
+        try:
+            self.conn = get_connection(db_path)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(symbol_files)")}
+            if columns and "ref" not in columns:
+                # Single-index-per-repository layout; it is only a cache, so rebuild it per ref
+                for table in _FILE_TABLES:
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to initialise symbol index: {e}") from e
+
+    def indexed_shas(self) -> Dict[str, str]:
+        rows = self.conn.execute(
+            "SELECT path, blob_sha FROM symbol_files WHERE repository = ? AND ref = ?", (self.repository, self.ref)
+        ).fetchall()
+        return dict(rows)
+
+    def _seed(self) -> None:
+        """Start a ref's first index from the repository's most recently synced one"""
+        with self.conn:
+            # Take the write lock before looking, so two first syncs of a ref don't both copy
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self.conn.execute(
+                "SELECT 1 FROM symbol_refs WHERE repository = ? AND ref = ?", (self.repository, self.ref)
+            ).fetchone():
+                return
+            source = self.conn.execute(
+                "SELECT ref FROM symbol_refs WHERE repository = ? ORDER BY synced_at DESC LIMIT 1", (self.repository,)
+            ).fetchone()
+            self.conn.execute(
+                "INSERT INTO symbol_refs (repository, ref, synced_at) VALUES (?, ?, ?)",
+                (self.repository, self.ref, time.time()),
+            )
+            if source is None:
+                return
+            for table, columns in _FILE_TABLES.items():
+                self.conn.execute(
+                    f"""
+                    INSERT OR IGNORE INTO {table} (repository, ref, {columns})
+                    SELECT repository, ?, {columns} FROM {table} WHERE repository = ? AND ref = ?
+                    """,
+                    (self.ref, self.repository, source[0]),
+                )
+
+    def _mark_synced(self) -> None:
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO symbol_refs (repository, ref, synced_at) VALUES (?, ?, ?)
+                ON CONFLICT (repository, ref) DO UPDATE SET synced_at = excluded.synced_at
+                """,
+                (self.repository, self.ref, now),
+            )
+            stale = self.conn.execute(
+                "SELECT repository, ref FROM symbol_refs WHERE synced_at < ?", (now - self.ttl_days * 86400,)
+            ).fetchall()
+            for table in (*_FILE_TABLES, "symbol_refs"):
+                self.conn.executemany(f"DELETE FROM {table} WHERE repository = ? AND ref = ?", stale)
+
+    def _delete(self, paths: List[str]) -> None:
+        for table in _FILE_TABLES:
+            self.conn.executemany(
+                f"DELETE FROM {table} WHERE repository = ? AND ref = ? AND path = ?",
+                [(self.repository, self.ref, path) for path in paths],
+            )
+
+    def _store(self, path: str, blob_sha: str, symbols: Optional[FileSymbols]) -> None:
+        # Files that fail to parse are recorded too, so they are not fetched again until they change.
+        # Another sync of the same ref may have stored the file first; the later one wins.
+        self.conn.execute(
+            """
+            INSERT INTO symbol_files (repository, ref, path, blob_sha) VALUES (?, ?, ?, ?)
+            ON CONFLICT (repository, ref, path) DO UPDATE SET blob_sha = excluded.blob_sha
+            """,
+            (self.repository, self.ref, path, blob_sha),
+        )
+        if symbols is None:
+            return
+        self.conn.executemany(
+            """
+            INSERT INTO symbol_definitions (repository, ref, path, name, kind, line, signature)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(self.repository, self.ref, path, d.name, d.kind, d.line, d.signature) for d in symbols.definitions],
+        )
+        self.conn.executemany(
+            "INSERT INTO symbol_imports (repository, ref, path, module, name) VALUES (?, ?, ?, ?, ?)",
+            [(self.repository, self.ref, path, i.module, i.name) for i in symbols.imports],
+        )
+        self.conn.executemany(
+            "INSERT INTO symbol_calls (repository, ref, path, name, line) VALUES (?, ?, ?, ?, ?)",
+            [(self.repository, self.ref, path, name, line) for name, line in symbols.calls],
+        )
+
+    def sync(
+        self,
+        tree: Dict[str, str],
+        fetch: Callable[[List[str]], Dict[str, Optional[str]]],
+        batch_size: int = 500,
+    ) -> int:
+        """
+        Bring the index in line with `tree` (path -> blob SHA), fetching the contents of
+        changed files through `fetch`. Returns how many files were re-indexed.
+        """
+        try:
+            self._seed()
+            indexed = self.indexed_shas()
+            wanted = {path: sha for path, sha in tree.items() if indexable(path)}
+            changed = sorted(path for path, sha in wanted.items() if indexed.get(path) != sha)
+            removed = [path for path in indexed if path not in wanted]
+            with self.conn:
+                self._delete(removed)
+            for start in range(0, len(changed), batch_size):
+                batch = changed[start:start + batch_size]
+                contents = fetch(batch)
+                with self.conn:
+                    self._delete(batch)
+                    for path in batch:
+                        source = contents.get(path)
+                        if source is not None and len(source) > self.max_file_bytes:
+                            source = None
+                        self._store(path, wanted[path], extract_symbols(path, source) if source is not None else None)
+            self._mark_synced()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to update symbol index: {e}") from e
+        if changed or removed:
+            logger.debug(
+                f"🗂️ Symbol index of {self.repository}@{self.ref}: {len(changed)} file(s) re-indexed, {len(removed)} removed"
+            )
+        return len(changed)
+
+    def definitions(self, names: Iterable[str]) -> Dict[str, List[SymbolDefinition]]:
+        names = list(dict.fromkeys(names))
+        found: Dict[str, List[SymbolDefinition]] = {}
+        for start in range(0, len(names), 500):
+            batch = names[start:start + 500]
+            rows = self.conn.execute(
+                f"""
+                SELECT path, name, kind, line, signature FROM symbol_definitions
+                WHERE repository = ? AND ref = ? AND name IN ({",".join("?" * len(batch))})
+                """,
+                (self.repository, self.ref, *batch),
+            ).fetchall()
+            for path, name, kind, line, signature in rows:
+                found.setdefault(name, []).append(
+                    SymbolDefinition(path=path, name=name, kind=kind, line=line, signature=signature)
+                )
+        return found
+
+    def imports_of(self, path: str) -> List[ImportRecord]:
+        rows = self.conn.execute(
+            "SELECT module, name FROM symbol_imports WHERE repository = ? AND ref = ? AND path = ?",
+            (self.repository, self.ref, path),
+        ).fetchall()
+        return [ImportRecord(path=path, module=module, name=name) for module, name in rows]
+
+    def callers(self, name: str, exclude_path: str, limit: int = 3) -> Tuple[List[str], int]:
+        """Up to `limit` call sites (path:line) of `name` outside `exclude_path`, and how many there are"""
+        rows = self.conn.execute(
+            """
+            SELECT path, line FROM symbol_calls
+            WHERE repository = ? AND ref = ? AND name = ? AND path != ? ORDER BY path, line
+            """,
+            (self.repository, self.ref, name, exclude_path),
+        ).fetchall()
+        return [f"{path}:{line}" for path, line in rows[:limit]], len(rows)
+
+    def _resolve(
+        self, candidates: List[SymbolDefinition], path: str, imports: List[ImportRecord]
+    ) -> List[SymbolDefinition]:
+        """Pick the definitions a reference in `path` most likely means"""
+        imported = [d for d in candidates if any(_module_matches(i.module, d.path) for i in imports if i.name == d.name)]
+        if imported:
+            return imported[:1]
+        same_file = [d for d in candidates if d.path == path]
+        if same_file:
+            return same_file[:1]
+        same_dir = [d for d in candidates if os.path.dirname(d.path) == os.path.dirname(path)]
+        if same_dir:
+            return same_dir[:1]
+        return candidates if len(candidates) <= MAX_DEFINITIONS_PER_NAME else []
+
+    def context_for(
+        self, prepared: PreparedDiff, max_tokens: Optional[int] = None, max_symbols: Optional[int] = None
+    ) -> str:
+        """
+        Signatures of the symbols the diff's added lines reference but that are defined
+        outside the changed lines, plus call sites of definitions the diff changes,
+        ranked by how strongly they are referenced and cut to the token budget.
+        """
+        max_tokens = max_tokens if max_tokens is not None else settings.REVIEW_SYMBOL_CONTEXT_MAX_TOKENS
+        max_symbols = max_symbols if max_symbols is not None else settings.REVIEW_SYMBOL_CONTEXT_MAX_SYMBOLS
+
+        scores: Counter = Counter()
+        referenced_in: Dict[str, str] = {}
+        changed: Dict[str, set] = {}
+        imports: Dict[str, List[ImportRecord]] = {}
+        for patched_file in prepared.patch:
+            path = file_path_of(patched_file)
+            if not indexable(path):
+                continue
+            added = [line for hunk in patched_file for line in hunk if line.is_added]
+            changed[path] = {line.target_line_no for line in added}
+            imports[path] = self.imports_of(path)
+            imported = {record.name for record in imports[path]}
+            for line in added:
+                calls = set(_CALL_RE.findall(line.value))
+                for name in _IDENTIFIER_RE.findall(line.value):
+                    if len(name) < 3 or name in _NOT_CALLS:
+                        continue
+                    scores[name] += 1 + 2 * (name in calls) + 3 * (name in imported)
+                    referenced_in.setdefault(name, path)
+        if not scores:
+            return ""
+
+        definitions = self.definitions(scores)
+        entries: List[Tuple[int, str]] = []
+        for name, candidates in definitions.items():
+            path = referenced_in[name]
+            visible = [d for d in candidates if d.line in changed.get(d.path, ())]
+            if visible:
+                # Defined (or redefined) by the diff itself: show who calls it instead
+                for definition in visible:
+                    sites, total = self.callers(name, definition.path)
+                    if sites:
+                        more = f" (+{total - len(sites)} more)" if total > len(sites) else ""
+                        entries.append((scores[name], f"{definition.signature}  # called from {', '.join(sites)}{more}"))
+                continue
+            for definition in self._resolve(candidates, path, imports[path]):
+                entries.append((scores[name], f"{definition.path}:{definition.line}  {definition.signature}"))
+
+        lines, used = [], 0
+        for _, entry in sorted(entries, key=lambda item: -item[0])[:max_symbols]:
+            cost = estimate_tokens(entry) + 1
+            if used + cost > max_tokens:
+                continue
+            lines.append(entry)
+            used += cost
+        return "\n".join(lines)
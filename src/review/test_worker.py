@@ -0,0 +1,92 @@
+"""
+Warm pytest worker for src.review.testrun. It is run as a script by the test
+environment's interpreter inside the checkout, so it imports nothing from this
+project. pytest is imported once; every request is then run in a forked child, so
+each test starts from the same warm interpreter without any state from the last.
+The child gets its own process group, memory, CPU-time and file-size limits, and is
+killed with its group when it runs past its timeout.
+
+Requests and results are JSON lines on stdin and stdout:
+    {"id": ..., "args": [...], "timeout": seconds, "memory_bytes": bytes, "log": path}
+    {"id": ..., "status": "exited" | "timeout" | "killed", "code": int, "duration": seconds}
+"""
+import json
+import os
+import resource
+import signal
+import sys
+import time
+
+MAX_FILE_BYTES = 64 * 1024 * 1024
+
+
+def _limit(kind: int, value: int) -> None:
+    try:
+        resource.setrlimit(kind, (value, value))
+    except (ValueError, OSError):
+        pass
+
+
+def _child(request: dict) -> None:
+    os.setsid()
+    if request.get("memory_bytes"):
+        _limit(resource.RLIMIT_AS, int(request["memory_bytes"]))
+    _limit(resource.RLIMIT_CPU, int(request["timeout"]) + 1)
+    _limit(resource.RLIMIT_FSIZE, MAX_FILE_BYTES)
+    log = os.open(request["log"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+    os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+
+    import pytest
+
+    code = pytest.main(request["args"])
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(int(code))
+
+
+def _wait(pid: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        if time.monotonic() > deadline:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            os.waitpid(pid, 0)
+            return "timeout", -signal.SIGKILL
+        time.sleep(0.005)
+    if os.WIFSIGNALED(status):
+        signum = os.WTERMSIG(status)
+        return ("timeout" if signum == signal.SIGXCPU else "killed"), -signum
+    return "exited", os.WEXITSTATUS(status)
+
+
+def main() -> None:
+    # Like `python -m pytest`: the checkout is importable (the worker runs with -P, so this
+    # script's directory, whose types.py would shadow the standard library's, is not)
+    sys.path.insert(0, os.getcwd())
+    import pytest  # noqa: F401 (imported once here so every forked child starts warm)
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        sys.stdout.flush()
+        started = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _child(request)
+            finally:
+                os._exit(70)
+        status, code = _wait(pid, float(request["timeout"]))
+        result = {"id": request["id"], "status": status, "code": code, "duration": time.monotonic() - started}
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+import fcntl
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import select
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Literal, Optional, Set, Tuple
+from pydantic import BaseModel, Field
+from src.config.env import settings
+from src.exceptions import TestEnvironmentError
+from src.llm.types import GeneratedTestFile
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = Path(__file__).with_name("test_worker.py")
+DEPENDENCY_FILES = ("requirements.txt", "requirements-dev.txt", "requirements-test.txt", "pyproject.toml")
+PYTEST_ARGS = ["-q", "-p", "no:cacheprovider", "--no-header", "-rN"]
+# Per-run directory inside the checkout: home and temp dir of the workers, logs, and the run's environment copy
+SCRATCH_DIR = ".testergpt"
+_REQUIREMENT_COMMENT_RE = re.compile(r"(?:^|\s)#.*$")
+_REQUIREMENT_INCLUDE_RE = re.compile(r"^(-r|--requirement|-c|--constraint)(?:\s+|=)?(\S+)$")
+OUTPUT_TAIL_CHARS = 2000
+MAX_REPORTED_FAILURES = 10
+# Time the pool waits for a worker's answer beyond the test's own timeout before replacing it
+WORKER_GRACE_SECONDS = 10
+
+TestStatus = Literal["passed", "failed", "error", "timeout"]
+
+
+class TestResult(BaseModel):
+    """Outcome of one generated test"""
+
+    test: str
+    status: TestStatus
+    duration_seconds: float = 0.0
+    output: str = ""
+
+
+class TestRunReport(BaseModel):
+    results: List[TestResult] = Field(default_factory=list)
+    error: Optional[str] = None
+
+    def count(self, status: TestStatus) -> int:
+        return sum(1 for result in self.results if result.status == status)
+
+
+def extract_tarball(data: bytes, dest: Path, strip_top_dir: bool = False) -> None:
+    """Unpack a (possibly gzipped) tarball into `dest`, dropping its top directory if asked"""
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tar:
+        members = []
+        for member in tar.getmembers():
+            if strip_top_dir:
+                if "/" not in member.name:
+                    continue
+                member.name = member.name.split("/", 1)[1]
+            members.append(member)
+        tar.extractall(dest, members=members, filter="data")
+
+
+def safe_test_path(checkout: Path, path: str) -> Optional[Path]:
+    """Where to write a generated test: inside the checkout, a .py file, never over an existing file"""
+    relative = PurePosixPath(path.lstrip("/"))
+    if ".." in relative.parts or relative.suffix != ".py" or not relative.parts:
+        return None
+    target = checkout / relative
+    if target.exists():
+        target = target.with_name(f"{target.stem}_generated{target.suffix}")
+    return None if target.exists() else target
+
+
+def sandbox_error(install_sandbox_command: Optional[List[str]] = None) -> Optional[str]:
+    """Why generated tests must not run, or None when test runs and installs both go through a sandbox"""
+    if not settings.REVIEW_TEST_SANDBOX_COMMAND:
+        return "Generated tests were not run: no test sandbox is configured (REVIEW_TEST_SANDBOX_COMMAND)."
+    if install_sandbox_command is None:
+        install_sandbox_command = settings.REVIEW_TEST_INSTALL_SANDBOX_COMMAND
+    if install_sandbox_command == []:
+        return "Generated tests were not run: no install sandbox is configured (REVIEW_TEST_INSTALL_SANDBOX_COMMAND)."
+    return None
+
+
+def _sandbox_env(home: Path) -> Dict[str, str]:
+    """Environment of test processes and installs: nothing inherited from the service, so no tokens or keys leak in"""
+    return {
+        "PATH": os.defpath,
+        "HOME": str(home),
+        "TMPDIR": str(home),
+        "LANG": "C.UTF-8",
+        "PYTHONDONTWRITEBYTECODE": "1",
+        "PYTHONHASHSEED": "0",
+        "PYTHONPATH": "",
+    }
+
+
+def _checked_requirement(requirement: str, source: str) -> str:
+    """A named requirement; URLs and local paths are refused, since they would let a PR pick what gets installed"""
+    spec = requirement.split(";", 1)[0]
+    if "://" in requirement or any(char in spec for char in "@/\\") or spec.startswith("."):
+        raise TestEnvironmentError(f"Only named requirements are allowed, found {requirement!r} in {source}")
+    return requirement
+
+
+def _read_requirements(
+    path: Path, checkout: Path, requirements: List[str], constraints: List[str], seen: Set[Path]
+) -> None:
+    """Requirements of a requirements file and the files it includes, refusing index, link and URL options"""
+    path = path.resolve()
+    if path in seen:
+        return
+    if not path.is_relative_to(checkout.resolve()) or not path.is_file():
+        raise TestEnvironmentError(f"Requirements file {path.name} is missing or outside the checkout")
+    seen.add(path)
+    source = str(path.relative_to(checkout.resolve()))
+    for line in path.read_text(errors="replace").replace("\\\n", " ").splitlines():
+        line = _REQUIREMENT_COMMENT_RE.sub("", line).strip()
+        if not line:
+            continue
+        include = _REQUIREMENT_INCLUDE_RE.match(line)
+        if include:
+            into = requirements if include.group(1) in ("-r", "--requirement") else constraints
+            _read_requirements(path.parent / include.group(2), checkout, into, constraints, seen)
+        elif line.startswith(("-e", "--editable")):
+            # The checkout is importable from its root anyway, and editable installs would tie the environment to it
+            logger.debug(f"🧪 Skipping editable requirement {line!r} in {source}")
+        elif line.startswith("-"):
+            raise TestEnvironmentError(f"Option {line.split()[0].split('=')[0]} is not allowed in {source}")
+        else:
+            requirements.append(_checked_requirement(line, source))
+
+
+def dependency_declarations(checkout: Path) -> Tuple[List[str], List[str]]:
+    """Requirements and constraints declared by the checkout's requirements files and pyproject.toml"""
+    requirements, constraints, seen = ["pytest"], [], set()
+    for name in DEPENDENCY_FILES[:-1]:
+        if (checkout / name).is_file():
+            _read_requirements(checkout / name, checkout, requirements, constraints, seen)
+    pyproject = checkout / "pyproject.toml"
+    if pyproject.is_file():
+        try:
+            project = tomllib.loads(pyproject.read_text()).get("project", {})
+        except (tomllib.TOMLDecodeError, UnicodeDecodeError) as e:
+            logger.warning(f"Ignoring unreadable pyproject.toml: {e}")
+        else:
+            requirements += [_checked_requirement(dep, "pyproject.toml") for dep in project.get("dependencies", [])]
+    return requirements, constraints
+
+
+class TestEnvironments:
+    """
+    Virtualenvs for running generated tests, one per set of dependency declarations
+    (requirements files and pyproject dependencies), shared by every PR and push that
+    declares the same ones. Creation is guarded by a file lock so concurrent workers
+    build each environment once; the least recently used beyond `max_environments`
+    are removed.
+
+    Dependencies are installed under the install sandbox with a scrubbed environment,
+    from named requirements only. Test runs never use a cached environment directly:
+    each gets its own copy, so nothing a test writes there reaches later runs.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        timeout_seconds: Optional[float] = None,
+        max_environments: Optional[int] = None,
+        sandbox_command: Optional[List[str]] = None,
+    ):
+        self.root = Path(root or settings.REVIEW_TEST_ENV_DIR)
+        self.timeout_seconds = timeout_seconds if timeout_seconds is not None else settings.REVIEW_TEST_ENV_TIMEOUT_SECONDS
+        self.max_environments = (
+            max_environments if max_environments is not None else settings.REVIEW_TEST_MAX_ENVIRONMENTS
+        )
+        if sandbox_command is None:
+            sandbox_command = settings.REVIEW_TEST_INSTALL_SANDBOX_COMMAND
+        self.sandbox_command = sandbox_command if sandbox_command is not None else settings.REVIEW_TEST_SANDBOX_COMMAND
+
+    @staticmethod
+    def key(requirements: List[str], constraints: List[str]) -> str:
+        digest = hashlib.sha256(sys.version.encode())
+        digest.update("\n".join(requirements).encode() + b"\0" + "\n".join(constraints).encode())
+        return digest.hexdigest()[:16]
+
+    def _run(self, home: Path, *args: str) -> None:
+        result = subprocess.run(
+            [*self.sandbox_command, *args],
+            env=_sandbox_env(home),
+            cwd=home,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=self.timeout_seconds,
+        )
+        if result.returncode != 0:
+            raise TestEnvironmentError(f"{' '.join(args[:3])} failed: {result.stderr.decode(errors='replace')[-500:]}")
+
+    def _build(self, env_dir: Path, requirements: List[str], constraints: List[str]) -> None:
+        # Absolute, since installs run in a scratch directory; bin/python itself is a symlink to the base interpreter
+        env_dir = env_dir.absolute()
+        python = env_dir / "bin" / "python"
+        with tempfile.TemporaryDirectory(prefix="test-env-") as home:
+            home = Path(home)
+            (home / "requirements.txt").write_text("\n".join(requirements) + "\n")
+            (home / "constraints.txt").write_text("\n".join(constraints) + "\n")
+            self._run(home, sys.executable, "-m", "venv", str(env_dir))
+            self._run(
+                home, str(python), "-m", "pip", "install", "--quiet", "--isolated",
+                "-r", "requirements.txt", "-c", "constraints.txt",
+            )
+
+    def python_for(self, checkout: Path, dest: Path) -> Path:
+        """
+        Interpreter of a private copy, made at `dest`, of the environment for the
+        checkout's dependencies; the shared environment is created on first use
+        """
+        requirements, constraints = dependency_declarations(checkout)
+        env_dir = self.root / self.key(requirements, constraints)
+        ready = env_dir / ".ready"
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(f"{env_dir}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not ready.exists():
+                    started = time.monotonic()
+                    shutil.rmtree(env_dir, ignore_errors=True)
+                    try:
+                        self._build(env_dir, requirements, constraints)
+                    except (subprocess.TimeoutExpired, OSError, TestEnvironmentError) as e:
+                        shutil.rmtree(env_dir, ignore_errors=True)
+                        raise TestEnvironmentError(f"Could not prepare test environment: {e}") from e
+                    logger.debug(f"🧪 Built test environment {env_dir.name} in {time.monotonic() - started:.0f}s")
+                ready.touch()
+                # A shared lock is enough to copy, and still keeps eviction away
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                try:
+                    shutil.copytree(env_dir, dest, symlinks=True, ignore=shutil.ignore_patterns(".ready"))
+                except OSError as e:
+                    raise TestEnvironmentError(f"Could not copy test environment: {e}") from e
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._evict(keep=env_dir)
+        return dest / "bin" / "python"
+
+    def _evict(self, keep: Path) -> None:
+        environments = sorted(
+            (path for path in self.root.iterdir() if (path / ".ready").exists() and path != keep),
+            key=lambda path: (path / ".ready").stat().st_mtime,
+        )
+        for env_dir in environments[: max(0, len(environments) + 1 - self.max_environments)]:
+            with open(f"{env_dir}.lock", "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    shutil.rmtree(env_dir, ignore_errors=True)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class TestWorker:
+    """One warm worker process (src/review/test_worker.py) running in the checkout"""
+
+    def __init__(self, python: Path, checkout: Path, scratch: Path, sandbox_command: List[str]):
+        self.command = [*sandbox_command, str(python), "-P", "-u", str(WORKER_SCRIPT)]
+        self.checkout = checkout
+        self.scratch = scratch
+        self.process: Optional[subprocess.Popen] = None
+
+    def _start(self) -> subprocess.Popen:
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen(
+                self.command,
+                cwd=self.checkout,
+                env=_sandbox_env(self.scratch),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+                text=True,
+            )
+        return self.process
+
+    def run(self, request: dict) -> Optional[dict]:
+        """Send one request and wait for its result; None (and a fresh worker next time) if the worker died or hung"""
+        process = self._start()
+        try:
+            process.stdin.write(json.dumps(request) + "\n")
+            process.stdin.flush()
+            ready, _, _ = select.select([process.stdout], [], [], request["timeout"] + WORKER_GRACE_SECONDS)
+            line = process.stdout.readline() if ready else ""
+        except (BrokenPipeError, OSError):
+            line = ""
+        if not line:
+            self.close()
+            return None
+        return json.loads(line)
+
+    def close(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+class TestWorkerPool:
+    """
+    Warm workers on every core (or `workers` of them) running generated tests in one
+    checkout. Each test is one request, so timeouts and memory limits apply per test.
+    """
+
+    def __init__(
+        self,
+        python: Path,
+        checkout: Path,
+        workers: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        memory_bytes: Optional[int] = None,
+        sandbox_command: Optional[List[str]] = None,
+    ):
+        workers = workers if workers is not None else settings.REVIEW_TEST_WORKERS
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout_seconds = timeout_seconds if timeout_seconds is not None else settings.REVIEW_TEST_TIMEOUT_SECONDS
+        self.memory_bytes = memory_bytes if memory_bytes is not None else settings.REVIEW_TEST_MEMORY_BYTES
+        sandbox_command = sandbox_command if sandbox_command is not None else settings.REVIEW_TEST_SANDBOX_COMMAND
+        self.scratch = checkout / SCRATCH_DIR
+        self.scratch.mkdir(exist_ok=True)
+        self._idle: "queue.Queue[TestWorker]" = queue.Queue()
+        self._all = [TestWorker(python, checkout, self.scratch, sandbox_command) for _ in range(self.workers)]
+        for worker in self._all:
+            self._idle.put(worker)
+        self._ids = itertools.count()
+        self._ids_lock = threading.Lock()
+
+    def _request(self, args: List[str]) -> TestResult:
+        with self._ids_lock:
+            request_id = next(self._ids)
+        log = self.scratch / f"{request_id}.log"
+        request = {
+            "id": request_id,
+            "args": args + PYTEST_ARGS,
+            "timeout": self.timeout_seconds,
+            "memory_bytes": self.memory_bytes,
+            "log": str(log),
+        }
+        worker = self._idle.get()
+        try:
+            answer = worker.run(request)
+        finally:
+            self._idle.put(worker)
+        output = log.read_text(errors="replace")[-OUTPUT_TAIL_CHARS:] if log.exists() else ""
+        if answer is None:
+            return TestResult(test=args[-1], status="error", output="Test worker stopped responding")
+        status: TestStatus = "error"
+        if answer["status"] == "timeout":
+            status = "timeout"
+        elif answer["status"] == "exited" and answer["code"] in (0, 1):
+            status = "passed" if answer["code"] == 0 else "failed"
+        return TestResult(test=args[-1], status=status, duration_seconds=round(answer["duration"], 2), output=output)
+
+    def collect(self, path: str) -> List[str]:
+        """Node ids of the tests in a file; empty if it has none or does not import"""
+        result = self._request(["--collect-only", path])
+        return [line.strip() for line in result.output.splitlines() if "::" in line and not line.startswith(" ")]
+
+    def run(self, paths: List[str]) -> List[TestResult]:
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="test-run") as executor:
+            collected = dict(zip(paths, executor.map(self.collect, paths)))
+            node_ids = [node_id for path in paths for node_id in collected[path]]
+            results = list(executor.map(lambda node_id: self._request([node_id]), node_ids))
+            # Files without collected tests usually fail at import; running them shows why
+            results += list(executor.map(lambda path: self._request([path]), [p for p in paths if not collected[p]]))
+        return results
+
+    def close(self) -> None:
+        for worker in self._all:
+            worker.close()
+
+
+def run_generated_tests(
+    checkout: Path, files: List[GeneratedTestFile], environments: Optional[TestEnvironments] = None
+) -> TestRunReport:
+    """
+    Write the generated test files into the head checkout and run every test in them.
+    Refused (with an error report) unless a sandbox is configured.
+    """
+    environments = environments or TestEnvironments()
+    refused = sandbox_error(environments.sandbox_command)
+    if refused is not None:
+        return TestRunReport(error=refused)
+
+    paths = []
+    for generated in files:
+        target = safe_test_path(checkout, generated.path)
+        if target is None:
+            logger.warning(f"Skipping generated test with unusable path {generated.path}")
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(generated.content)
+        paths.append(str(target.relative_to(checkout)))
+    if not paths:
+        return TestRunReport(error="No usable test files were generated.")
+
+    try:
+        python = environments.python_for(checkout, checkout / SCRATCH_DIR / "env")
+    except TestEnvironmentError as e:
+        return TestRunReport(error=str(e))
+    pool = TestWorkerPool(python, checkout)
+    started = time.monotonic()
+    try:
+        results = pool.run(paths)
+    finally:
+        pool.close()
+    logger.debug(f"🧪 Ran {len(results)} generated test(s) on {pool.workers} worker(s) in {time.monotonic() - started:.1f}s")
+    return TestRunReport(results=results)
+
+
+def render_test_results(report: TestRunReport) -> str:
+    """Markdown block with the outcome of the generated tests, for the PR summary"""
+    if report.error:
+        return f"🧪 **Generated tests** were not run: {report.error}"
+    counts = ", ".join(
+        f"{report.count(status)} {label}"
+        for status, label in (("passed", "passed"), ("failed", "failed"), ("error", "errored"), ("timeout", "timed out"))
+        if report.count(status)
+    )
+    lines = [f"🧪 **Generated tests**: {counts or 'none collected'}"]
+    for result in [result for result in report.results if result.status != "passed"][:MAX_REPORTED_FAILURES]:
+        lines.append(
+            f"\n<details><summary>{result.status}: <code>{result.test}</code></summary>\n\n"
+            f"```\n{result.output.strip()}\n```\n</details>"
+        )
+    return "\n".join(lines)
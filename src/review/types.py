@@ -0,0 +1,66 @@
+from typing import Dict, List
+from pydantic import BaseModel, ConfigDict, Field
+from unidiff import PatchSet
+from unidiff.patch import PatchedFile
+from src.github.types import DiffIssue
+
+
+class SkippedFile(BaseModel):
+    """A file left out of the LLM payload by a local pre-review stage"""
+
+    path: str
+    reason: str
+
+
+class PreparedDiff(BaseModel):
+    """
+    Parsed PR diff after the local pre-review stages have run.
+    Stages remove files and hunks from `patch` and record why in `skipped` and `notes`;
+    whatever is left in `patch` is what gets sent to the LLM.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    patch: PatchSet
+    skipped: List[SkippedFile] = Field(default_factory=list)
+    notes: List[str] = Field(default_factory=list)
+    reused_issues: List[DiffIssue] = Field(default_factory=list)
+    # Findings of the local lint pre-pass, and the languages it fully covered
+    lint_issues: List[DiffIssue] = Field(default_factory=list)
+    linted_languages: List[str] = Field(default_factory=list)
+    # Signatures of referenced symbols defined outside the diff (src.review.symbols)
+    context: str = ""
+    # Hunks were grown to their enclosing scopes (src.review.scope), so all their context is kept
+    expanded_to_scope: bool = False
+    # Files as diffed before scope expansion, by path; the dedup index records these, not the grown hunks
+    unexpanded_files: Dict[str, PatchedFile] = Field(default_factory=dict)
+    # Review priority per path from src.review.sampling, highest first when scheduling work
+    priorities: Dict[str, float] = Field(default_factory=dict)
+    # Paths still in `patch` that the LLM review did not complete (failed chunks, truncated output)
+    unreviewed: List[str] = Field(default_factory=list)
+
+    @property
+    def diff_text(self) -> str:
+        return str(self.patch)
+
+    def subset(self, patch: PatchSet) -> "PreparedDiff":
+        """Part of this diff, reviewed on its own with the same prompt settings"""
+        return PreparedDiff(
+            patch=patch,
+            linted_languages=self.linted_languages,
+            context=self.context,
+            expanded_to_scope=self.expanded_to_scope,
+        )
+
+    def drop_empty_files(self) -> None:
+        """Remove files whose hunks have all been taken out by earlier stages"""
+        for patched_file in [f for f in self.patch if len(f) == 0]:
+            self.patch.remove(patched_file)
+
+    def summary_notes(self) -> str:
+        """Render skipped files and stage notes as a block to append to the review summary"""
+        lines = [f"- {note}" for note in self.notes]
+        if self.skipped:
+            lines.append(f"- Skipped {len(self.skipped)} file(s) without LLM review:")
+            lines.extend(f"  - `{skipped.path}`: {skipped.reason}" for skipped in self.skipped)
+        return "\n".join(lines)
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Settings are read at import time; give the test run its own environment and database
+_database_dir = tempfile.mkdtemp(prefix="testergpt-tests-")
+os.environ.setdefault("APP_VERSION", "test")
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_database_dir}/testergpt.sqlite3")
+os.environ.setdefault("GPT_API_KEY", "test-key")
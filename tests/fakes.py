@@ -0,0 +1,33 @@
+import time
+from typing import List, Optional
+from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse, VerifyIssuesRequest
+
+
+class FakeReviewBackend:
+    """Stand-in review backend with a scripted latency and response (or error)"""
+
+    def __init__(
+        self,
+        response: Optional[ReviewCodeDiffResponse] = None,
+        latency_seconds: float = 0.0,
+        error: Optional[Exception] = None,
+    ):
+        self.response = response or ReviewCodeDiffResponse()
+        self.latency_seconds = latency_seconds
+        self.error = error
+        self.calls = 0
+        self.finished = 0
+
+    def review_code_diff(self, code_diff_request: ReviewCodeDiffRequest, **kwargs) -> ReviewCodeDiffResponse:
+        self.calls += 1
+        time.sleep(self.latency_seconds)
+        self.finished += 1
+        if self.error is not None:
+            raise self.error
+        return self.response.model_copy(deep=True)
+
+    def verify_prior_issues(self, verify_request: VerifyIssuesRequest) -> ReviewCodeDiffResponse:
+        return self.review_code_diff(ReviewCodeDiffRequest(diff=verify_request.diff))
+
+    def combine_summaries(self, summaries: List[str]) -> str:
+        return "\n".join(f"- {summary}" for summary in summaries)
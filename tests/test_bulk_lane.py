@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from typing import List
+from src.llm.batch_mode import BatchJobItem, BulkReviewLane, InMemoryBatchJobBackend
+from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse
+
+FAST = dict(gather_seconds=0.02, poll_seconds=0.02)
+
+
+def batch_result(item: BatchJobItem) -> str:
+    return json.dumps({"summary": f"batch {item.key}", "issues": []})
+
+
+def direct(request: ReviewCodeDiffRequest) -> ReviewCodeDiffResponse:
+    return ReviewCodeDiffResponse(summary="direct")
+
+
+class Completions:
+    def __init__(self):
+        self.summaries: List[str] = []
+        self.done = threading.Event()
+
+    def __call__(self, response: ReviewCodeDiffResponse) -> None:
+        self.summaries.append(response.summary)
+        self.done.set()
+
+
+def stored_jobs(lane: BulkReviewLane) -> int:
+    return lane.conn.execute("SELECT COUNT(*) FROM bulk_review_jobs").fetchone()[0]
+
+
+def test_batch_result_is_completed_and_forgotten(tmp_path):
+    lane = BulkReviewLane(InMemoryBatchJobBackend(batch_result), "model", direct, db_path=tmp_path / "db", **FAST)
+    completions = Completions()
+
+    lane.enqueue(ReviewCodeDiffRequest(diff="+x\n"), completions, context={"number": 1})
+
+    assert completions.done.wait(2)
+    assert completions.summaries[0].startswith("batch review-")
+    time.sleep(0.05)
+    assert lane.pending() == 0
+    assert stored_jobs(lane) == 0
+
+
+def test_unpollable_batch_falls_back_after_deadline(tmp_path):
+    class UnreachableBackend(InMemoryBatchJobBackend):
+        def poll(self, name):
+            raise ConnectionError("batch endpoint unreachable")
+
+    lane = BulkReviewLane(
+        UnreachableBackend(batch_result), "model", direct, deadline_seconds=0.1, db_path=tmp_path / "db", **FAST
+    )
+    completions = Completions()
+
+    lane.enqueue(ReviewCodeDiffRequest(diff="+x\n"), completions, context={"number": 1})
+
+    assert completions.done.wait(2)
+    assert completions.summaries == ["direct"]
+
+
+def test_jobs_resume_after_restart(tmp_path):
+    backend = InMemoryBatchJobBackend(batch_result)
+    # Submitted but never polled, then the process "restarts"
+    first = BulkReviewLane(backend, "model", direct, poll_seconds=3600, gather_seconds=0.02, db_path=tmp_path / "db")
+    first.enqueue(ReviewCodeDiffRequest(diff="+x\n"), lambda response: None, context={"number": 7})
+    deadline = time.monotonic() + 2
+    while not first.conn.execute("SELECT batch_name FROM bulk_review_jobs").fetchone()[0]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    second = BulkReviewLane(backend, "model", direct, db_path=tmp_path / "db", **FAST)
+    completions, contexts = Completions(), []
+
+    def on_complete_for(context):
+        contexts.append(context)
+        return completions
+
+    assert second.resume(on_complete_for) == 1
+    assert completions.done.wait(2)
+    assert contexts == [{"number": 7}]
+    assert completions.summaries[0].startswith("batch review-")
+
+
+def test_job_without_context_is_dropped_on_resume(tmp_path):
+    lane = BulkReviewLane(InMemoryBatchJobBackend(batch_result), "model", direct, db_path=tmp_path / "db", **FAST)
+    with lane.conn:
+        lane.conn.execute(
+            "INSERT INTO bulk_review_jobs (key, request) VALUES (?, ?)",
+            ("review-orphan", ReviewCodeDiffRequest(diff="+x\n").model_dump_json()),
+        )
+
+    assert lane.resume(lambda context: Completions()) == 0
+    assert stored_jobs(lane) == 0
@@ -0,0 +1,90 @@
+import time
+import pytest
+from src.config.env import Settings
+from src.llm.hedging import HedgedReviewer, HedgePolicy
+from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse
+from tests.fakes import FakeReviewBackend
+
+REQUEST = ReviewCodeDiffRequest(diff="+x = 1\n")
+
+
+def policy(**overrides) -> HedgePolicy:
+    options = dict(percentile=0.95, budget=1.0, min_delay_seconds=0.05, default_delay_seconds=0.05, min_samples=1000)
+    return HedgePolicy(**{**options, **overrides})
+
+
+def test_fast_primary_is_not_hedged():
+    primary = FakeReviewBackend(ReviewCodeDiffResponse(summary="primary"))
+    secondary = FakeReviewBackend(ReviewCodeDiffResponse(summary="secondary"))
+    hedge_policy = policy()
+
+    response = HedgedReviewer(primary, secondary, hedge_policy).review_code_diff(REQUEST)
+
+    assert response.summary == "primary"
+    assert secondary.calls == 0
+    assert hedge_policy.stats().hedged == 0
+
+
+def test_secondary_wins_on_latency():
+    primary = FakeReviewBackend(ReviewCodeDiffResponse(summary="primary"), latency_seconds=1.0)
+    secondary = FakeReviewBackend(ReviewCodeDiffResponse(summary="secondary"), latency_seconds=0.01)
+    hedge_policy = policy()
+
+    started = time.monotonic()
+    response = HedgedReviewer(primary, secondary, hedge_policy).review_code_diff(REQUEST)
+
+    assert response.summary == "secondary"
+    assert time.monotonic() - started < 0.5
+    stats = hedge_policy.stats()
+    assert (stats.hedged, stats.hedge_wins) == (1, 1)
+
+
+def test_losing_call_is_abandoned():
+    primary = FakeReviewBackend(ReviewCodeDiffResponse(summary="primary"), latency_seconds=0.5)
+    secondary = FakeReviewBackend(ReviewCodeDiffResponse(summary="secondary"))
+
+    response = HedgedReviewer(primary, secondary, policy()).review_code_diff(REQUEST)
+
+    # Returned without waiting for the primary, which is still in flight
+    assert response.summary == "secondary"
+    assert (primary.calls, primary.finished) == (1, 0)
+    time.sleep(0.6)
+    # Finishing later changes nothing for the caller
+    assert primary.finished == 1
+    assert response.summary == "secondary"
+
+
+def test_failed_primary_falls_back_to_hedge():
+    primary = FakeReviewBackend(latency_seconds=0.2, error=RuntimeError("primary down"))
+    secondary = FakeReviewBackend(ReviewCodeDiffResponse(summary="secondary"), latency_seconds=0.3)
+
+    response = HedgedReviewer(primary, secondary, policy()).review_code_diff(REQUEST)
+
+    assert response.summary == "secondary"
+
+
+def test_both_failing_raises_primary_error():
+    primary = FakeReviewBackend(latency_seconds=0.1, error=RuntimeError("primary down"))
+    secondary = FakeReviewBackend(error=RuntimeError("secondary down"))
+
+    with pytest.raises(RuntimeError, match="primary down"):
+        HedgedReviewer(primary, secondary, policy()).review_code_diff(REQUEST)
+    assert secondary.calls == 1
+
+
+def test_budget_limits_hedges():
+    primary = FakeReviewBackend(ReviewCodeDiffResponse(summary="primary"), latency_seconds=0.1)
+    secondary = FakeReviewBackend(ReviewCodeDiffResponse(summary="secondary"))
+    hedge_policy = policy(budget=0.0)
+
+    response = HedgedReviewer(primary, secondary, hedge_policy).review_code_diff(REQUEST)
+
+    assert response.summary == "primary"
+    assert secondary.calls == 0
+    assert hedge_policy.stats().budget_denied == 1
+
+
+def test_hedge_model_defaults_to_a_different_model(capsys):
+    assert Settings().LLM_HEDGE_MODEL != Settings().LLM_STRONG_MODEL
+    Settings(LLM_HEDGING_ENABLED=True, LLM_HEDGE_MODEL="gemini-2.5-pro", LLM_STRONG_MODEL="gemini-2.5-pro")
+    assert "LLM_HEDGE_MODEL is the same as LLM_STRONG_MODEL" in capsys.readouterr().out
@@ -0,0 +1,35 @@
+from src.github.utils import parse_diff
+from src.llm.languages import request_files, request_languages
+from src.llm.types import ReviewCodeDiffRequest
+from src.review.render import render_compact
+
+DIFF = """diff --git a/docs/release notes.py b/docs/release notes.py
+new file mode 100644
+--- /dev/null
++++ b/docs/release notes.py\t
+@@ -0,0 +1 @@
++print("hi")
+diff --git a/lib/old name.rb b/lib/new name.rb
+similarity index 80%
+rename from lib/old name.rb
+rename to lib/new name.rb
+--- a/lib/old name.rb\t
++++ b/lib/new name.rb\t
+@@ -1 +1 @@
+-puts 1
++puts 2
+diff --git a/app.go b/app.go
+--- a/app.go
++++ b/app.go
+@@ -1 +1 @@
+-package a
++package b
+"""
+
+
+def test_compact_request_files_keep_spaces_in_paths():
+    request = ReviewCodeDiffRequest(diff=render_compact(parse_diff(DIFF)), diff_format="compact")
+    expected = {"docs/release notes.py", "lib/new name.rb", "app.go"}
+    assert request_files(request) == expected
+    assert request_files(ReviewCodeDiffRequest(diff=DIFF)) == expected
+    assert request_languages(request) == ["go", "python", "ruby"]
@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+from src.llm.concurrency import default_concurrency_limiter
+from src.llm.metrics import LLMCallRecord, default_call_recorder
+from src.main import app
+
+
+def test_metrics_expose_limiters_and_tiers():
+    limiter = default_concurrency_limiter("metrics-test-model")
+    recorder = default_call_recorder()
+    recorder.record(
+        LLMCallRecord(
+            tier="fast", model="metrics-test-model", prompt="review", latency_ms=120.0,
+            input_tokens=1000, output_tokens=100, cached_tokens=0, cost_usd=0.001, escalated=False,
+        )
+    )
+
+    body = TestClient(app).get("/metrics").json()
+
+    assert body["limiters"][limiter.name]["limit"] == limiter.limit
+    assert {"in_flight", "throttle_events"} <= set(body["limiters"][limiter.name])
+    assert any(tier["model"] == "metrics-test-model" and tier["calls"] >= 1 for tier in body["tiers"])
@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.llm.cache import InMemoryPromptCacheBackend, PromptCache, is_cache_miss, min_cache_tokens
+from src.llm.prompts import review_prompt
+from src.llm.service import LLMService
+from src.llm.tokens import estimate_tokens
+
+PROMPT = review_prompt("unified", {"python"})
+
+
+class ProviderError(Exception):
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+
+def service(cache: PromptCache) -> LLMService:
+    return LLMService(model="gemini-2.5-flash", prompt_cache=cache)
+
+
+def test_review_prefix_reaches_flash_minimum():
+    assert estimate_tokens(PROMPT.prefix) >= min_cache_tokens("gemini-2.5-flash")
+
+
+def test_handle_is_reused_until_version_changes():
+    backend = InMemoryPromptCacheBackend()
+    cache = PromptCache(backend, min_tokens=0)
+
+    first = cache.get("gemini-2.5-flash", PROMPT)
+    assert cache.get("gemini-2.5-flash", PROMPT) == first
+    changed = cache.get("gemini-2.5-flash", PROMPT.model_copy(update={"prefix": PROMPT.prefix + "\nBe brief."}))
+
+    assert changed != first
+    assert backend.deleted == [first]
+
+
+class BlockingBackend(InMemoryPromptCacheBackend):
+    """Holds the first create call until released, like a slow provider"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def create(self, model: str, system_instruction: str, ttl_seconds: int) -> str:
+        if not self.started.is_set():
+            self.started.set()
+            assert self.release.wait(5)
+        return super().create(model, system_instruction, ttl_seconds)
+
+
+def test_create_runs_outside_the_lock_once_per_key():
+    backend = BlockingBackend()
+    cache = PromptCache(backend, min_tokens=0)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        first = pool.submit(cache.get, "gemini-2.5-flash", PROMPT)
+        assert backend.started.wait(5)
+        waiting = pool.submit(cache.get, "gemini-2.5-flash", PROMPT)
+        # Another model's handle is not held up by the slow call
+        assert pool.submit(cache.get, "gemini-2.5-pro", PROMPT).result(timeout=5)
+        assert not waiting.done()
+        backend.release.set()
+        assert first.result(timeout=5) == waiting.result(timeout=5)
+    assert len(backend.created) == 2
+
+
+def test_short_prefix_is_not_cached():
+    backend = InMemoryPromptCacheBackend()
+    assert PromptCache(backend, min_tokens=10**6).get("gemini-2.5-flash", PROMPT) is None
+    assert backend.created == []
+
+
+def test_cache_miss_detection():
+    try:
+        try:
+            raise ProviderError("404 NOT_FOUND", code=404)
+        except ProviderError as e:
+            raise RuntimeError("Error calling model") from e
+    except RuntimeError as wrapped:
+        assert is_cache_miss(wrapped)
+    assert is_cache_miss(ProviderError("403 PERMISSION_DENIED. CachedContent not found (or permission denied)", 403))
+    assert not is_cache_miss(ProviderError("500 INTERNAL", code=500))
+    assert not is_cache_miss(ProviderError("400 INVALID_ARGUMENT", code=400))
+
+
+def test_missing_handle_is_dropped_and_call_retried_uncached():
+    backend = InMemoryPromptCacheBackend()
+    llm = service(PromptCache(backend, min_tokens=0))
+    calls = []
+
+    def run(template, model):
+        calls.append(model.cached_content)
+        if model.cached_content:
+            raise ProviderError("CachedContent not found", code=404)
+        return "ok"
+
+    assert llm._call(PROMPT, run) == "ok"
+    assert calls[0] is not None and calls[1] is None
+    assert backend.deleted == [calls[0]]
+
+
+def test_unrelated_error_keeps_handle():
+    backend = InMemoryPromptCacheBackend()
+    llm = service(PromptCache(backend, min_tokens=0))
+    calls = []
+
+    def run(template, model):
+        calls.append(model.cached_content)
+        raise ProviderError("400 INVALID_ARGUMENT", code=400)
+
+    with pytest.raises(ProviderError):
+        llm._call(PROMPT, run)
+    assert len(calls) == 1
+    assert backend.deleted == []
+    assert llm.prompt_cache.get("gemini-2.5-flash", PROMPT) == calls[0]
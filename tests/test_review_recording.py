@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+from unidiff import PatchSet
+from src.config.env import settings
+from src.github.service import complete_review, map_reduce_review
+from src.github.utils import parse_diff
+from src.llm.types import ReviewCodeDiffRequest, ReviewCodeDiffResponse
+from src.review.dedup import NearDuplicateIndex
+from src.review.sampling import ReviewHistory
+from src.review.types import PreparedDiff
+from tests.fakes import FakeReviewBackend
+
+DIFF = """\
+--- a/good/app.py
++++ b/good/app.py
+@@ -1,1 +1,2 @@
+ import os
++value = compute_total(items, discount=0.1)
+--- a/broken/app.py
++++ b/broken/app.py
+@@ -1,1 +1,2 @@
+ import os
++other = compute_other(things, margin=0.2)
+"""
+
+
+class ChunkFailingBackend(FakeReviewBackend):
+    """Reviews cleanly, except chunks touching `broken/`, which fail"""
+
+    def review_code_diff(self, code_diff_request: ReviewCodeDiffRequest, **kwargs) -> ReviewCodeDiffResponse:
+        if "broken/" in code_diff_request.diff:
+            raise RuntimeError("chunk failed")
+        return super().review_code_diff(code_diff_request, **kwargs)
+
+
+def test_failed_chunk_is_not_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_STREAMING_ENABLED", False)
+    monkeypatch.setattr(settings, "REVIEW_POST_COMMENTS", False)
+    patch = parse_diff(DIFF)
+    prepared = PreparedDiff(patch=patch)
+    chunks = [PatchSet(str(patched_file)) for patched_file in patch]
+    llm = ChunkFailingBackend(ReviewCodeDiffResponse(summary="clean"))
+
+    response = map_reduce_review(llm, None, prepared, chunks, lambda issue: None)
+    assert prepared.unreviewed == ["broken/app.py"]
+
+    db_path = str(tmp_path / "db")
+    index = NearDuplicateIndex("o/r", min_tokens=1, db_path=db_path)
+    history = ReviewHistory("o/r", db_path=db_path)
+    monkeypatch.setattr("src.github.service.ReviewHistory", lambda repository: history)
+    payload = SimpleNamespace(number=1, repository=SimpleNamespace(full_name="o/r"))
+
+    complete_review(payload, llm, prepared, response, index, [], lambda issue: None, None)
+
+    recorded = {row[0] for row in index.conn.execute("SELECT path FROM hunk_fingerprints")}
+    assert recorded == {"good/app.py"}
+    assert set(history.lookup(["good/app.py", "broken/app.py"])) == {"good/app.py"}
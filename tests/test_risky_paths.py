@@ -0,0 +1,26 @@
+import pytest
+from src.llm.routing import STRONG_TIER, DiffSignals, TierRouter, path_words, risky_path_re
+from src.review.sampling import RiskScorer
+
+PATTERNS = ["auth", "token", "migrations?"]
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["src/auth/login.py", "auth_service.py", "web/userAuth.ts", "JWTToken.java", "access-token.go", "db/migrations/0001.py"],
+)
+def test_whole_words_match(path):
+    assert risky_path_re(PATTERNS).search(path_words(path))
+
+
+@pytest.mark.parametrize("path", ["src/tokens.py", "src/llm/tokenizer.py", "docs/author.md", "src/authors.py"])
+def test_substrings_do_not_match(path):
+    assert not risky_path_re(PATTERNS).search(path_words(path))
+
+
+def test_router_and_scorer_agree():
+    router, scorer = TierRouter(risky_path_patterns=PATTERNS), RiskScorer(risky_path_patterns=PATTERNS)
+    assert router.choose(DiffSignals(files=["src/auth/session.py"])).tier == STRONG_TIER
+    assert router.choose(DiffSignals(files=["src/tokenizer.py"])).reason != "risky path src/tokenizer.py"
+    assert scorer.risky_path_re.search(path_words("src/auth/session.py"))
+    assert not scorer.risky_path_re.search(path_words("src/tokenizer.py"))
@@ -0,0 +1,24 @@
+from src.config.env import settings
+from src.llm.types import GeneratedTestFile
+from src.review.testrun import TestEnvironments as Environments, run_generated_tests
+
+GENERATED = [GeneratedTestFile(path="tests/test_generated.py", content="def test_ok():\n    pass\n")]
+
+
+def test_refused_without_test_sandbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "REVIEW_TEST_SANDBOX_COMMAND", [])
+
+    report = run_generated_tests(tmp_path, GENERATED, Environments(root=str(tmp_path / "envs")))
+
+    assert "REVIEW_TEST_SANDBOX_COMMAND" in report.error
+    assert not report.results
+    # Nothing from the PR was written or run
+    assert not (tmp_path / "tests").exists()
+
+
+def test_refused_without_install_sandbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "REVIEW_TEST_SANDBOX_COMMAND", ["bwrap", "--unshare-all"])
+
+    report = run_generated_tests(tmp_path, GENERATED, Environments(root=str(tmp_path / "envs"), sandbox_command=[]))
+
+    assert "REVIEW_TEST_INSTALL_SANDBOX_COMMAND" in report.error